@@ -1,31 +1,186 @@
+# getintel.py
+# 说明：
+# - CPU / 内存 / GPU 状态读取
+# - 后台采样线程按固定间隔采集 CPU 占用、内存和 GPU，保存在环形缓冲区中；
+#   读取时直接返回最近一次采样，不再每次阻塞 0.8 秒或调用 nvidia-smi
+# - window(60) 返回最近 60 秒内各项的最小/平均/最大值
+# - cpu() / nc() / get_gpu_usage() 的参数和返回值保持不变
+
+import time
+import threading
+from collections import deque
+
 import psutil
-import GPUtil
+
+try:
+    import GPUtil
+except ImportError:
+    # 没有安装 GPUtil 时不采集 GPU
+    GPUtil = None
+
+# 采样间隔（秒）和历史长度（秒）
+SAMPLE_INTERVAL = 1.0
+HISTORY_SECONDS = 300
+FIRST_SAMPLE_DELAY = 0.2
+GB = 1024 * 1024 * 1024
+
+
+class MetricsSampler:
+    """后台采样线程：按间隔采集 CPU/内存/GPU，最近的采样保存在环形缓冲区中"""
+
+    def __init__(self, interval=SAMPLE_INTERVAL, history=HISTORY_SECONDS, gpu_interval=None):
+        """
+        Args:
+            interval: 采样间隔（秒）
+            history: 保留多少秒的历史
+            gpu_interval: GPU 的采样间隔（秒，调用 nvidia-smi 较慢），None 表示与 interval 相同
+        """
+        self.interval = interval
+        self.history = history
+        self.gpu_interval = gpu_interval
+        self.samples = deque(maxlen=max(1, int(history / interval)))
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.gpu = None
+        self.gpu_at = 0.0
+
+    def start(self):
+        """启动采样线程（已启动时不重复启动）"""
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive():
+                return
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self.run, name="metrics-sampler", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def set_interval(self, interval):
+        """修改采样间隔，历史长度（秒）不变"""
+        with self.lock:
+            self.interval = interval
+            self.samples = deque(self.samples, maxlen=max(1, int(self.history / interval)))
+
+    def run(self):
+        # 第一次调用 cpu_percent(None) 只是开始计时，返回值没有意义
+        # 第一次采样提前进行，避免第一次读取时等满一个间隔
+        psutil.cpu_percent(interval=None)
+        wait = min(self.interval, FIRST_SAMPLE_DELAY)
+        while not self.stop_event.wait(wait):
+            wait = self.interval
+            try:
+                sample = self.sample()
+            except Exception as e:
+                print(f"采集系统状态失败: {e}")
+                continue
+            with self.lock:
+                self.samples.append(sample)
+            self.ready.set()
+
+    def sample(self):
+        """采集一次：CPU 占用为距上一次采样的平均值（不阻塞）"""
+        vm_nc = psutil.virtual_memory()
+        sample = {
+            "time": time.time(),
+            "cpu_percent": psutil.cpu_percent(interval=None),
+            "mem_percent": vm_nc.percent,
+            "mem_total": vm_nc.total / GB,
+            "mem_used": vm_nc.used / GB,
+            "mem_available": vm_nc.available / GB,
+        }
+        now = time.monotonic()
+        gpu_interval = self.gpu_interval or self.interval
+        if GPUtil is not None and (self.gpu_at == 0.0 or now - self.gpu_at >= gpu_interval):
+            self.gpu_at = now
+            self.gpu = self.sample_gpu()
+        sample.update(self.gpu or {})
+        return sample
+
+    def sample_gpu(self):
+        """全部 GPU 的平均占用和合计显存（GB），没有 GPU 或获取失败时返回None"""
+        try:
+            gpus = GPUtil.getGPUs()
+        except Exception:
+            return None
+        if not gpus:
+            return None
+        return {
+            "gpu_util": sum(gpu.load * 100 for gpu in gpus) / len(gpus),
+            "gpu_mem_used": sum(gpu.memoryUsed for gpu in gpus) / 1024,
+            "gpu_mem_total": sum(gpu.memoryTotal for gpu in gpus) / 1024,
+        }
+
+    def latest(self, timeout=None):
+        """
+        最近一次采样（立即返回）；采样线程刚启动、还没有采样时最多等待 timeout 秒
+
+        Args:
+            timeout: 等待第一次采样的最长时间，None 表示两个采样间隔
+
+        Returns:
+            采样字典，超时仍没有采样时返回None
+        """
+        self.start()
+        if not self.ready.wait(self.interval * 2 if timeout is None else timeout):
+            return None
+        with self.lock:
+            return self.samples[-1]
+
+    def recent(self, seconds):
+        """最近 seconds 秒内的采样列表（按时间顺序）"""
+        since = time.time() - seconds
+        with self.lock:
+            return [sample for sample in self.samples if sample["time"] >= since]
+
+    def window(self, seconds=60):
+        """
+        最近 seconds 秒内各项的最小/平均/最大值
+
+        Returns:
+            {项: {"min", "avg", "max"}}，没有采样的项不出现
+        """
+        stats = {}
+        samples = self.recent(seconds)
+        # 取全部采样的键的并集：GPU 可能在窗口内的部分采样中缺失（获取失败或尚未采到）
+        keys = dict.fromkeys(key for sample in samples for key in sample)
+        for key in keys:
+            if key == "time":
+                continue
+            values = [sample[key] for sample in samples if key in sample]
+            stats[key] = {"min": min(values), "avg": sum(values) / len(values), "max": max(values)}
+        return stats
+
+
+# 所有读取共用的采样器，第一次读取时启动
+SAMPLER = MetricsSampler()
+
 
 #CPU获取
 def cpu(a):
-    cpu_xc = psutil.cpu_count(logical=False)
-    #线程
-    cpu_jc = psutil.cpu_count()
-    #CPU频率
-    cpu_pl = psutil.cpu_freq()
-    #CPU百分比
-    cpu_bfb = psutil.cpu_percent(interval=0.8)
     if a == 1:
-        return cpu_xc
+        return psutil.cpu_count(logical=False)
     elif a == 2:
-        return cpu_jc
+        #线程
+        return psutil.cpu_count()
     elif a == 3:
-        return cpu_pl
+        #CPU频率
+        return psutil.cpu_freq()
     elif a == 4:
-        return cpu_bfb
+        #CPU百分比（后台采样的最近值，不阻塞）；还没有采样时返回None
+        # 不能在这里直接调用 psutil.cpu_percent(None)：它会重置采样线程依赖的全局计时起点
+        sample = SAMPLER.latest()
+        return sample["cpu_percent"] if sample else None
     # 1 = 线程 2 = 进程 3 = 频率 4 = 百分比
 
 #内存获取
 def nc(a):
     # 拉取内存组件
     vm_nc = psutil.virtual_memory()
-    # 内存获取
-    GB = 1024 * 1024 * 1024
     # 计算总内存
     vm_z = vm_nc.total / GB
     vm_y = vm_nc.used / GB
@@ -44,20 +199,16 @@ def nc(a):
     # 1 = 总内存 2 = 占比 3 = 被使用内存 4 = 剩余内存
 
 
-#GPU获取
+#GPU获取（后台采样的最近值，不再每次调用 nvidia-smi）
 def get_gpu_usage(a):
-    gpus = GPUtil.getGPUs()
-    if not gpus:
+    sample = SAMPLER.latest()
+    if not sample or "gpu_util" not in sample:
         return {"error": "No GPU found"}
 
-    total_util = sum(gpu.load * 100 for gpu in gpus) / len(gpus)
-    total_mem_used = sum(gpu.memoryUsed for gpu in gpus) / 1024
-    total_mem_total = sum(gpu.memoryTotal for gpu in gpus) / 1024
-
     if a == 1:
-        return total_util
+        return sample["gpu_util"]
     elif a == 2:
-        return total_mem_used
+        return sample["gpu_mem_used"]
     elif a == 3:
-        return total_mem_total
+        return sample["gpu_mem_total"]
     # 1 = 占比 2 = 被使用内存 3 = 总内存
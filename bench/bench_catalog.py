@@ -0,0 +1,62 @@
+# bench_catalog.py
+# 说明：
+# - 目录读取基准测试：生成指定条目数的目录 YAML，对比纯 Python safe_load、libyaml C 解析器、
+#   解析结果快照（org/orgread.py 的 load_yml_cached）三种方式的读取耗时
+# - 运行：python bench/bench_catalog.py [条目数...]，例如 python bench/bench_catalog.py 1000 10000 50000
+
+import os
+import sys
+import time
+import tempfile
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.bench_search import make_catalog
+from org.orgread import SafeLoader, load_yml_cached
+
+
+def timed(func) -> float:
+    """运行一次，返回耗时（毫秒）"""
+    started = time.perf_counter()
+    func()
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    counts = [int(x) for x in sys.argv[1:]] or [1000, 10000]
+    print(f"C 解析器: {'可用' if SafeLoader is not yaml.SafeLoader else '不可用（未安装 libyaml）'}\n")
+    print("条目数    文件(MB)  safe_load(ms)  C解析器(ms)  首次(解析+写快照)(ms)  快照(ms)")
+    with tempfile.TemporaryDirectory() as work_dir:
+        cache_dir = os.path.join(work_dir, "cache")
+        for count in counts:
+            path = os.path.join(work_dir, f"catalog_{count}.yml")
+            catalog = make_catalog(count)
+            for value in catalog.values():
+                value["introduction"] = f"{value['name']} 模型，适合本地推理"
+                value["sha256"] = "0" * 64
+                value["mirrors"] = [value["url"].replace("example.com", "mirror.example.com")]
+            with open(path, "w", encoding="utf-8") as f:
+                yaml.dump(catalog, f, allow_unicode=True, Dumper=getattr(yaml, "CSafeDumper", yaml.SafeDumper))
+
+            def pure():
+                with open(path, "r", encoding="utf-8") as f:
+                    return yaml.load(f, Loader=yaml.SafeLoader)
+
+            def fast():
+                with open(path, "r", encoding="utf-8") as f:
+                    return yaml.load(f, Loader=SafeLoader)
+
+            pure_ms = timed(pure)
+            fast_ms = timed(fast)
+            first_ms = timed(lambda: load_yml_cached(path, cache_dir=cache_dir))
+            cached_ms = min(timed(lambda: load_yml_cached(path, cache_dir=cache_dir)) for _ in range(5))
+            if load_yml_cached(path, cache_dir=cache_dir) != pure():
+                raise RuntimeError("快照内容与 YAML 不一致")
+            size_mb = os.path.getsize(path) / (1024 * 1024)
+            print(f"{count:<9} {size_mb:<9.1f} {pure_ms:<14.0f} {fast_ms:<12.0f} {first_ms:<22.0f} {cached_ms:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+# bench_download.py
+# 说明：
+# - 下载器基准测试：在本地故障注入服务器上按 文件大小 × 线程数 × 故障场景 运行下载器
+# - 每次下载在独立子进程中运行，统计吞吐、CPU 时间、峰值内存（RSS）；
+#   支持断点续传的场景还会测一次“续传耗时”：下载到一半时暂停，再次启动到收到新数据所需的时间
+# - 服务器运行在父进程中，不计入子进程的 CPU 和内存
+# - 运行：python bench/bench_download.py [--sizes 64 256] [--threads 1 4 8] [--scenarios clean reset]
+#         [--engines thread async] [--json 结果.json]
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+
+try:
+    import resource
+except ImportError:
+    # Windows 下没有 resource 模块，不统计峰值内存
+    resource = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.rangeserver import start_server
+from bench.bench_engines import make_file
+
+# 故障场景：名称 -> start_server() 的故障参数
+SCENARIOS = {
+    "clean": {},
+    "latency": {"latency": 0.05},
+    "throttle": {"throttle": 4 * 1024 * 1024},
+    "reset": {"reset_rate": 0.1},
+    "norange": {"support_range": False},
+}
+
+# 测续传耗时时，下载到该比例后暂停
+RESUME_AT = 0.5
+
+
+def peak_rss_mb():
+    """当前进程的峰值内存（MB），无法统计时返回None"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def make_downloader(engine: str, url: str, save_path: str, threads: int):
+    from org.orgdownload import MultiThreadDownloader, AsyncDownloader
+    if engine == "async":
+        return AsyncDownloader(url, save_path, concurrency=threads, show_bar=False)
+    return MultiThreadDownloader(url, save_path, thread_count=threads, show_bar=False)
+
+
+def remove_outputs(save_path: str):
+    for suffix in ("", ".part", ".progress", ".sha256"):
+        if os.path.exists(save_path + suffix):
+            os.remove(save_path + suffix)
+
+
+def watch(downloader, condition, interval: float = 0.001) -> threading.Thread:
+    """后台线程轮询下载器，condition(downloader) 为真时返回（下载器停止后也返回）"""
+    def loop():
+        while not condition(downloader):
+            if downloader.stopped:
+                return
+            time.sleep(interval)
+
+    thread = threading.Thread(target=loop, daemon=True)
+    thread.start()
+    return thread
+
+
+def child_download(config: dict) -> dict:
+    """子进程：完整下载一次"""
+    from org.orgdownload import file_sha256
+
+    save_path = config["save_path"]
+    remove_outputs(save_path)
+    downloader = make_downloader(config["engine"], config["url"], save_path, config["threads"])
+    cpu_start = time.process_time()
+    started = time.perf_counter()
+    ok = downloader.download(resume=False)
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu_start
+    ok = ok and file_sha256(save_path) == config["sha256"]
+    return {"ok": ok, "seconds": elapsed, "cpu": cpu, "rss": peak_rss_mb()}
+
+
+def child_resume(config: dict) -> dict:
+    """子进程：下载到一半时暂停，再次启动并测量收到新数据前的耗时"""
+    save_path = config["save_path"]
+    remove_outputs(save_path)
+    first = make_downloader(config["engine"], config["url"], save_path, config["threads"])
+
+    def half_done(downloader):
+        return downloader.total_size and downloader.downloaded_size >= downloader.total_size * RESUME_AT
+
+    watcher = watch(first, half_done)
+    threading.Thread(target=lambda: (watcher.join(), first.stop()), daemon=True).start()
+    if first.download(resume=False):
+        # 下载太快，来不及暂停
+        return {"ok": False, "resume": None}
+    done_bytes = first.scheduler.done_bytes()
+
+    second = make_downloader(config["engine"], config["url"], save_path, config["threads"])
+    resumed_at = []
+
+    def resumed(downloader):
+        if downloader.downloaded_size > done_bytes:
+            resumed_at.append(time.perf_counter())
+            return True
+        return False
+
+    started = time.perf_counter()
+    watch(second, resumed)
+    ok = second.download(resume=True)
+    return {"ok": ok and bool(resumed_at), "resume": resumed_at[0] - started if resumed_at else None}
+
+
+def run_child(mode: str, config: dict) -> dict:
+    """在子进程中运行一次测试，返回其结果"""
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", mode, json.dumps(config)],
+                            capture_output=True, text=True)
+    lines = result.stdout.strip().splitlines()
+    if result.returncode != 0 or not lines:
+        print(result.stderr.strip()[-2000:])
+        return {"ok": False}
+    return json.loads(lines[-1])
+
+
+def format_value(value, fmt: str) -> str:
+    return "-" if value is None else format(value, fmt)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="下载器基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[64], help="文件大小（MB）")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 8], help="线程数（async 引擎为并发数）")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--engines", nargs="+", default=["thread"], choices=["thread", "async"])
+    parser.add_argument("--no-resume", action="store_true", help="不测量续传耗时")
+    parser.add_argument("--json", help="把结果另存为 JSON，便于不同版本之间对比")
+    parser.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        mode, config = args.child[0], json.loads(args.child[1])
+        result = child_resume(config) if mode == "resume" else child_download(config)
+        print(json.dumps(result))
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        files = {}
+        for size_mb in args.sizes:
+            name = f"model_{size_mb}m.bin"
+            files[size_mb] = (name, make_file(os.path.join(work_dir, name), size_mb * 1024 * 1024))
+        save_path = os.path.join(work_dir, "out.bin")
+
+        for scenario in args.scenarios:
+            faults = SCENARIOS[scenario]
+            server, base_url = start_server(work_dir, **faults)
+            try:
+                for size_mb in args.sizes:
+                    name, digest = files[size_mb]
+                    for engine in args.engines:
+                        for threads in args.threads:
+                            config = {"engine": engine, "url": f"{base_url}/{name}", "save_path": save_path,
+                                      "threads": threads, "sha256": digest}
+                            row = {"scenario": scenario, "engine": engine, "size_mb": size_mb, "threads": threads}
+                            row.update(run_child("download", config))
+                            row["mb_per_s"] = size_mb / row["seconds"] if row.get("ok") else None
+                            row["cpu_per_gb"] = row["cpu"] * 1024 / size_mb if row.get("ok") else None
+                            if not args.no_resume and faults.get("support_range", True):
+                                row["resume"] = run_child("resume", config).get("resume")
+                            results.append(row)
+                            print(f"{scenario:<9} {engine:<6} {size_mb}MB x{threads:<3} "
+                                  f"{'完成' if row.get('ok') else '失败'}")
+            finally:
+                server.shutdown()
+                server.server_close()
+
+    print("\n场景      引擎   大小(MB) 线程  吞吐(MB/s) CPU(s)  CPU(s/GB) 峰值内存(MB) 续传耗时(s)")
+    for row in results:
+        print(f"{row['scenario']:<9} {row['engine']:<6} {row['size_mb']:<8} {row['threads']:<5} "
+              f"{format_value(row.get('mb_per_s'), '<10.1f')} {format_value(row.get('cpu'), '<7.2f')} "
+              f"{format_value(row.get('cpu_per_gb'), '<9.2f')} {format_value(row.get('rss'), '<12.1f')} "
+              f"{format_value(row.get('resume'), '.3f')}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存至: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
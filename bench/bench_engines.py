@@ -0,0 +1,83 @@
+# bench_engines.py
+# 说明：
+# - 在本地 Range 服务器上对比多线程引擎与 asyncio 引擎的下载耗时
+# - 运行：python bench/bench_engines.py [文件大小MB] [并发数...]
+#   例如：python bench/bench_engines.py 256 8 64 256
+
+import os
+import sys
+import time
+import hashlib
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.rangeserver import start_server
+from org.orgdownload import MultiThreadDownloader, AsyncDownloader
+
+
+def make_file(path: str, size: int) -> str:
+    """生成指定大小的随机文件，返回其 sha256"""
+    digest = hashlib.sha256()
+    with open(path, "wb") as f:
+        remaining = size
+        while remaining > 0:
+            data = os.urandom(min(remaining, 4 * 1024 * 1024))
+            f.write(data)
+            digest.update(data)
+            remaining -= len(data)
+    return digest.hexdigest()
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for data in iter(lambda: f.read(4 * 1024 * 1024), b""):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def run_once(downloader, save_path: str, expected: str) -> float:
+    """运行一次下载，返回耗时（秒），校验失败时抛出异常"""
+    for suffix in ("", ".part", ".progress"):
+        if os.path.exists(save_path + suffix):
+            os.remove(save_path + suffix)
+    started = time.perf_counter()
+    if not downloader.download(resume=False):
+        raise RuntimeError("下载失败")
+    elapsed = time.perf_counter() - started
+    if file_sha256(save_path) != expected:
+        raise RuntimeError("校验失败")
+    return elapsed
+
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    concurrency_list = [int(x) for x in sys.argv[2:]] or [8, 64]
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        source = os.path.join(work_dir, "model.bin")
+        expected = make_file(source, size_mb * 1024 * 1024)
+        server, base_url = start_server(work_dir)
+        url = f"{base_url}/model.bin"
+        save_path = os.path.join(work_dir, "out.bin")
+
+        results = []
+        try:
+            for concurrency in concurrency_list:
+                for engine, downloader in (
+                    ("thread", MultiThreadDownloader(url, save_path, thread_count=concurrency)),
+                    ("async", AsyncDownloader(url, save_path, concurrency=concurrency)),
+                ):
+                    elapsed = run_once(downloader, save_path, expected)
+                    results.append((engine, concurrency, elapsed, size_mb / elapsed))
+        finally:
+            server.shutdown()
+
+    print("\n引擎     并发   耗时(s)   吞吐(MB/s)")
+    for engine, concurrency, elapsed, speed in results:
+        print(f"{engine:<8} {concurrency:<6} {elapsed:<9.2f} {speed:.1f}")
+
+
+if __name__ == "__main__":
+    main()
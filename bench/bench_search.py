@@ -0,0 +1,107 @@
+# bench_search.py
+# 说明：
+# - 目录搜索基准测试：生成指定数量的模拟条目，对比逐条 difflib 的原实现与三元组索引（org/orgsearch.py）
+# - 统计建索引耗时和每次查询的耗时（中位数 / p95），并核对两种实现的结果
+#   （索引不返回完全没有公共三元组的“巧合相似”条目，核对时单独列出这部分差异）
+# - 运行：python bench/bench_search.py [条目数] [--top 10] [--baseline-limit 5000]
+
+import os
+import sys
+import time
+import random
+import difflib
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from org.orgsearch import SearchIndex
+
+FAMILIES = ["llama", "qwen2.5", "mistral", "gemma", "phi", "deepseek-r1", "yi", "baichuan", "chatglm",
+            "internlm", "falcon", "mixtral", "codellama", "starcoder", "minicpm", "glm-4", "tinyllama",
+            "openchat", "vicuna", "zephyr", "orion", "aquila", "skywork", "xverse", "command-r"]
+SIZES = ["0.5b", "1.5b", "3b", "7b", "8b", "13b", "14b", "32b", "70b", "72b"]
+VARIANTS = ["", "instruct", "chat", "coder", "math", "base", "distill", "vl", "long"]
+QUANTS = ["q2_k", "q3_k_m", "q4_0", "q4_k_m", "q5_k_m", "q6_k", "q8_0", "f16", "iq4_xs"]
+
+QUERIES = ["qwen2.5 7b instruct", "llama", "deepseek", "mistral 7b q4", "qwen 7b", "lama 3b chat",
+           "gema 2b", "codellama 13b", "q4_k_m", "7b", "xyzzy", "minicpm-v", "phi 3b instruct q8"]
+
+
+def make_catalog(count: int, seed: int = 1) -> dict:
+    """生成 count 个模拟条目"""
+    rnd = random.Random(seed)
+    catalog = {}
+    for i in range(count):
+        parts = [rnd.choice(FAMILIES), rnd.choice(SIZES), rnd.choice(VARIANTS), rnd.choice(QUANTS)]
+        name = "-".join(p for p in parts if p)
+        if rnd.random() < 0.3:
+            name = f"{name}-v{rnd.randint(1, 9)}"
+        catalog[f"m{i}"] = {"name": name, "url": f"https://example.com/{i}.gguf", "d_name": f"{name}.gguf"}
+    return catalog
+
+
+def baseline_search(data: dict, search_name: str) -> list:
+    """原 search_by_name 的实现：对每个条目做子串判断和 SequenceMatcher"""
+    matches = []
+    for key, value in data.items():
+        name = value.get("name", "")
+        if search_name.lower() in name.lower() or \
+                difflib.SequenceMatcher(None, name.lower(), search_name.lower()).ratio() > 0.5:
+            matches.append((key, value))
+    return matches
+
+
+def timed(func, repeat: int) -> list:
+    """运行 repeat 次，返回每次的耗时（毫秒）"""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - started) * 1000)
+    return times
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="目录搜索基准测试")
+    parser.add_argument("count", nargs="?", type=int, default=50000, help="条目数，默认 50000")
+    parser.add_argument("--top", type=int, default=10, help="每次查询返回的结果数")
+    parser.add_argument("--repeat", type=int, default=50, help="每个查询重复的次数")
+    parser.add_argument("--baseline-limit", type=int, default=5000,
+                        help="原实现只在前 N 个条目上测（全部条目太慢），耗时按比例换算")
+    args = parser.parse_args(argv)
+
+    catalog = make_catalog(args.count)
+    started = time.perf_counter()
+    index = SearchIndex(catalog)
+    print(f"{args.count} 个条目，建索引耗时 {time.perf_counter() - started:.2f} 秒\n")
+
+    sample = dict(list(catalog.items())[:args.baseline_limit])
+    sample_index = SearchIndex(sample)
+    scale = args.count / len(sample)
+
+    print(f"{'查询':<22} {'索引 top-k 中位(ms)':<20} {'p95(ms)':<10} {'索引全部(ms)':<14} {'原实现(ms,换算)':<16} 差异")
+    all_medians = []
+    for query in QUERIES:
+        top_times = timed(lambda: index.search(query, args.top), args.repeat)
+        full_times = timed(lambda: index.search(query, None), max(1, args.repeat // 10))
+        base_times = timed(lambda: baseline_search(sample, query), 1)
+
+        # 在样本上核对结果：索引的结果必须全部满足原规则；原实现多出的只应是没有公共三元组的巧合相似
+        expected = {key for key, _ in baseline_search(sample, query)}
+        got = {key for key, _, _ in sample_index.search(query, None)}
+        if got - expected:
+            raise RuntimeError(f"索引返回了不满足原规则的条目: {query} {sorted(got - expected)[:5]}")
+        missing = len(expected - got)
+
+        median = statistics.median(top_times)
+        all_medians.append(median)
+        p95 = sorted(top_times)[int(len(top_times) * 0.95) - 1]
+        print(f"{query:<22} {median:<20.3f} {p95:<10.3f} {statistics.median(full_times):<14.2f} "
+              f"{base_times[0] * scale:<16.0f} {f'漏 {missing}/{len(expected)}' if missing else '-'}")
+
+    print(f"\n全部查询 top-{args.top} 耗时中位数: {statistics.median(all_medians):.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+# rangeserver.py
+# 说明：
+# - 本地测试用的 HTTP 文件服务器，支持 HEAD / Range / ETag，用于离线对比下载引擎
+# - 可注入故障：首字节延迟、单连接限速、随机断开连接（RST）、不支持 Range
+# - 可单独运行：python bench/rangeserver.py <目录> [端口] [--latency 秒] [--throttle 字节/秒] [--reset 概率] [--no-range]
+# - 也可在脚本中调用 start_server() 在后台线程启动
+
+import os
+import re
+import sys
+import time
+import random
+import socket
+import struct
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class RangeRequestHandler(BaseHTTPRequestHandler):
+    """支持 Range 请求的静态文件处理器"""
+
+    protocol_version = "HTTP/1.1"
+    root = "."
+
+    # 故障注入参数，通过 start_server() 的关键字参数设置
+    # 每个请求在发送响应前等待的秒数
+    latency = 0.0
+    # 单个连接的发送速度上限（字节/秒），0 表示不限速
+    throttle = 0
+    # 每个响应被中途断开的概率（只对不小于 reset_min_bytes 的响应生效，避免探测请求失败）
+    reset_rate = 0.0
+    reset_min_bytes = 64 * 1024
+    # False 时忽略 Range 请求，总是返回整个文件（模拟不支持断点续传的服务器）
+    support_range = True
+
+    def log_message(self, format, *args):
+        # 压测时不输出访问日志
+        pass
+
+    def send_file(self, with_body: bool):
+        path = os.path.join(self.root, self.path.split("?", 1)[0].lstrip("/"))
+        if not os.path.isfile(path):
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        stat = os.stat(path)
+        size = stat.st_size
+        etag = f'"{int(stat.st_mtime):x}-{size:x}"'
+        start, end, status = 0, size - 1, 200
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        range_header = self.headers.get("Range") if self.support_range else None
+        if_range = self.headers.get("If-Range")
+        match = re.match(r"bytes=(\d*)-(\d*)$", range_header or "")
+        if match and (if_range is None or if_range == etag):
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            else:
+                # bytes=-N 表示最后 N 个字节
+                start = max(size - int(match.group(2)), 0)
+            if start >= size:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            status = 206
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(end - start + 1))
+        if self.support_range:
+            self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+
+        if with_body:
+            self.send_body(path, start, end)
+
+    def send_body(self, path: str, start: int, end: int):
+        length = end - start + 1
+        # 需要注入断开时，随机选一个断开位置
+        reset_at = None
+        if self.reset_rate and length >= self.reset_min_bytes and random.random() < self.reset_rate:
+            reset_at = random.randrange(length)
+        # 限速时每次只发送约 1/20 秒的数据
+        piece = min(256 * 1024, max(self.throttle // 20, 1024)) if self.throttle else 256 * 1024
+        started = time.monotonic()
+
+        with open(path, "rb") as f:
+            f.seek(start)
+            sent = 0
+            while sent < length:
+                size = min(length - sent, piece)
+                if reset_at is not None:
+                    size = min(size, reset_at - sent)
+                    if size <= 0:
+                        self.reset_connection()
+                        return
+                data = f.read(size)
+                if not data:
+                    break
+                try:
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # 客户端提前断开（例如范围被拆走）
+                    return
+                sent += len(data)
+                if self.throttle:
+                    delay = sent / self.throttle - (time.monotonic() - started)
+                    if delay > 0:
+                        time.sleep(delay)
+
+    def reset_connection(self):
+        """以 RST 方式立即断开当前连接（SO_LINGER 超时为 0 时 close 会发送 RST）"""
+        self.close_connection = True
+        try:
+            self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+            self.connection.close()
+        except OSError:
+            pass
+
+    def do_HEAD(self):
+        self.send_file(with_body=False)
+
+    def do_GET(self):
+        self.send_file(with_body=True)
+
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    """客户端主动断开（例如范围被拆走后关闭连接）时不打印异常"""
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def start_server(root: str, port: int = 0, handler=RangeRequestHandler, **faults):
+    """
+    在后台线程启动文件服务器
+
+    Args:
+        root: 提供文件的目录
+        port: 监听端口，0 表示随机端口
+        handler: 请求处理器类
+        **faults: 故障注入参数（latency / throttle / reset_rate / reset_min_bytes / support_range）
+
+    Returns:
+        (server, base_url)，用完后调用 server.shutdown()
+    """
+    for name in faults:
+        if not hasattr(handler, name):
+            raise ValueError(f"未知的故障参数: {name}")
+    handler_class = type("BoundHandler", (handler,), {"root": root, **faults})
+    server = QuietHTTPServer(("127.0.0.1", port), handler_class)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="支持 Range 和故障注入的本地文件服务器")
+    parser.add_argument("root", help="提供文件的目录")
+    parser.add_argument("port", nargs="?", type=int, default=8000, help="监听端口")
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的首字节延迟（秒）")
+    parser.add_argument("--throttle", type=int, default=0, help="单连接限速（字节/秒）")
+    parser.add_argument("--reset", type=float, default=0.0, help="响应被中途断开的概率")
+    parser.add_argument("--no-range", action="store_true", help="模拟不支持 Range 的服务器")
+    args = parser.parse_args()
+
+    server, base_url = start_server(args.root, args.port, latency=args.latency, throttle=args.throttle,
+                                    reset_rate=args.reset, support_range=not args.no_range)
+    print(f"服务已启动: {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
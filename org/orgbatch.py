@@ -0,0 +1,207 @@
+# orgbatch.py
+# 说明：
+# - 无交互的批量下载命令行，供无界面的 Linux 推理服务器用脚本部署模型
+# - 按名称或通配符（匹配目录中的键、name、d_name，不区分大小写）从目录 YAML 中选出条目，
+#   交给下载队列并发下载（多线程分段引擎），结束后写出 JSON 清单：结果、大小、sha256、耗时
+# - 目录参数可以是一个目录文件夹，此时合并其中全部 YAML（相同模型只下载一次）
+# - 运行：python -m org.orgbatch <目录.yml 或文件夹> <名称或通配符...> [--dir download] [--jobs 2]
+#         [--threads 8] [--connections 16] [--limit 字节/秒] [--manifest manifest.json]
+# - 全部成功时退出码为 0，目录读取失败、有条目未匹配或下载失败时为 1；下载过程的提示信息输出到标准错误
+
+import os
+import sys
+import json
+import time
+import fnmatch
+import argparse
+from contextlib import redirect_stdout
+
+import yaml
+
+from org.orgread import get_catalog, CatalogIndex
+from org.orgmanager import DownloadManager, DONE, FAILED, CANCELED, PAUSED
+from org.orgdownload import cached_sha256
+from org.orgstore import ModelStore
+from org.orgprobe import LinkChecker
+from org.orggguf import load_gguf_meta
+from org.orgextract import load_bundle_manifest
+
+
+def load_catalog(path: str) -> tuple:
+    """
+    读取目录 YAML，path 为文件夹时读取其中全部目录的合并索引
+
+    Args:
+        path: 目录文件或文件夹路径
+
+    Returns:
+        ({键: 条目}, {读取失败的文件: 错误信息})；文件夹中个别文件读取失败时其余文件照常合并
+
+    Raises:
+        OSError, yaml.YAMLError, ValueError: path 是文件且不存在、无法读取或格式错误
+    """
+    if os.path.isdir(path):
+        index = CatalogIndex(path)
+        return index.data, dict(index.errors)
+    return get_catalog(path).data, {}
+
+
+def match_entries(catalog: dict, patterns: list) -> tuple:
+    """
+    按名称或通配符选出条目，每个条目只选一次
+
+    Args:
+        catalog: load_catalog() 的结果
+        patterns: 名称或通配符列表，与条目的键、name、d_name 比较（不区分大小写）
+
+    Returns:
+        ([(键, 条目), ...], 没有匹配到任何条目的模式列表)
+    """
+    selected = {}
+    unmatched = []
+    for pattern in patterns:
+        pattern_lower = pattern.lower()
+        found = False
+        for key, value in catalog.items():
+            if not isinstance(value, dict):
+                continue
+            # 合并索引的键是内部标识，同时匹配条目在原目录中的键
+            names = [str(key), str(value.get("key", "")), value.get("name", ""), value.get("d_name", "")]
+            if any(fnmatch.fnmatchcase(name.lower(), pattern_lower) for name in names if name):
+                selected.setdefault(key, value)
+                found = True
+        if not found:
+            unmatched.append(pattern)
+    return list(selected.items()), unmatched
+
+
+def file_info(path: str, with_hash: bool) -> dict:
+    """下载完成的文件的大小和 sha256（sha256 按大小/修改时间缓存，已校验过的文件不再重新计算）"""
+    if not os.path.exists(path):
+        return {"size": None, "sha256": None}
+    return {"size": os.path.getsize(path), "sha256": cached_sha256(path) if with_hash else None}
+
+
+def write_manifest(path: str, manifest: dict):
+    """写出清单，path 为 "-" 时输出到标准输出"""
+    text = json.dumps(manifest, ensure_ascii=False, indent=2)
+    if path == "-":
+        print(text)
+        return
+    tmp_file = f"{path}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_file, path)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="按目录 YAML 批量下载模型（无交互）")
+    parser.add_argument("catalog", help="目录 YAML 文件，或包含多个目录的文件夹")
+    parser.add_argument("patterns", nargs="*", help="条目的键、name 或 d_name，支持 * ? [] 通配符")
+    parser.add_argument("--all", action="store_true", help="下载目录中的全部条目")
+    parser.add_argument("--dir", default="download", help="保存目录，默认 download")
+    parser.add_argument("--jobs", type=int, default=2, help="同时下载的文件数")
+    parser.add_argument("--threads", type=int, default=8, help="每个文件的下载线程数")
+    parser.add_argument("--connections", type=int, default=16, help="全部文件合计的最大连接数")
+    parser.add_argument("--limit", type=float, default=None, help="全部文件合计的带宽上限（字节/秒）")
+    parser.add_argument("--manifest", default="manifest.json", help="结果清单路径，- 表示输出到标准输出")
+    parser.add_argument("--no-hash", action="store_true", help="清单中不计算未提供 sha256 的文件的哈希")
+    parser.add_argument("--store", default=None, help="内容寻址存储目录，默认为 <保存目录>/.store")
+    parser.add_argument("--no-store", action="store_true", help="不使用内容寻址存储（每个文件单独保存）")
+    parser.add_argument("--no-probe", action="store_true", help="不预先检测镜像，按目录中的顺序使用")
+    parser.add_argument("--dry-run", action="store_true", help="只列出匹配的条目，不下载")
+    args = parser.parse_intermixed_args(argv)
+
+    if not args.patterns and not args.all:
+        parser.error("请指定要下载的条目名称/通配符，或使用 --all")
+
+    try:
+        # 合并索引会提示读取失败的文件，标准输出只留给清单
+        with redirect_stdout(sys.stderr):
+            catalog, catalog_errors = load_catalog(args.catalog)
+    except (OSError, yaml.YAMLError, ValueError) as e:
+        print(f"读取目录失败 {args.catalog}: {e}", file=sys.stderr)
+        return 1
+    entries, unmatched = match_entries(catalog, ["*"] if args.all else args.patterns)
+    for pattern in unmatched:
+        print(f"未找到匹配的条目: {pattern}", file=sys.stderr)
+
+    if args.dry_run:
+        for key, value in entries:
+            print(f"{key}\t{value.get('name', '')}\t{value.get('d_name', '')}\t{value.get('url', '')}")
+        return 0 if entries and not unmatched and not catalog_errors else 1
+
+    def report(job):
+        print(f"[{job.status}] {job.name}{'：' + job.error if job.error else ''}", file=sys.stderr)
+
+    # 下载器的提示信息改为输出到标准错误，标准输出只留给清单，便于脚本处理
+    stdout, sys.stdout = sys.stdout, sys.stderr
+    store = None if args.no_store else ModelStore(args.store or os.path.join(args.dir, ".store"))
+    manager = DownloadManager(max_jobs=args.jobs, max_connections=args.connections,
+                              max_bytes_per_second=args.limit, thread_count=args.threads,
+                              on_change=report, store=store,
+                              link_checker=None if args.no_probe else LinkChecker())
+    started = time.time()
+    jobs = []
+    rows = []
+    for key, value in entries:
+        row = {"key": key, "name": value.get("name", ""), "d_name": value.get("d_name", ""),
+               "url": value.get("url", ""), "expected_sha256": value.get("sha256")}
+        try:
+            jobs.append((row, manager.add_entry(value, args.dir)))
+        except ValueError as e:
+            row.update({"status": FAILED, "error": str(e)})
+        rows.append(row)
+
+    try:
+        manager.wait()
+    except KeyboardInterrupt:
+        print("\n已中断，正在保存进度...", file=sys.stderr)
+        manager.shutdown()
+    finally:
+        sys.stdout = stdout
+
+    for row, job in jobs:
+        row.update({
+            "path": os.path.abspath(job.save_path),
+            "status": job.status,
+            "error": job.error,
+            "seconds": round(job.finished_at - job.started_at, 3) if job.started_at and job.finished_at else None,
+        })
+        bundle = load_bundle_manifest(job.save_path) if job.status == DONE else None
+        if bundle:
+            # 压缩包已解压并删除，清单中列出各成员（sha256 在解压时已算出）
+            row.update({"size": sum(m["size"] for m in bundle["members"]), "sha256": job.sha256,
+                        "extract_dir": bundle["dest_dir"], "members": bundle["members"]})
+        elif job.status == DONE:
+            row.update(file_info(job.save_path, not args.no_hash))
+            # 不计算哈希时，已在下载过程中校验过的 sha256 仍写入清单
+            row["sha256"] = row["sha256"] or job.sha256
+            meta = load_gguf_meta(job.save_path)
+            if meta:
+                row["gguf"] = {key: meta.get(key) for key in
+                               ("version", "tensor_count", "architecture", "name", "quant", "context_length")}
+        else:
+            row.update({"size": None, "sha256": None})
+
+    ok = not unmatched and not catalog_errors and all(row.get("status") == DONE for row in rows)
+    manifest = {
+        "catalog": os.path.abspath(args.catalog),
+        "save_dir": os.path.abspath(args.dir),
+        "started": started,
+        "finished": time.time(),
+        "ok": ok,
+        "unmatched": unmatched,
+        "catalog_errors": catalog_errors,
+        "entries": rows,
+    }
+    write_manifest(args.manifest, manifest)
+
+    done = sum(row.get("status") == DONE for row in rows)
+    failed = sum(row.get("status") in (FAILED, CANCELED, PAUSED) for row in rows)
+    print(f"完成 {done} 个，未完成 {failed} 个，未匹配 {len(unmatched)} 个；清单: {args.manifest}", file=sys.stderr)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,9 +6,12 @@ from tqdm import tqdm
 from threading import Thread
 
 def url_get(url):
+    # 只请求第一个字节并以流式打开，不会为了一个状态码把整个文件拉下来；
+    # 需要延迟/吞吐和缓存时使用 org.orgprobe.LinkChecker
     try:
-        res = requests.get(url,timeout=5,allow_redirects=True)
-        return res.status_code < 400
+        with requests.get(url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=5,
+                          allow_redirects=True) as res:
+            return res.status_code < 400
     except requests.Timeout:
         return False
     except (requests.ConnectionError, requests.Timeout,requests.TooManyRedirects):
@@ -17,120 +20,1816 @@ def url_get(url):
 
 import os
 import sys
+import json
+import base64
+import shutil
+import hashlib
+import queue
+import random
+import weakref
 import threading
 import requests
 from pathlib import Path
 from typing import Optional, Callable
+from collections import deque
+from contextlib import nullcontext
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
+import asyncio
 import urllib3
 
+from org.orggguf import (GGUFError, HEADER_MAX_SIZE, read_gguf_header, read_gguf_file, check_gguf_expect,
+                         describe_gguf, save_gguf_meta)
+from org.orgextract import BundleExtractor, archive_mode, bundle_complete, save_bundle_manifest
+
+try:
+    # httpx 的 HTTP/2 支持依赖 h2，未安装时异步引擎退回 HTTP/1.1
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
 # 禁用SSL警告
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# 每个主机共享一个连接池的最大连接数
+SESSION_POOL_SIZE = 64
+
+# 计算文件哈希时每次读取的大小
+HASH_READ_SIZE = 4 * 1024 * 1024
+
+# 下载时每次从连接读取的最大字节数（每个线程复用一块这么大的缓冲区）
+READ_BUFFER_SIZE = 1024 * 1024
+
+# 写盘线程一次合并写入的最多缓冲区数（不超过系统的 IOV_MAX）
+WRITE_BATCH_BUFFERS = 64
+
+# 自动调节连接数时记录每个主机最佳连接数的文件
+TUNE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "host_tune.json")
+_tune_lock = threading.Lock()
+
+# 按 (协议, 主机) 缓存的 keep-alive 会话，同一主机的多个下载/多个范围复用连接
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def read_into(response: requests.Response, view: memoryview) -> int:
+    """
+    从流式响应中读取数据，直接写入调用方提供的缓冲区
+
+    未压缩的响应直接调用 http.client 的 readinto，数据从套接字读入 view，
+    不经过 urllib3 的中间缓冲和 bytes 拷贝；有 Content-Encoding 时退回 urllib3 的解码读取。
+
+    Args:
+        response: stream=True 发出的请求的响应
+        view: 接收数据的缓冲区
+
+    Returns:
+        读取的字节数，0 表示响应已读完
+    """
+    raw = response.raw
+    fp = getattr(raw, '_fp', None)
+    if fp is not None and 'Content-Encoding' not in response.headers:
+        return fp.readinto(view)
+    return raw.readinto(view)
+
+
+def finish_response(response: requests.Response):
+    """
+    关闭 read_into() 读完的响应：数据已读完时把连接归还连接池，否则直接断开
+
+    requests 只在 iter_content 读完时才会归还连接，绕过它读取时需要自己归还。
+    """
+    raw = response.raw
+    fp = getattr(raw, '_fp', None)
+    if fp is not None and fp.isclosed():
+        raw.release_conn()
+    response.close()
+
+
+def load_tuned_threads(url: str) -> Optional[int]:
+    """
+    读取之前为该主机学到的最佳连接数
+
+    Args:
+        url: 下载地址
+
+    Returns:
+        连接数，没有记录时返回None
+    """
+    host = urllib3.util.parse_url(url).netloc
+    with _tune_lock:
+        try:
+            with open(TUNE_FILE, 'r', encoding='utf-8') as f:
+                record = json.load(f).get(host)
+        except (OSError, ValueError):
+            return None
+    return int(record['threads']) if record else None
+
+
+def save_tuned_threads(url: str, threads: int, speed: float):
+    """
+    记录该主机的最佳连接数，供以后的下载作为初始连接数
+
+    Args:
+        url: 下载地址
+        threads: 最佳连接数
+        speed: 该连接数下的吞吐（字节/秒）
+    """
+    host = urllib3.util.parse_url(url).netloc
+    with _tune_lock:
+        try:
+            with open(TUNE_FILE, 'r', encoding='utf-8') as f:
+                records = json.load(f)
+        except (OSError, ValueError):
+            records = {}
+        records[host] = {'threads': threads, 'speed': round(speed), 'updated': int(time.time())}
+        tmp_file = f"{TUNE_FILE}.tmp"
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(records, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_file, TUNE_FILE)
+        except OSError as e:
+            print(f"\n保存连接数记录失败: {e}")
+
+
+def range_validator(info: dict) -> Optional[str]:
+    """
+    取得 If-Range 可用的校验值：强 ETag 优先，其次 Last-Modified（弱 ETag 不能用于 If-Range）
+
+    Args:
+        info: probe 得到的文件信息
+
+    Returns:
+        校验值，服务器两者都没有提供时返回None
+    """
+    etag = info.get('etag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return info.get('last_modified')
+
+
+def same_remote(state: dict, etag: Optional[str], last_modified: Optional[str]) -> bool:
+    """按 ETag（双方都没有时按 Last-Modified）判断记录中的远程文件与当前的是否为同一个"""
+    if state.get('etag') or etag:
+        return state.get('etag') == etag
+    return state.get('last_modified') == last_modified
+
+
+def load_remote_record(path: str) -> Optional[dict]:
+    """读取下载完成时记录的远程文件信息（<文件>.remote），不存在或损坏时返回None"""
+    try:
+        with open(f"{path}.remote", 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_remote_record(path: str, url: str, info: dict):
+    """
+    下载完成后记录远程文件的大小/ETag/Last-Modified 和本地文件的修改时间，
+    以后远程文件未变化、本地文件也未被改动时可以跳过下载
+    """
+    stat = os.stat(path)
+    record = {
+        'url': url,
+        'size': info.get('size'),
+        'etag': info.get('etag'),
+        'last_modified': info.get('last_modified'),
+        'mtime_ns': stat.st_mtime_ns,
+    }
+    try:
+        with open(f"{path}.remote", 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False)
+    except OSError as e:
+        print(f"\n保存远程文件信息失败: {str(e)}")
+
+
+class ProgressCounter:
+    """单个线程独占的已下载字节计数，只在读取进度时汇总，写入时不需要加锁"""
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+
+def get_session(url: str) -> requests.Session:
+    """
+    获取目标主机共享的 keep-alive 会话
+
+    Args:
+        url: 请求的URL
+
+    Returns:
+        该主机的 requests.Session（线程安全的 urllib3 连接池）
+    """
+    parts = urllib3.util.parse_url(url)
+    key = (parts.scheme, parts.host, parts.port)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            session.verify = False
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=SESSION_POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _sessions[key] = session
+        return session
+
+
+class BandwidthShare:
+    """
+    一个下载任务在共享令牌桶中的份额
+
+    同一时间活跃的份额按优先级（权重）分配桶的速率：只有一个任务在下载时它独占全部带宽，
+    多个任务同时下载时，优先级 2 的任务得到的带宽是优先级 1 的两倍。priority 可以随时修改。
+    """
+
+    def __init__(self, bucket: 'TokenBucket', priority: float = 1.0):
+        self.bucket = bucket
+        self.priority = priority
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        # 在此时间之前该份额被视为活跃（正在下载或正在等待令牌）
+        self.active_until = 0.0
+
+    def reserve(self, amount: int) -> float:
+        return self.bucket.reserve(amount, self)
+
+    def pending(self) -> float:
+        return self.bucket.pending(self)
+
+    def consume(self, amount: int):
+        self.bucket.consume(amount, self)
+
+
+class TokenBucket:
+    """
+    令牌桶限速器，可在多个线程、多个下载任务之间共享，速率可以在运行中修改
+
+    每个下载任务通过 share() 取得一个份额，活跃的份额按优先级分配速率，各自维护令牌；
+    reserve() 先扣除令牌再返回需要等待的秒数（允许欠账），调用方在锁外等待，
+    多线程引擎用 consume() 直接睡眠，异步引擎按 reserve()/pending() 用 asyncio.sleep() 等待。
+    等待期间速率或优先级被修改时，按新的速率重新计算剩余等待时间。
+    """
+
+    # 份额在最近一次取令牌（加上需要等待的时间）之后多少秒内仍视为活跃
+    ACTIVE_WINDOW = 1.0
+    # 等待令牌时每次最多睡眠的秒数，以便尽快响应速率修改
+    MAX_SLEEP = 0.2
+
+    def __init__(self, rate: Optional[float], burst: Optional[float] = None):
+        """
+        Args:
+            rate: 每秒允许的字节数，None 或 0 表示不限速（之后可以用 set_rate() 开启）
+            burst: 桶容量（字节），默认等于一秒的量
+        """
+        self.rate = rate or None
+        self.burst_setting = burst
+        self.burst = burst or rate or 0
+        self.lock = threading.Lock()
+        self.shares = weakref.WeakSet()
+        # 未指定份额的调用（旧接口）共用一个默认份额
+        self.default_share = self.share()
+
+    def share(self, priority: float = 1.0) -> BandwidthShare:
+        """
+        为一个下载任务创建份额
+
+        Args:
+            priority: 优先级（权重，大于0），同时下载时按比例分配带宽
+        """
+        share = BandwidthShare(self, priority)
+        with self.lock:
+            self.shares.add(share)
+        return share
+
+    def set_rate(self, rate: Optional[float], burst: Optional[float] = None):
+        """
+        修改速率，正在等待令牌的线程会按新的速率继续
+
+        Args:
+            rate: 每秒允许的字节数，None 或 0 表示不限速
+            burst: 桶容量，默认沿用创建时的设置（未设置时等于一秒的量）
+        """
+        with self.lock:
+            now = time.monotonic()
+            if self.rate:
+                # 先按旧速率结算到现在
+                for share in list(self.shares):
+                    self.refill(share, now)
+            self.rate = rate or None
+            if burst is not None:
+                self.burst_setting = burst
+            self.burst = self.burst_setting or rate or 0
+            for share in list(self.shares):
+                share.updated = now
+                # 不限速期间没有扣除令牌，恢复限速时不应带着之前的欠账
+                share.tokens = min(share.tokens, self.burst) if self.rate else 0.0
+
+    def refill(self, share: BandwidthShare, now: float) -> float:
+        """
+        按份额当前应得的速率补充令牌（调用方持有锁）
+
+        Returns:
+            该份额当前的速率（字节/秒）
+        """
+        active = [s for s in self.shares if s.active_until >= now or s is share]
+        # 优先级不大于0时按极小的权重处理，避免除以0
+        ratio = max(share.priority, 0.01) / sum(max(s.priority, 0.01) for s in active)
+        rate = self.rate * ratio
+        share.tokens = min(self.burst * ratio, share.tokens + (now - share.updated) * rate)
+        share.updated = now
+        return rate
+
+    def reserve(self, amount: int, share: Optional[BandwidthShare] = None) -> float:
+        """取走 amount 个令牌，返回调用方需要等待的秒数"""
+        if not self.rate:
+            return 0.0
+        share = share or self.default_share
+        with self.lock:
+            now = time.monotonic()
+            rate = self.refill(share, now)
+            share.tokens -= amount
+            wait = 0.0 if share.tokens >= 0 else -share.tokens / rate
+            share.active_until = now + wait + self.ACTIVE_WINDOW
+            return wait
+
+    def pending(self, share: Optional[BandwidthShare] = None) -> float:
+        """按当前速率计算还需要等待的秒数（reserve() 之后速率或优先级可能已被修改）"""
+        if not self.rate:
+            return 0.0
+        share = share or self.default_share
+        with self.lock:
+            now = time.monotonic()
+            rate = self.refill(share, now)
+            wait = 0.0 if share.tokens >= 0 else -share.tokens / rate
+            share.active_until = max(share.active_until, now + wait + self.ACTIVE_WINDOW)
+            return wait
+
+    def consume(self, amount: int, share: Optional[BandwidthShare] = None):
+        """取走 amount 个令牌，不足时阻塞等待"""
+        wait = self.reserve(amount, share)
+        while wait > 0:
+            time.sleep(min(wait, self.MAX_SLEEP))
+            wait = self.pending(share)
+
+
+class ConnectionTuner:
+    """
+    按 AIMD 方式调节连接数
+
+    每隔一段时间根据总吞吐调用一次 update()：吞吐随连接数增加而明显提升时继续加性增加；
+    增加后吞吐不再提升，则退回到吞吐最高的连接数并停止增加；
+    出现连接失败（服务器限流、断开连接）时乘性减少，并从减少后的连接数重新探测。
+    """
+
+    def __init__(self, count: int, minimum: int = 1, maximum: int = 32, step: int = 2,
+                 backoff: float = 0.5, tolerance: float = 0.1):
+        """
+        Args:
+            count: 初始连接数
+            minimum: 最少连接数
+            maximum: 最多连接数
+            step: 每次增加的连接数
+            backoff: 出现失败时连接数乘以的系数
+            tolerance: 吞吐至少提升这个比例才算“明显提升”
+        """
+        self.minimum = minimum
+        self.maximum = maximum
+        self.step = step
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.count = max(minimum, min(count, maximum))
+        self.best_count = self.count
+        self.best_speed = 0.0
+        self.settled = False
+        self.samples = 0
+
+    def update(self, speed: float, failures: int) -> int:
+        """
+        根据上一个周期的结果调整连接数
+
+        Args:
+            speed: 上一个周期的总吞吐（字节/秒）
+            failures: 上一个周期内失败的请求数
+
+        Returns:
+            新的连接数
+        """
+        self.samples += 1
+        if failures:
+            self.count = max(self.minimum, int(self.count * self.backoff))
+            self.best_count = self.count
+            self.best_speed = 0.0
+            self.settled = False
+        elif speed > self.best_speed * (1 + self.tolerance):
+            self.best_count, self.best_speed = self.count, speed
+            if not self.settled:
+                self.count = min(self.maximum, self.count + self.step)
+        elif self.count > self.best_count:
+            # 增加连接后吞吐没有明显提升，退回到最佳连接数
+            self.count = self.best_count
+            self.settled = True
+        return self.count
+
+
+class WorkRange:
+    """调度器分配给下载线程的一段连续字节范围"""
+
+    def __init__(self, start: int, end: int):
+        self.start = start
+        # end 可能被调度器缩短（剩余部分被拆给空闲线程）
+        self.end = end
+        # 下一个要写入的字节位置
+        self.pos = start
+        # 当前线程已认领、不会再被拆走的最后一个字节位置
+        self.claimed = start - 1
+
+
+class RangeScheduler:
+    """
+    动态范围调度器（work-stealing）
+
+    文件按 block_size 切成块，再按 piece_blocks 个块一段放入待领取队列，空闲线程按需领取；
+    队列领空后，空闲线程会把剩余未认领块最多的在途范围从中间拆开，接手后半段。
+    所有切分点都落在块边界上，便于按块记录进度。
+    """
+
+    def __init__(self, total_size: int, block_size: int, piece_blocks: int = 16,
+                 done_blocks: Optional[list] = None, allow_split: bool = True):
+        """
+        初始化调度器
+
+        Args:
+            total_size: 文件总大小
+            block_size: 块大小（字节）
+            piece_blocks: 每次领取的范围包含的块数
+            done_blocks: 已完成（无需下载）的块序号
+            allow_split: 是否允许拆分范围，服务器不支持Range时应为False
+        """
+        self.total_size = total_size
+        self.block_size = block_size
+        self.block_count = (total_size + block_size - 1) // block_size
+        self.allow_split = allow_split
+        self.lock = threading.Lock()
+        self.done = bytearray(self.block_count)
+        self.pending = deque()
+        self.active = []
+
+        if not allow_split:
+            # 不支持Range时只能整体顺序下载，也无法续传
+            if total_size:
+                self.pending.append((0, total_size - 1))
+            return
+
+        for i in done_blocks or []:
+            if 0 <= i < self.block_count:
+                self.done[i] = 1
+
+        # 把未完成的块按连续区间、每段最多 piece_blocks 块放入队列
+        i = 0
+        while i < self.block_count:
+            if self.done[i]:
+                i += 1
+                continue
+            j = i
+            while j + 1 < self.block_count and not self.done[j + 1] and j + 1 - i < piece_blocks:
+                j += 1
+            self.pending.append((i * block_size, min((j + 1) * block_size, total_size) - 1))
+            i = j + 1
+
+    def done_bytes(self) -> int:
+        """已完成块的总字节数"""
+        size = sum(self.done) * self.block_size
+        if self.block_count and self.done[-1]:
+            # 最后一块可能不满
+            size -= self.block_count * self.block_size - self.total_size
+        return size
+
+    def idle(self) -> bool:
+        """是否已没有待领取或正在下载的范围"""
+        with self.lock:
+            return not self.pending and not self.active
+
+    def next_range(self) -> Optional[WorkRange]:
+        """领取下一个范围；队列为空时拆分最大的在途范围，无事可做时返回None"""
+        with self.lock:
+            if self.pending:
+                work = WorkRange(*self.pending.popleft())
+                self.active.append(work)
+                return work
+            if not self.allow_split:
+                return None
+
+            # 找剩余未认领块最多的在途范围
+            best, best_blocks = None, 1
+            for work in self.active:
+                first = work.claimed + 1
+                blocks = (work.end - first) // self.block_size + 1 if work.end >= first else 0
+                if blocks > best_blocks:
+                    best, best_blocks = work, blocks
+            if best is None:
+                return None
+
+            first = best.claimed + 1
+            split = first + (best_blocks - best_blocks // 2) * self.block_size
+            stolen = WorkRange(split, best.end)
+            best.end = split - 1
+            self.active.append(stolen)
+            return stolen
+
+    def claim(self, work: WorkRange) -> bool:
+        """认领 work.pos 所在的块，范围已被拆走到 pos 之前时返回False"""
+        with self.lock:
+            if work.pos > work.end:
+                return False
+            block_end = (work.pos // self.block_size + 1) * self.block_size - 1
+            work.claimed = min(block_end, work.end)
+            return True
+
+    def block_done(self, index: int):
+        """标记一个块已写完"""
+        self.done[index] = 1
+
+    def release(self, work: WorkRange) -> int:
+        """
+        归还范围：未完成的部分从所在块的起点重新放回队列
+
+        Returns:
+            需要从进度中扣除的、写了一半的块的字节数
+        """
+        with self.lock:
+            self.active.remove(work)
+            if work.pos > work.end:
+                return 0
+            restart = work.pos // self.block_size * self.block_size if self.allow_split else work.start
+            self.pending.appendleft((restart, work.end))
+            return work.pos - restart
+
+
+class Mirror:
+    """一个下载源（镜像）及其实时吞吐统计"""
+
+    # 连续失败多少次后认为镜像已失效
+    MAX_FAILURES = 3
+
+    def __init__(self, url: str):
+        self.url = url
+        self.session = get_session(url)
+        # 单连接吞吐的指数滑动平均（字节/秒），0 表示尚未测得
+        self.speed = 0.0
+        self.active = 0
+        self.failures = 0
+        self.alive = True
+        # 范围请求 If-Range 使用的校验值，probe 后由 select_mirrors() 设置
+        self.validator = None
+        self.lock = threading.Lock()
+
+    def record(self, nbytes: int, seconds: float):
+        """记录一次范围请求传输的字节数与耗时"""
+        if nbytes <= 0 or seconds <= 0:
+            return
+        with self.lock:
+            speed = nbytes / seconds
+            self.speed = speed if self.speed == 0 else self.speed * 0.7 + speed * 0.3
+            self.failures = 0
+
+    def fail(self) -> bool:
+        """
+        记录一次失败
+
+        Returns:
+            是否已连续失败过多（是否标记为失效由下载器决定，见 MultiThreadDownloader.fail_mirror）
+        """
+        with self.lock:
+            self.failures += 1
+            return self.failures >= self.MAX_FAILURES
+
+
+class DownloadJournal:
+    """
+    断点续传日志（.progress 文件）
+
+    记录远程文件的大小/ETag/Last-Modified、块大小，以及已完成块的位图。
+    写入时先写临时文件并 fsync，再用 os.replace 原子替换，任何时刻崩溃都只会留下旧日志或新日志。
+    调用方须保证：日志中标记完成的块，其数据已经 fsync 到磁盘。
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self, total_size: int, etag: Optional[str], last_modified: Optional[str],
+             strict: bool = True) -> Optional[tuple]:
+        """
+        读取日志并校验远程文件是否仍是同一个
+
+        Args:
+            total_size: 远程文件大小
+            etag: 远程文件的 ETag
+            last_modified: 远程文件的 Last-Modified
+            strict: 为 False 时不比较 ETag/Last-Modified（调用方会逐块校验数据）
+
+        Returns:
+            (块大小, 已完成块序号列表)；日志不存在、损坏或远程文件已变化时返回None
+        """
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get('version') != self.VERSION or state.get('total_size') != total_size:
+                return None
+            if strict and not same_remote(state, etag, last_modified):
+                return None
+            block_size = int(state['block_size'])
+            bitmap = base64.b64decode(state['bitmap'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+        block_count = (total_size + block_size - 1) // block_size
+        blocks = [i for i in range(block_count) if i >> 3 < len(bitmap) and bitmap[i >> 3] & (1 << (i & 7))]
+        return block_size, blocks
+
+    def save(self, total_size: int, block_size: int, etag: Optional[str],
+             last_modified: Optional[str], done: bytes):
+        """
+        原子地写入日志
+
+        Args:
+            total_size: 远程文件大小
+            block_size: 块大小
+            etag: 远程文件的 ETag
+            last_modified: 远程文件的 Last-Modified
+            done: 每个块一个字节的完成标记（非0表示完成）
+        """
+        bitmap = bytearray((len(done) + 7) // 8)
+        for i, flag in enumerate(done):
+            if flag:
+                bitmap[i >> 3] |= 1 << (i & 7)
+        state = {
+            'version': self.VERSION,
+            'total_size': total_size,
+            'block_size': block_size,
+            'etag': etag,
+            'last_modified': last_modified,
+            'bitmap': base64.b64encode(bytes(bitmap)).decode('ascii'),
+        }
+        tmp_file = f"{self.path}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.path)
+
+
+def file_sha256(path: str) -> str:
+    """计算文件的 sha256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for data in iter(lambda: f.read(HASH_READ_SIZE), b''):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def cached_sha256(path: str) -> str:
+    """
+    获取文件的 sha256，结果按 (大小, 修改时间) 缓存在旁边的 <文件>.sha256 中，文件未变化时不再重新计算
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        十六进制 sha256
+    """
+    stat = os.stat(path)
+    cache_file = f"{path}.sha256"
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        if cache.get('size') == stat.st_size and cache.get('mtime_ns') == stat.st_mtime_ns:
+            return cache['sha256']
+    except (OSError, ValueError, KeyError):
+        pass
+    digest = file_sha256(path)
+    save_sha256_cache(path, digest)
+    return digest
+
+
+def save_sha256_cache(path: str, digest: str):
+    """把已知的 sha256 与文件当前的 (大小, 修改时间) 一起写入缓存"""
+    stat = os.stat(path)
+    try:
+        with open(f"{path}.sha256", 'w', encoding='utf-8') as f:
+            json.dump({'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest}, f)
+    except OSError as e:
+        print(f"\n保存校验缓存失败: {str(e)}")
+
+
+class StreamHasher:
+    """
+    下载过程中的整文件 sha256
+
+    sha256 只能按顺序计算，而各线程是乱序完成块的。这里用一个后台线程跟随“已连续完成”的前沿，
+    块一完成就从 .part 文件读回并更新哈希；刚写入的数据还在页缓存中，读回不会产生真正的磁盘读，
+    下载结束时哈希也基本同时算完，不需要再把整个文件读一遍。
+    """
+
+    def __init__(self, path: str, scheduler: RangeScheduler):
+        self.path = path
+        self.scheduler = scheduler
+        self.digest = hashlib.sha256()
+        # 下一个要哈希的块序号
+        self.frontier = 0
+        self.stopped = False
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def run(self):
+        scheduler = self.scheduler
+        try:
+            with open(self.path, 'rb') as f:
+                while not self.stopped and self.frontier < scheduler.block_count:
+                    if not scheduler.done[self.frontier]:
+                        time.sleep(0.05)
+                        continue
+                    f.seek(self.frontier * scheduler.block_size)
+                    size = min(scheduler.block_size, scheduler.total_size - f.tell())
+                    self.digest.update(f.read(size))
+                    self.frontier += 1
+        except OSError as e:
+            self.error = e
+
+    def stop(self):
+        self.stopped = True
+        self.thread.join()
+
+    def hexdigest(self) -> Optional[str]:
+        """等待全部块哈希完成并返回结果，中途停止或出错时返回None"""
+        self.thread.join()
+        if self.error is not None or self.frontier < self.scheduler.block_count:
+            return None
+        return self.digest.hexdigest()
+
+
+class DiskWriter:
+    """
+    专用写盘线程：下载线程把读满的缓冲区放入有界队列，由本线程把相邻的数据合并后按偏移写入
+
+    缓冲区来自固定数量的缓冲池，池空时下载线程等待，写入队列占用的内存不超过 buffer_count × buffer_size。
+    块的完成标记也经由队列传递，写盘线程在该块的数据写入文件后才向调度器标记完成，
+    保证断点续传日志里的块都已写入（fsync_blocks 为 True 时先 fsync 再标记）。
+    """
+
+    def __init__(self, path: str, scheduler: 'RangeScheduler', buffer_count: int = 64,
+                 buffer_size: int = READ_BUFFER_SIZE, fsync_blocks: bool = False):
+        """
+        Args:
+            path: 写入的文件（需已预分配）
+            scheduler: 块写入后向其标记完成的调度器
+            buffer_count: 缓冲池中的缓冲区数量
+            buffer_size: 每个缓冲区的大小
+            fsync_blocks: 是否在标记块完成前 fsync
+        """
+        self.path = path
+        self.scheduler = scheduler
+        self.fsync_blocks = fsync_blocks
+        self.buffers = queue.Queue()
+        for _ in range(buffer_count):
+            self.buffers.put(bytearray(buffer_size))
+        # 队列中的项：(偏移, 缓冲区, 长度) 表示一段数据，int 表示块完成标记，None 表示结束
+        self.queue = queue.Queue(buffer_count * 2)
+        self.lock = threading.Lock()
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def acquire(self) -> bytearray:
+        """从缓冲池取一个缓冲区，池空时等待写盘线程归还"""
+        return self.buffers.get()
+
+    def release(self, buffer: bytearray):
+        """归还未提交写入的缓冲区"""
+        self.buffers.put(buffer)
+
+    def write(self, offset: int, buffer: bytearray, length: int):
+        """
+        提交一段数据，提交后缓冲区归写盘线程所有，写完后自动回到缓冲池
+
+        Args:
+            offset: 文件偏移
+            buffer: acquire() 得到的缓冲区
+            length: 缓冲区中有效数据的长度
+        """
+        if self.error is not None:
+            self.release(buffer)
+            raise self.error
+        self.queue.put((offset, buffer, length))
+
+    def block_done(self, index: int):
+        """该块的数据已全部提交，写盘线程写完这些数据后标记块完成"""
+        self.queue.put(index)
+
+    def close(self):
+        """等待写盘线程写完队列中的全部数据后退出"""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+    def run(self):
+        with open(self.path, 'r+b', buffering=0) as f:
+            while True:
+                batch = [self.queue.get()]
+                while len(batch) < WRITE_BATCH_BUFFERS * 4:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                if self.error is None:
+                    try:
+                        self.write_batch(f, batch)
+                    except OSError as e:
+                        # 出错后继续取走队列中的数据并归还缓冲区，避免下载线程一直等待
+                        self.error = e
+                for item in batch:
+                    if isinstance(item, tuple):
+                        self.buffers.put(item[1])
+                if None in batch:
+                    return
+
+    def write_batch(self, f, batch: list):
+        """把一批数据按偏移合并写入，再处理这批中的块完成标记"""
+        # 首尾相接的数据合并为一段：[起始偏移, 结束偏移, 缓冲区视图列表]
+        runs = []
+        blocks = []
+        for item in batch:
+            if item is None:
+                continue
+            if isinstance(item, int):
+                blocks.append(item)
+                continue
+            offset, buffer, length = item
+            end = offset + length
+            target = next((run for run in runs
+                           if run[1] == offset and len(run[2]) < WRITE_BATCH_BUFFERS), None)
+            if any(run is not target and run[0] < end and offset < run[1] for run in runs):
+                # 与尚未写入的数据重叠（校验失败的块被重新下载），先写出已合并的部分以保持写入顺序
+                self.write_runs(f, runs)
+                runs, target = [], None
+            if target is not None:
+                target[1] = end
+                target[2].append(memoryview(buffer)[:length])
+            else:
+                runs.append([offset, end, [memoryview(buffer)[:length]]])
+        self.write_runs(f, runs)
+
+        if blocks:
+            if self.fsync_blocks:
+                os.fsync(f.fileno())
+            for index in blocks:
+                self.scheduler.block_done(index)
+
+    def write_runs(self, f, runs: list):
+        for offset, end, views in runs:
+            # 支持 pwritev 的平台一次系统调用写入整段，写入不完整或不支持时逐个补写
+            written = os.pwritev(f.fileno(), views, offset) if hasattr(os, 'pwritev') else 0
+            for view in views:
+                if written >= len(view):
+                    written -= len(view)
+                else:
+                    write_at(f, view[written:], offset + written, self.lock)
+                    written = 0
+                offset += len(view)
+
+
+class MultiThreadDownloader:
+    """多线程下载器类，支持断点续传和进度显示"""
+
+    def __init__(self, url, save_path: str, thread_count: int = 8,
+                 chunk_size: int = 1024 * 1024, preallocate: bool = True,
+                 sha256: Optional[str] = None, block_hashes: Optional[list] = None,
+                 show_bar: bool = True, connection_limiter: Optional[threading.Semaphore] = None,
+                 rate_limiter: Optional[TokenBucket] = None,
+                 progress_callback: Optional[Callable[[int, int], None]] = None,
+                 auto_tune: bool = False, max_threads: int = 32,
+                 write_buffer_size: int = 64 * 1024 * 1024, fsync_blocks: bool = False,
+                 store=None, link_checker=None, check_gguf: Optional[bool] = None,
+                 gguf_expect: Optional[dict] = None, max_bytes_per_second: Optional[float] = None,
+                 priority: float = 1.0, extract: Optional[bool] = None, extract_dir: Optional[str] = None,
+                 member_hashes: Optional[dict] = None):
+        """
+        初始化下载器
+
+        Args:
+            url: 下载文件的URL；也可以是多个镜像URL的列表，各镜像同时下载不同范围
+            save_path: 保存文件的路径
+            thread_count: 线程数量，默认8个
+            chunk_size: 每个分块的大小（字节），默认1MB
+            preallocate: 是否预分配目标文件并由各线程按偏移直接写入（无需合并），默认True；
+                         False 时沿用 chunk_N.tmp 分块文件 + 合并的旧模式
+            sha256: 整个文件的 sha256，下载过程中边下边算，不一致时下载失败（仅预分配模式）
+            block_hashes: 每个块的 sha256 列表（块大小为 chunk_size），每个块写完立即校验，不一致的块重新下载
+            show_bar: 是否在终端显示进度条，由下载管理器等调用方汇总进度时设为False
+            connection_limiter: 多个下载共享的信号量，每个范围请求占用一个名额，用于限制全局连接数
+            rate_limiter: 多个下载共享的令牌桶，用于限制全局带宽
+            progress_callback: 进度回调 callback(已下载字节数, 总字节数)，下载期间每0.1秒调用一次，
+                               提供时不再在终端显示进度条
+            auto_tune: 是否根据吞吐自动调节连接数（仅预分配模式），初始值取该主机之前学到的连接数，
+                       没有记录时为 thread_count；下载结束后记录本次的最佳连接数
+            max_threads: 自动调节时的最大连接数
+            write_buffer_size: 预分配模式下写盘队列最多缓存的字节数，下载线程只负责接收数据，
+                               由专用写盘线程合并写入；0 表示由下载线程直接写入
+            fsync_blocks: 写盘线程是否在每批块完成前 fsync，断电后日志中的块一定已落盘，但写入更慢
+            store: 内容寻址存储（org.orgstore.ModelStore）；存储中已有相同内容时直接链接而不下载，
+                   下载完成后文件放入存储
+            link_checker: 链接检测器（org.orgprobe.LinkChecker）；有多个镜像时按其（带缓存的）检测结果
+                          以最快的可用镜像为主镜像，检测为不可用的镜像不再探测
+            check_gguf: 下载前是否先取 GGUF 文件头校验，None 表示保存路径以 .gguf 结尾时校验；
+                        下载完成后解析结果保存在 <save_path>.meta
+            gguf_expect: 目录条目中对文件头的期望（architecture / quant / context_length 等），
+                         不一致时中止下载
+            max_bytes_per_second: 未提供 rate_limiter 时，本下载单独使用的带宽上限（字节/秒）
+            priority: 在共享令牌桶中的优先级（权重），多个下载同时进行时按比例分配带宽，
+                      例如后台批量下载设为 0.2，交互使用时的下载保持 1
+            extract: 是否边下载边解压压缩包（.zip / .tar / .tar.gz / .tar.bz2 / .tar.xz / .tar.zst），
+                     None 表示按 save_path 的扩展名判断；解压完成后压缩包本身删除
+            extract_dir: 解压目录，默认为 save_path 所在目录
+            member_hashes: {成员名: sha256}，解压时逐个核对
+        """
+        urls = [url] if isinstance(url, str) else list(dict.fromkeys(url))
+        self.mirrors = [Mirror(u) for u in urls]
+        self.url = urls[0]
+        self.save_path = save_path
+        self.thread_count = thread_count
+        self.chunk_size = chunk_size
+        self.preallocate = preallocate
+        self.sha256 = sha256.lower() if sha256 else None
+        self.block_hashes = [h.lower() for h in block_hashes] if block_hashes else None
+        self.show_bar = show_bar
+        self.connection_limiter = connection_limiter
+        if rate_limiter is None and max_bytes_per_second:
+            rate_limiter = TokenBucket(max_bytes_per_second)
+        self.rate_limiter = rate_limiter
+        self.priority = priority
+        self.rate_share = rate_limiter.share(priority) if rate_limiter is not None else None
+        self.progress_callback = progress_callback
+        self.auto_tune = auto_tune
+        self.max_threads = max_threads
+        self.write_buffer_size = write_buffer_size
+        self.fsync_blocks = fsync_blocks
+        self.store = store
+        self.link_checker = link_checker
+        self.check_gguf = save_path.lower().endswith('.gguf') if check_gguf is None else check_gguf
+        self.archive_mode = archive_mode(save_path) if extract is not False else None
+        if extract and self.archive_mode is None:
+            raise ValueError(f"无法按扩展名判断压缩包类型: {save_path}")
+        self.extract_dir = extract_dir or os.path.dirname(os.path.abspath(save_path))
+        self.member_hashes = member_hashes
+        # 跟随下载前沿解压的后台线程
+        self.extractor = None
+        self.gguf_expect = gguf_expect
+        # 下载前从远程文件头解析出的结果
+        self.gguf_header = None
+        self.temp_dir = f"{save_path}.download"
+        self.part_file = f"{save_path}.part"
+        self.progress_file = f"{save_path}.progress"
+
+        # 与同主机其他下载共享的 keep-alive 会话，以及 probe() 得到的远程文件信息
+        self.session = self.mirrors[0].session
+        self.remote_info = None
+        self.primary_mirror = self.mirrors[0]
+        # 下载过程中发现远程文件已被替换（If-Range 请求收到 200），以及是否已因此重新开始过
+        self.remote_changed = False
+        self.restarted = False
+        # 保护镜像失效判断，避免多个镜像同时失败时全部被标记为失效
+        self.mirror_lock = threading.Lock()
+
+        # 下载状态
+        self.total_size = 0
+        self.lock = threading.Lock()
+        # 已下载字节数 = base_size + 各线程计数之和，见 downloaded_size 属性
+        self.base_size = 0
+        self.counters = []
+        self.write_lock = threading.Lock()
+        self.is_downloading = False
+        # stop() 被调用后不再开始下载
+        self.stopped = False
+
+        # 预分配模式下的动态范围调度器，download() 中创建
+        self.scheduler = None
+        # 单个线程连续失败的最大重试次数
+        self.max_retries = 5
+
+        # 断点续传日志，以及最近一次写入日志的块状态
+        self.journal = DownloadJournal(self.progress_file)
+        self.journal_lock = threading.Lock()
+        self.journal_done = None
+        # 下载过程中保存日志的间隔（秒）
+        self.journal_interval = 2.0
+
+        # 整文件 sha256 的流式计算器，提供 sha256 时在 prepare_file() 中创建
+        self.hasher = None
+        # 写盘线程，预分配模式下在 download() 中创建
+        self.disk_writer = None
+
+        # 当前允许工作的线程数（序号不小于它的线程暂停），自动调节时由 tune_loop() 修改
+        self.active_threads = thread_count
+        self.tuner = None
+        # 调节周期（秒），以及下载过程中失败的请求数
+        self.tune_interval = 2.0
+        self.failure_count = 0
+
+    @property
+    def downloaded_size(self) -> int:
+        """已下载字节数，读取时才汇总各线程的计数"""
+        return self.base_size + sum(counter.value for counter in list(self.counters))
+
+    @downloaded_size.setter
+    def downloaded_size(self, value: int):
+        with self.lock:
+            self.base_size = value - sum(counter.value for counter in self.counters)
+
+    def new_counter(self) -> ProgressCounter:
+        """为一个下载线程创建独占的进度计数"""
+        counter = ProgressCounter()
+        with self.lock:
+            self.counters.append(counter)
+        return counter
+
+    def probe(self) -> dict:
+        """
+        用一次 Range: bytes=0-0 请求同时获取文件大小和断点续传支持情况；有多个镜像时并发探测全部镜像
+
+        Returns:
+            {'size': 文件大小, 'support_range': 是否支持Range, 'etag': ETag, 'last_modified': Last-Modified}
+        """
+        if self.remote_info is not None:
+            return self.remote_info
+        if self.link_checker is not None and len(self.mirrors) > 1:
+            self.rank_mirrors()
+        if len(self.mirrors) == 1:
+            results = [self.probe_mirror(self.mirrors[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=len(self.mirrors)) as executor:
+                results = list(executor.map(self.probe_mirror, self.mirrors))
+        return self.select_mirrors(results)
+
+    def rank_mirrors(self):
+        """
+        按链接检测结果把最快的可用镜像排在最前（select_mirrors() 以第一个可用镜像为主镜像），不可用的标记为失效
+
+        已有未完成的下载时不调整顺序：断点续传日志记录的是原主镜像的 ETag，换主镜像可能导致进度作废
+        """
+        ranked = self.link_checker.rank([mirror.url for mirror in self.mirrors])
+        if not any(result.ok for result in ranked):
+            return
+        results = {result.url: result for result in ranked}
+        if not os.path.exists(self.part_file):
+            order = {result.url: i for i, result in enumerate(ranked)}
+            self.mirrors.sort(key=lambda mirror: order[mirror.url])
+        for mirror in self.mirrors:
+            if not results[mirror.url].ok:
+                mirror.alive = False
+
+    def probe_mirror(self, mirror: Mirror):
+        """探测单个镜像，返回文件信息；失败时返回异常对象"""
+        if not mirror.alive:
+            return Exception(f"镜像不可用: {mirror.url}")
+        try:
+            with mirror.session.get(mirror.url, headers={'Range': 'bytes=0-0'}, stream=True,
+                                    allow_redirects=True, timeout=10) as response:
+                info = self.parse_probe_response(response.status_code, response.headers)
+                # 记录重定向后的最终地址，后续范围请求不再重复跳转
+                mirror.url = str(response.url)
+                return info
+        except Exception as e:
+            return e
+
+    def parse_probe_response(self, status_code: int, headers) -> dict:
+        """解析 probe 请求的响应头"""
+        if status_code == 206 and '/' in headers.get('Content-Range', ''):
+            size = int(headers['Content-Range'].rsplit('/', 1)[1])
+            support_range = True
+        elif status_code == 200 and 'Content-Length' in headers:
+            size = int(headers['Content-Length'])
+            support_range = headers.get('Accept-Ranges', '').lower() == 'bytes'
+        else:
+            raise Exception(f"无法获取文件大小，HTTP {status_code}")
+        return {
+            'size': size,
+            'support_range': support_range,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+        }
+
+    def select_mirrors(self, results: list) -> dict:
+        """
+        根据各镜像的探测结果确定主镜像，文件大小不一致或不可用的镜像标记为失效
+
+        Args:
+            results: 与 self.mirrors 一一对应的探测结果（文件信息或异常）
+
+        Returns:
+            主镜像的文件信息（缓存到 self.remote_info）
+        """
+        primary = next((i for i, info in enumerate(results) if isinstance(info, dict)), None)
+        if primary is None:
+            raise Exception(f"获取文件大小失败: {str(results[0])}")
+
+        info = results[primary]
+        for mirror, result in zip(self.mirrors, results):
+            if not isinstance(result, dict) or result['size'] != info['size']:
+                mirror.alive = False
+            elif not (info['support_range'] and result['support_range']):
+                # 不支持Range时无法分段，只保留主镜像
+                mirror.alive = mirror is self.mirrors[primary]
+            else:
+                # 每个镜像用自己的校验值，不同服务器的 ETag 通常不同
+                mirror.validator = range_validator(result)
+
+        self.url = self.mirrors[primary].url
+        self.session = self.mirrors[primary].session
+        self.primary_mirror = self.mirrors[primary]
+        self.remote_info = info
+        if len(self.mirrors) > 1:
+            alive = sum(mirror.alive for mirror in self.mirrors)
+            print(f"可用镜像: {alive}/{len(self.mirrors)}")
+        return info
+
+    def range_headers(self, mirror: Mirror, start: int, end: int) -> dict:
+        """
+        范围请求的请求头
+
+        带上 If-Range：远程文件在两次请求之间被替换时，服务器返回 200 和整个新文件，
+        而不是新文件的这一段，避免把新旧文件的数据拼在一起。
+        """
+        headers = {'Range': f'bytes={start}-{end}'}
+        if mirror.validator:
+            headers['If-Range'] = mirror.validator
+        return headers
+
+    def source_changed(self, mirror: Mirror):
+        """带 If-Range 的范围请求收到 200：该镜像上的文件已被替换"""
+        if mirror is self.primary_mirror:
+            print("\n远程文件已变化，停止下载")
+            self.remote_changed = True
+            self.is_downloading = False
+        else:
+            print(f"\n镜像上的文件已变化，不再使用: {mirror.url}")
+            mirror.alive = False
+
+    def fail_mirror(self, mirror: Mirror):
+        """
+        记录镜像的一次失败。连续失败过多且还有其他可用镜像时才标记为失效，
+        最后一个可用镜像不会被标记，是否放弃由各线程的重试次数（max_retries）决定
+        """
+        with self.mirror_lock:
+            if not mirror.fail() or not mirror.alive:
+                return
+            if any(other.alive for other in self.mirrors if other is not mirror):
+                mirror.alive = False
+                print(f"\n镜像连续失败，不再使用: {mirror.url}")
+
+    def pick_mirror(self) -> Optional[Mirror]:
+        """
+        为下一个范围挑选镜像：按单连接吞吐加权随机选择，吞吐越高的镜像分到的范围越多；
+        尚未测速的镜像按当前最快镜像的权重参与，保证每个镜像都能被测到
+
+        Returns:
+            选中的镜像，全部失效时返回None
+        """
+        alive = [mirror for mirror in self.mirrors if mirror.alive]
+        if len(alive) <= 1:
+            return alive[0] if alive else None
+        fastest = max(mirror.speed for mirror in alive) or 1.0
+        weights = [mirror.speed or fastest for mirror in alive]
+        return random.choices(alive, weights=weights)[0]
+
+    def get_file_size(self) -> int:
+        """获取远程文件大小"""
+        return self.probe()['size']
+
+    def check_support_range(self) -> bool:
+        """检查服务器是否支持Range请求（断点续传）"""
+        try:
+            return self.probe()['support_range']
+        except Exception:
+            return False
+
+    def download_chunk(self, start: int, end: int, chunk_id: int) -> bool:
+        """
+        下载文件的一个分块
+
+        Args:
+            start: 起始字节位置
+            end: 结束字节位置
+            chunk_id: 分块ID
+
+        Returns:
+            是否下载成功
+        """
+        chunk_file = os.path.join(self.temp_dir, f"chunk_{chunk_id}.tmp")
+        counter = self.new_counter()
+
+        # 检查是否已经下载过该分块
+        if os.path.exists(chunk_file):
+            downloaded = os.path.getsize(chunk_file)
+            counter.value += downloaded
+            if downloaded == (end - start + 1):
+                return True
+            # 部分下载，继续从断点处下载
+            start += downloaded
+
+        mirror = self.primary_mirror
+        headers = self.range_headers(mirror, start, end)
+
+        try:
+            response = self.session.get(self.url, headers=headers, stream=True, timeout=30)
+
+            if response.status_code == 200 and 'If-Range' in headers:
+                response.close()
+                self.source_changed(mirror)
+                return False
+            if response.status_code not in [200, 206]:
+                response.close()
+                return False
+
+            view = memoryview(bytearray(READ_BUFFER_SIZE))
+            try:
+                with open(chunk_file, 'ab') as f:
+                    while True:
+                        if not self.is_downloading:
+                            return False
+                        n = read_into(response, view)
+                        if not n:
+                            break
+                        if self.rate_share is not None:
+                            self.rate_share.consume(n)
+                        f.write(view[:n])
+                        counter.value += n
+            finally:
+                finish_response(response)
+
+            return True
+
+        except Exception as e:
+            print(f"\n分块 {chunk_id} 下载失败: {str(e)}")
+            return False
+
+    def preallocate_file(self):
+        """预分配目标文件（.part），已存在且大小一致时保留已下载的数据；大小不一致时截断到远程文件大小"""
+        mode = 'r+b' if os.path.exists(self.part_file) else 'wb'
+        with open(self.part_file, mode) as f:
+            if os.path.getsize(self.part_file) == self.total_size:
+                return
+            # 先截断到远程文件大小：远程文件变小时去掉尾部的旧数据（posix_fallocate 只会扩大文件），
+            # 变大时在 Windows/macOS 下扩展为稀疏文件
+            f.truncate(self.total_size)
+            if self.total_size > 0 and hasattr(os, 'posix_fallocate'):
+                # Linux 下真正分配磁盘空间，避免写入过程中才发现磁盘已满
+                os.posix_fallocate(f.fileno(), 0, self.total_size)
+
+    def load_progress(self) -> list:
+        """
+        读取断点续传日志
+
+        Returns:
+            已完成的块序号列表；日志无效或远程文件已变化时返回空列表（从头开始）
+        """
+        if not os.path.exists(self.part_file):
+            return []
+        info = self.remote_info or {}
+        state = self.journal.load(self.total_size, info.get('etag'), info.get('last_modified'))
+        if state is None and self.block_hashes:
+            # 远程文件已变化，但有块哈希：逐块校验已下载的数据，只丢弃不一致的块
+            state = self.journal.load(self.total_size, None, None, strict=False)
+            if state is not None and state[0] == self.chunk_size:
+                return self.verify_saved_blocks(state[1])
+            return []
+        if state is None:
+            return []
+        if self.block_hashes and state[0] != self.chunk_size:
+            # 块哈希按 chunk_size 计算，块大小不同的旧进度无法逐块校验
+            return []
+        # 沿用日志中的块大小，保证已完成的块仍然对齐
+        self.chunk_size, blocks = state
+        return blocks
+
+    def verify_saved_blocks(self, blocks: list) -> list:
+        """
+        按块哈希校验 .part 中已下载的块
+
+        Args:
+            blocks: 日志中记录为已完成的块序号
+
+        Returns:
+            校验通过的块序号
+        """
+        print(f"远程文件已变化，正在逐块校验已下载的 {len(blocks)} 个块...")
+        valid = []
+        with open(self.part_file, 'rb') as f:
+            for index in blocks:
+                f.seek(index * self.chunk_size)
+                if hashlib.sha256(f.read(self.chunk_size)).hexdigest() == self.block_hashes[index]:
+                    valid.append(index)
+        print(f"保留 {len(valid)} 个块，重新下载其余部分")
+        return valid
+
+    def check_chunks(self):
+        """
+        旧分块模式：比对分块目录中记录的远程文件信息，远程文件已变化（或分块方式不同）时删除旧分块
+        """
+        info = self.remote_info or {}
+        source_file = os.path.join(self.temp_dir, "source.json")
+        try:
+            with open(source_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            valid = (state.get('total_size') == self.total_size and state.get('thread_count') == self.thread_count
+                     and same_remote(state, info.get('etag'), info.get('last_modified')))
+        except (OSError, ValueError):
+            valid = False
+
+        if not valid:
+            for name in os.listdir(self.temp_dir):
+                if name.startswith("chunk_"):
+                    os.remove(os.path.join(self.temp_dir, name))
+            with open(source_file, 'w', encoding='utf-8') as f:
+                json.dump({'total_size': self.total_size, 'thread_count': self.thread_count,
+                           'etag': info.get('etag'), 'last_modified': info.get('last_modified')}, f)
 
-class MultiThreadDownloader:
-    """多线程下载器类，支持断点续传和进度显示"""
+    def save_progress(self):
+        """把已完成的块写入断点续传日志：先 fsync 数据文件，再原子替换日志"""
+        if self.scheduler is None or not os.path.exists(self.part_file):
+            return
+        with self.journal_lock:
+            # 先取快照再 fsync：快照里的块在标记完成前都已写入操作系统
+            done = bytes(self.scheduler.done)
+            if done == self.journal_done:
+                return
+            info = self.remote_info or {}
+            try:
+                with open(self.part_file, 'r+b') as f:
+                    os.fsync(f.fileno())
+                self.journal.save(self.total_size, self.chunk_size, info.get('etag'),
+                                  info.get('last_modified'), done)
+                self.journal_done = done
+            except OSError as e:
+                print(f"\n保存下载进度失败: {str(e)}")
+
+    def journal_loop(self):
+        """下载过程中定期保存断点续传日志，进程崩溃或断电后最多重下 journal_interval 秒的数据"""
+        next_save = time.monotonic() + self.journal_interval
+        while self.is_downloading:
+            time.sleep(0.1)
+            if self.is_downloading and time.monotonic() >= next_save:
+                self.save_progress()
+                next_save = time.monotonic() + self.journal_interval
 
-    def __init__(self, url: str, save_path: str, thread_count: int = 8,
-                 chunk_size: int = 1024 * 1024):
+    def download_range(self, work: 'WorkRange', counter: ProgressCounter, view: memoryview,
+                       index: int = 0) -> bool:
         """
-        初始化下载器
+        预分配模式：把调度器分配的范围直接写入目标文件的对应偏移处
+
+        下载过程中范围的结尾可能被空闲线程拆走，因此每跨过一个块边界都要向调度器重新认领。
+        每次最多读到当前认领的块末尾，不会读入已被拆走的数据。
 
         Args:
-            url: 下载文件的URL
-            save_path: 保存文件的路径
-            thread_count: 线程数量，默认8个
-            chunk_size: 每个分块的大小（字节），默认1MB
+            work: 调度器分配的下载范围
+            counter: 本线程的进度计数
+            view: 本线程复用的读缓冲区（使用写盘线程时从其缓冲池取缓冲区，不使用该参数）
+            index: 本线程的序号，自动调节把连接数调低到它以下时，在块边界处交还剩余范围
+
+        Returns:
+            是否下载成功（范围被拆走后提前结束也视为成功）
         """
-        self.url = url
-        self.save_path = save_path
-        self.thread_count = thread_count
-        self.chunk_size = chunk_size
-        self.temp_dir = f"{save_path}.download"
-        self.progress_file = f"{save_path}.progress"
+        scheduler = self.scheduler
+        if not scheduler.claim(work):
+            return True
 
-        # 下载状态
-        self.total_size = 0
-        self.downloaded_size = 0
-        self.lock = threading.Lock()
-        self.is_downloading = False
+        mirror = self.pick_mirror()
+        if mirror is None:
+            print("\n所有镜像均已失效")
+            return False
+
+        headers = self.range_headers(mirror, work.pos, work.end)
+        first_pos = work.pos
+        started = time.monotonic()
+        block_hash = hashlib.sha256() if self.block_hashes else None
 
-    def get_file_size(self) -> int:
-        """获取远程文件大小"""
         try:
-            response = requests.head(self.url, allow_redirects=True, timeout=10, verify=False)
-            if 'Content-Length' in response.headers:
-                return int(response.headers['Content-Length'])
-            else:
-                # 如果HEAD请求不返回Content-Length，尝试GET请求
-                response = requests.get(self.url, stream=True, timeout=10, verify=False)
-                if 'Content-Length' in response.headers:
-                    return int(response.headers['Content-Length'])
-                else:
-                    raise Exception("无法获取文件大小，服务器不支持Range请求")
+            response = mirror.session.get(mirror.url, headers=headers, stream=True, timeout=30)
+
+            if response.status_code == 200 and 'If-Range' in headers:
+                response.close()
+                self.source_changed(mirror)
+                return False
+            if response.status_code not in [200, 206] or (response.status_code == 200 and work.pos > 0):
+                # 状态码异常，或服务器忽略了 Range 返回整个文件（不能写入偏移处）
+                response.close()
+                self.fail_mirror(mirror)
+                return False
+
+            # 有写盘线程时把数据交给它写入，否则每个线程持有自己的文件句柄，定位到自己的偏移后顺序写入；
+            # 正常读完的响应会把连接归还给会话的连接池，供下一个范围复用
+            writer = self.disk_writer
+            try:
+                with open(self.part_file, 'r+b') if writer is None else nullcontext() as f:
+                    if f is not None:
+                        f.seek(work.pos)
+                    while work.pos <= work.end:
+                        if not self.is_downloading:
+                            return False
+                        if work.pos > work.claimed:
+                            # 剩余部分已被其他线程接手，或连接数被调低，交还剩余部分
+                            if index >= self.active_threads or not scheduler.claim(work):
+                                mirror.record(work.pos - first_pos, time.monotonic() - started)
+                                return True
+                            block_hash = hashlib.sha256() if self.block_hashes else None
+
+                        if writer is not None:
+                            # 缓冲池用完时在这里等待写盘线程，限制内存占用
+                            buffer = writer.acquire()
+                            view = memoryview(buffer)
+                        data = view[:min(len(view), work.claimed + 1 - work.pos)]
+                        try:
+                            n = read_into(response, data)
+                        except Exception:
+                            if writer is not None:
+                                writer.release(buffer)
+                            raise
+                        if not n:
+                            if writer is not None:
+                                writer.release(buffer)
+                            break
+                        if self.rate_share is not None:
+                            self.rate_share.consume(n)
+                        if block_hash is not None:
+                            block_hash.update(data[:n])
+                        if writer is not None:
+                            writer.write(work.pos, buffer, n)
+                        else:
+                            f.write(data[:n])
+                        work.pos += n
+                        counter.value += n
+                        if work.pos > work.claimed:
+                            # 块写满后先刷出缓冲区再标记完成，保证日志保存时 fsync 能覆盖到它
+                            if f is not None:
+                                f.flush()
+                            if not self.verify_block(work, block_hash, counter):
+                                self.fail_mirror(mirror)
+                                return False
+            finally:
+                finish_response(response)
+
+            mirror.record(work.pos - first_pos, time.monotonic() - started)
+            if work.pos <= work.end:
+                # 连接提前结束，视为该镜像的一次失败
+                self.fail_mirror(mirror)
+                return False
+            return True
+
         except Exception as e:
-            raise Exception(f"获取文件大小失败: {str(e)}")
+            if self.disk_writer is None or self.disk_writer.error is None:
+                # 写盘出错不是镜像的问题
+                self.fail_mirror(mirror)
+            print(f"\n范围 {work.start}-{work.end} 下载失败（{mirror.url}）: {str(e)}")
+            return False
 
-    def check_support_range(self) -> bool:
-        """检查服务器是否支持Range请求（断点续传）"""
-        try:
-            headers = {'Range': 'bytes=0-0'}
-            response = requests.head(self.url, headers=headers, allow_redirects=True, timeout=10, verify=False)
-            return response.status_code == 206 or 'Accept-Ranges' in response.headers
-        except:
+    def verify_block(self, work: WorkRange, block_hash, counter: ProgressCounter) -> bool:
+        """
+        一个块写满后校验其哈希（如有），通过则标记完成；不通过则把 work.pos 退回块起点以便重新下载
+
+        Args:
+            work: 刚写满一个块的下载范围（work.claimed 为该块的最后一个字节）
+            block_hash: 该块数据的 sha256 对象，未提供块哈希时为None
+            counter: 下载该块的线程的进度计数
+
+        Returns:
+            是否校验通过
+        """
+        index = work.claimed // self.chunk_size
+        if block_hash is not None and block_hash.hexdigest() != self.block_hashes[index]:
+            block_start = index * self.chunk_size
+            print(f"\n块 {index} 校验失败，重新下载")
+            counter.value -= work.pos - block_start
+            work.pos = block_start
             return False
+        if self.disk_writer is not None:
+            # 由写盘线程在该块的数据写入文件后标记完成
+            self.disk_writer.block_done(index)
+        else:
+            self.scheduler.block_done(index)
+        return True
 
-    def download_chunk(self, start: int, end: int, chunk_id: int) -> bool:
+    def verify_download(self) -> bool:
         """
-        下载文件的一个分块
+        全部块完成后核对整文件 sha256（由 StreamHasher 在下载过程中算出）；不一致时删除进度以便重新下载
+
+        Returns:
+            是否校验通过（未提供 sha256 时直接通过）
+        """
+        if self.hasher is None:
+            return True
+        print("正在校验文件...")
+        digest = self.hasher.hexdigest()
+        if digest == self.sha256:
+            return True
+        print(f"校验失败: 期望 sha256 {self.sha256}，实际 {digest}")
+        for path in (self.part_file, self.progress_file):
+            if os.path.exists(path):
+                os.remove(path)
+        return False
+
+    def worker(self, index: int = 0) -> bool:
+        """
+        下载线程主循环：不断向调度器领取范围，直到没有可做的工作
 
         Args:
-            start: 起始字节位置
-            end: 结束字节位置
-            chunk_id: 分块ID
+            index: 线程序号，不小于 active_threads 时暂停，直到连接数被调高或下载结束
 
         Returns:
-            是否下载成功
+            是否正常结束（失败次数超过上限时返回False）
         """
-        chunk_file = os.path.join(self.temp_dir, f"chunk_{chunk_id}.tmp")
+        failures = 0
+        counter = self.new_counter()
+        view = memoryview(bytearray(READ_BUFFER_SIZE)) if self.disk_writer is None else None
+        while self.is_downloading:
+            if index >= self.active_threads:
+                if self.scheduler.idle():
+                    return True
+                time.sleep(0.1)
+                continue
 
-        # 检查是否已经下载过该分块
-        if os.path.exists(chunk_file):
-            downloaded = os.path.getsize(chunk_file)
-            if downloaded == (end - start + 1):
-                with self.lock:
-                    self.downloaded_size += downloaded
-                return True
+            # 有全局连接数限制时，先拿到连接名额再领取范围
+            with self.connection_limiter or nullcontext():
+                work = self.scheduler.next_range()
+                if work is None:
+                    return True
+
+                ok = self.download_range(work, counter, view, index)
+                # 未完成的部分退回调度器，并扣除未写完的块的进度
+                counter.value -= self.scheduler.release(work)
+
+            if ok:
+                failures = 0
             else:
-                # 部分下载，继续从断点处下载
-                start += downloaded
+                failures += 1
                 with self.lock:
-                    self.downloaded_size += downloaded
+                    self.failure_count += 1
+                if failures > self.max_retries or not self.is_downloading:
+                    return False
+                time.sleep(min(2 ** failures, 10))
+        return False
 
-        headers = {'Range': f'bytes={start}-{end}'}
+    def tune_loop(self):
+        """自动调节连接数：每个 tune_interval 周期按总吞吐和失败数调整 active_threads"""
+        last_size, last_time, last_failures = self.downloaded_size, time.monotonic(), self.failure_count
+        next_tune = last_time + self.tune_interval
+        while self.is_downloading:
+            time.sleep(0.1)
+            now = time.monotonic()
+            if not self.is_downloading or now < next_tune:
+                continue
+            size, failures = self.downloaded_size, self.failure_count
+            count = self.tuner.update((size - last_size) / (now - last_time), failures - last_failures)
+            if count != self.active_threads:
+                print(f"\n连接数调整为 {count}")
+                self.active_threads = count
+            last_size, last_time, last_failures = size, now, failures
+            next_tune = now + self.tune_interval
 
+    def is_current(self) -> bool:
+        """
+        已有完整文件，且远程文件（ETag/Last-Modified）和本地文件（修改时间）自上次下载后都没有变化，
+        需要校验 GGUF 时文件头也与 gguf_expect 一致
+        """
+        record = load_remote_record(self.save_path)
+        info = self.remote_info or {}
+        if record is None or not (info.get('etag') or info.get('last_modified')):
+            return False
         try:
-            response = requests.get(self.url, headers=headers, stream=True, timeout=30, verify=False)
+            stat = os.stat(self.save_path)
+        except OSError:
+            return False
+        if (record.get('size') != self.total_size or stat.st_size != self.total_size
+                or record.get('mtime_ns') != stat.st_mtime_ns):
+            return False
+        return same_remote(record, info.get('etag'), info.get('last_modified')) and \
+            self.check_local_gguf(self.save_path)
 
-            if response.status_code not in [200, 206]:
-                return False
+    def fetch_head(self, size: int) -> bytes:
+        """从主镜像读取文件开头的 size 个字节；服务器不支持 Range 时读够就断开连接"""
+        headers = {'Range': f'bytes=0-{size - 1}'}
+        with self.session.get(self.url, headers=headers, stream=True, timeout=30) as response:
+            response.raise_for_status()
+            data = bytearray()
+            for chunk in response.iter_content(256 * 1024):
+                data += chunk
+                if len(data) >= size:
+                    break
+        return bytes(data[:size])
 
-            with open(chunk_file, 'ab') as f:
-                for data in response.iter_content(chunk_size=8192):
-                    if not self.is_downloading:
-                        return False
+    def validate_gguf(self) -> bool:
+        """
+        下载前取 GGUF 文件头校验：不是 GGUF 文件、文件头损坏或与 gguf_expect 不一致时中止下载，
+        避免把整个文件下载完才发现地址错误
+
+        Returns:
+            是否继续下载
+        """
+        try:
+            header = read_gguf_header(self.fetch_head, min(self.total_size, HEADER_MAX_SIZE))
+            if not header['complete'] and self.total_size <= HEADER_MAX_SIZE:
+                raise GGUFError("文件在文件头结束前就结束了")
+            mismatches = check_gguf_expect(header, self.gguf_expect)
+            if mismatches:
+                raise GGUFError("；".join(mismatches))
+        except GGUFError as e:
+            print(f"GGUF 文件头校验失败，已中止下载: {str(e)}")
+            return False
+        self.gguf_header = header
+        print(f"GGUF 文件头校验通过: {describe_gguf(header)}")
+        return True
+
+    def check_local_gguf(self, path: str) -> bool:
+        """
+        用已有的本地文件或存储对象代替下载前，校验其 GGUF 文件头是否与 gguf_expect 一致
 
-                    if data:
-                        f.write(data)
-                        with self.lock:
-                            self.downloaded_size += len(data)
+        Args:
+            path: 本地文件或存储对象的路径
 
+        Returns:
+            是否可以直接使用；不校验 GGUF 时总是True。不能使用时调用方继续走正常下载流程，
+            由 validate_gguf() 校验远程文件头
+        """
+        if not self.check_gguf:
             return True
+        try:
+            header = read_gguf_file(path)
+            if not header['complete'] and os.path.getsize(path) <= HEADER_MAX_SIZE:
+                raise GGUFError("文件在文件头结束前就结束了")
+            mismatches = check_gguf_expect(header, self.gguf_expect)
+            if mismatches:
+                raise GGUFError("；".join(mismatches))
+        except (OSError, GGUFError) as e:
+            print(f"已有文件的 GGUF 文件头校验失败，不直接使用: {path}: {str(e)}")
+            return False
+        self.gguf_header = header
+        return True
 
-        except Exception as e:
-            print(f"\n分块 {chunk_id} 下载失败: {str(e)}")
+    def save_gguf_meta(self):
+        """从下载完成的文件解析 GGUF 文件头，保存到 <save_path>.meta"""
+        try:
+            save_gguf_meta(self.save_path, read_gguf_file(self.save_path))
+        except (OSError, GGUFError) as e:
+            print(f"\n保存 GGUF 元数据失败: {str(e)}")
+
+    def set_rate_limit(self, max_bytes_per_second: Optional[float]):
+        """
+        运行中修改带宽上限；共享令牌桶时影响所有共享它的下载
+
+        Args:
+            max_bytes_per_second: 字节/秒，None 或 0 表示不限速
+        """
+        if self.rate_limiter is not None:
+            self.rate_limiter.set_rate(max_bytes_per_second)
+        elif max_bytes_per_second:
+            self.rate_limiter = TokenBucket(max_bytes_per_second)
+            self.rate_share = self.rate_limiter.share(self.priority)
+
+    def set_priority(self, priority: float):
+        """运行中修改本下载在共享令牌桶中的优先级"""
+        self.priority = priority
+        if self.rate_share is not None:
+            self.rate_share.priority = priority
+
+    def link_from_store(self, sha256: Optional[str]) -> bool:
+        """
+        存储中已有该内容时直接链接到保存路径，并删除未完成的临时文件
+
+        Args:
+            sha256: 内容哈希，None 时直接返回False
+
+        Returns:
+            是否已链接
+        """
+        if self.store is None or not self.store.has(sha256):
+            return False
+        if not self.check_local_gguf(self.store.object_path(sha256)):
+            return False
+        self.store.link(sha256, self.save_path)
+        if os.path.exists(self.part_file):
+            os.remove(self.part_file)
+        self.cleanup()
+        if self.check_gguf:
+            self.save_gguf_meta()
+        print(f"本地存储中已有相同内容，直接使用: {self.save_path}")
+        return True
+
+    def add_to_store(self):
+        """把下载完成的文件放入内容寻址存储，并记录下载地址对应的内容哈希"""
+        try:
+            # 旧分块模式不在下载中校验 sha256，由存储重新计算
+            digest = self.store.add(self.save_path, self.sha256 if self.preallocate else None)
+            if self.remote_info is not None:
+                self.store.remember_source(self.url, self.remote_info, digest)
+        except OSError as e:
+            print(f"\n放入模型存储失败: {str(e)}")
+
+    def is_complete(self) -> bool:
+        """已有完整文件且与提供的 sha256 一致时无需下载（校验结果按大小/修改时间缓存）"""
+        if self.archive_mode is not None and bundle_complete(self.save_path):
+            print(f"压缩包已解压，成员完整: {self.save_path}")
+            return True
+        if not self.sha256 or not os.path.exists(self.save_path):
+            return False
+        if cached_sha256(self.save_path) != self.sha256 or not self.check_local_gguf(self.save_path):
+            return False
+        print(f"文件已存在且校验通过: {self.save_path}")
+        return True
+
+    def prepare_file(self, support_range: bool, resume: bool):
+        """预分配目标文件，并按上次完成的块建立调度器"""
+        done_blocks = self.load_progress() if resume and support_range else []
+        self.scheduler = RangeScheduler(self.total_size, self.chunk_size,
+                                        done_blocks=done_blocks, allow_split=support_range)
+        self.downloaded_size = self.scheduler.done_bytes()
+        self.preallocate_file()
+        if self.sha256:
+            self.hasher = StreamHasher(self.part_file, self.scheduler)
+            self.hasher.start()
+        if self.archive_mode is not None:
+            self.extractor = BundleExtractor(self.part_file, self.extract_dir, self.archive_mode,
+                                             self.scheduler, self.member_hashes)
+            self.extractor.start()
+
+    def finish_file(self) -> bool:
+        """全部范围下载完成后的收尾：预分配模式下重命名 .part 文件并清理临时文件"""
+        # 确保进度条显示100%
+        if self.show_bar:
+            sys.stdout.write(f'\r下载进度: |{"█" * 50}| 100.0% '
+                             f'({self.total_size / (1024 * 1024):.2f}MB / {self.total_size / (1024 * 1024):.2f}MB)\n')
+            sys.stdout.flush()
+
+        if self.archive_mode is not None:
+            return self.finish_bundle()
+
+        if self.preallocate:
+            # 数据已在目标位置，重命名即可，无需合并
+            os.replace(self.part_file, self.save_path)
+            if self.sha256:
+                # 重命名不改变修改时间，记录校验结果供以后直接使用
+                save_sha256_cache(self.save_path, self.sha256)
+
+        if self.store is not None:
+            self.add_to_store()
+        if self.check_gguf:
+            self.save_gguf_meta()
+        if self.remote_info is not None:
+            save_remote_record(self.save_path, self.url, self.remote_info)
+
+        # 清理临时文件
+        print("正在清理临时文件...")
+        self.cleanup()
+
+        print(f"下载完成！文件保存至: {self.save_path}")
+        return True
+
+    def finish_bundle(self) -> bool:
+        """压缩包下载完成后的收尾：等待解压完成，删除压缩包并记录成员清单"""
+        source = self.part_file if self.preallocate else self.save_path
+        if self.extractor is None:
+            # 旧分块模式下载时没有跟随解压，合并后再解压一遍
+            self.extractor = BundleExtractor(source, self.extract_dir, self.archive_mode,
+                                             member_hashes=self.member_hashes)
+            self.extractor.start()
+        print("正在等待解压完成...")
+        members = self.extractor.wait()
+        self.extractor = None
+        if members is None:
+            # 压缩包内容有误，重新下载才能恢复
+            for path in (source, self.progress_file):
+                if os.path.exists(path):
+                    os.remove(path)
             return False
+        os.remove(source)
+        save_bundle_manifest(self.save_path, self.extract_dir, members)
+        print("正在清理临时文件...")
+        self.cleanup()
+        print(f"下载并解压完成！共 {len(members)} 个文件，保存至: {self.extract_dir}")
+        return True
+
+    def stop_extractor(self):
+        """中止跟随下载的解压线程"""
+        extractor, self.extractor = self.extractor, None
+        if extractor is not None:
+            extractor.stop()
 
     def merge_chunks(self, chunk_count: int) -> bool:
         """
@@ -142,20 +1841,26 @@ class MultiThreadDownloader:
         Returns:
             是否合并成功
         """
+        # 先写入临时文件再替换：save_path 可能是存储对象的硬链接，直接以 'wb' 打开会改写其他条目共享的内容
+        tmp_file = f"{self.save_path}.merge"
         try:
-            with open(self.save_path, 'wb') as output_file:
+            with open(tmp_file, 'wb') as output_file:
                 for i in range(chunk_count):
                     chunk_file = os.path.join(self.temp_dir, f"chunk_{i}.tmp")
                     if not os.path.exists(chunk_file):
                         return False
 
                     with open(chunk_file, 'rb') as chunk:
-                        output_file.write(chunk.read())
+                        shutil.copyfileobj(chunk, output_file, 16 * 1024 * 1024)
 
+            os.replace(tmp_file, self.save_path)
             return True
         except Exception as e:
             print(f"\n合并文件失败: {str(e)}")
             return False
+        finally:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
 
     def cleanup(self):
         """清理临时文件"""
@@ -170,10 +1875,40 @@ class MultiThreadDownloader:
         except Exception as e:
             print(f"\n清理临时文件失败: {str(e)}")
 
+    def prepare_restart(self) -> bool:
+        """
+        下载中途发现远程文件已变化时，保存进度并清除缓存的远程文件信息，准备按新文件重新开始；
+        重新开始后 load_progress() 会丢弃旧文件的块（有块哈希时只丢弃校验不通过的块）
+
+        Returns:
+            是否应当重新开始（每个下载器最多重新开始一次，避免远程文件反复变化时无限重试）
+        """
+        if not self.remote_changed or self.restarted or self.stopped:
+            return False
+        self.restarted = True
+        self.remote_changed = False
+        self.save_progress()
+        if self.hasher is not None:
+            self.hasher.stop()
+            self.hasher = None
+        self.stop_extractor()
+        self.remote_info = None
+        print("按新的远程文件重新开始下载...")
+        return True
+
+    def stop(self):
+        """请求停止下载（可在其他线程调用），已完成的块会写入断点续传日志，之后可继续下载"""
+        self.stopped = True
+        self.is_downloading = False
+
     def show_progress(self):
-        """显示下载进度条"""
+        """显示下载进度条；提供 progress_callback 时改为定期回调"""
+        if not self.show_bar and self.progress_callback is None:
+            return
         while self.is_downloading:
-            if self.total_size > 0:
+            if self.total_size > 0 and self.progress_callback is not None:
+                self.progress_callback(self.downloaded_size, self.total_size)
+            elif self.total_size > 0:
                 progress = self.downloaded_size / self.total_size
                 bar_length = 50
                 filled_length = int(bar_length * progress)
@@ -205,11 +1940,21 @@ class MultiThreadDownloader:
             if os.path.exists(self.save_path) and not resume:
                 print(f"文件已存在: {self.save_path}")
                 return True
+            if self.is_complete() or self.link_from_store(self.sha256):
+                return True
 
             # 获取文件大小
             print("正在获取文件信息...")
             self.total_size = self.get_file_size()
             print(f"文件大小: {self.total_size / (1024 * 1024):.2f} MB")
+            if resume and self.is_current():
+                print(f"本地文件已是最新，跳过下载: {self.save_path}")
+                return True
+            if resume and self.store is not None and self.link_from_store(
+                    self.store.find_source(self.url, self.remote_info)):
+                return True
+            if self.check_gguf and not self.validate_gguf():
+                return False
 
             # 检查是否支持断点续传
             support_range = self.check_support_range()
@@ -219,103 +1964,459 @@ class MultiThreadDownloader:
             else:
                 print(f"服务器支持断点续传，使用 {self.thread_count} 个线程下载")
 
-            # 创建临时目录
-            os.makedirs(self.temp_dir, exist_ok=True)
-
-            # 计算每个线程下载的范围
-            chunk_size = self.total_size // self.thread_count
-            download_ranges = []
+            if self.preallocate:
+                self.prepare_file(support_range, resume)
+                self.active_threads = self.thread_count
+                if self.auto_tune and support_range:
+                    # 按最大连接数启动线程，序号超出当前连接数的线程先暂停
+                    start = load_tuned_threads(self.url) or self.thread_count
+                    self.tuner = ConnectionTuner(start, maximum=self.max_threads)
+                    self.active_threads = self.tuner.count
+                    print(f"自动调节连接数，初始 {self.active_threads} 个（最多 {self.max_threads} 个）")
+                pool_size = self.max_threads if self.tuner is not None else self.thread_count
+                tasks = [(self.worker, i) for i in range(pool_size)]
+                if self.write_buffer_size:
+                    self.disk_writer = DiskWriter(self.part_file, self.scheduler,
+                                                  max(1, self.write_buffer_size // READ_BUFFER_SIZE),
+                                                  fsync_blocks=self.fsync_blocks)
+                    self.disk_writer.start()
+            else:
+                # 创建临时目录，远程文件已变化时删除旧分块
+                os.makedirs(self.temp_dir, exist_ok=True)
+                self.check_chunks()
 
-            for i in range(self.thread_count):
-                start = i * chunk_size
-                end = start + chunk_size - 1 if i < self.thread_count - 1 else self.total_size - 1
-                download_ranges.append((start, end, i))
+                # 计算每个线程下载的范围
+                chunk_size = self.total_size // self.thread_count
+                tasks = []
+                for i in range(self.thread_count):
+                    start = i * chunk_size
+                    end = start + chunk_size - 1 if i < self.thread_count - 1 else self.total_size - 1
+                    tasks.append((self.download_chunk, start, end, i))
 
             # 开始下载
-            self.is_downloading = True
+            self.is_downloading = not self.stopped
 
-            # 启动进度显示线程
+            # 启动进度显示线程和日志保存线程
             progress_thread = threading.Thread(target=self.show_progress, daemon=True)
             progress_thread.start()
+            journal_thread = threading.Thread(target=self.journal_loop, daemon=True)
+            if self.preallocate:
+                journal_thread.start()
+            tune_thread = threading.Thread(target=self.tune_loop, daemon=True)
+            if self.tuner is not None:
+                tune_thread.start()
 
             # 使用线程池下载
             success = True
-            with ThreadPoolExecutor(max_workers=self.thread_count) as executor:
-                futures = {
-                    executor.submit(self.download_chunk, start, end, chunk_id): chunk_id
-                    for start, end, chunk_id in download_ranges
-                }
+            with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+                futures = [executor.submit(*task) for task in tasks]
 
                 for future in as_completed(futures):
                     if not future.result():
                         success = False
+                        # 通知其余线程尽快停止
+                        self.is_downloading = False
                         break
 
             self.is_downloading = False
+            if not self.close_writer():
+                success = False
             progress_thread.join(timeout=1)
+            if journal_thread.is_alive():
+                journal_thread.join()
+            if tune_thread.is_alive():
+                tune_thread.join()
+            if self.tuner is not None and self.tuner.samples >= 2:
+                # 至少经过两个调节周期才记录，太小的文件学不到有意义的连接数
+                save_tuned_threads(self.url, self.tuner.best_count, self.tuner.best_speed)
 
             if not success:
-                print("\n下载失败！")
+                if self.prepare_restart():
+                    return self.download(resume)
+                self.save_progress()
+                print("\n下载已暂停，进度已保存" if self.stopped else "\n下载失败！")
                 return False
 
-            # 确保进度条显示100%
-            sys.stdout.write(f'\r下载进度: |{"█" * 50}| 100.0% '
-                             f'({self.total_size / (1024 * 1024):.2f}MB / {self.total_size / (1024 * 1024):.2f}MB)\n')
-            sys.stdout.flush()
+            if not self.preallocate:
+                # 合并文件
+                print("正在合并文件...")
+                if not self.merge_chunks(self.thread_count):
+                    print("合并文件失败！")
+                    return False
+            elif not self.verify_download():
+                return False
+
+            return self.finish_file()
+
+        except KeyboardInterrupt:
+            print("\n\n下载已暂停，临时文件已保存，下次可以继续下载")
+            self.is_downloading = False
+            self.close_writer()
+            self.save_progress()
+            return False
+        except Exception as e:
+            print(f"\n下载出错: {str(e)}")
+            self.is_downloading = False
+            self.close_writer()
+            self.save_progress()
+            return False
+        finally:
+            if self.hasher is not None:
+                self.hasher.stop()
+            self.stop_extractor()
+
+    def close_writer(self) -> bool:
+        """
+        等写盘线程写完队列中的数据后退出
+
+        Returns:
+            写入过程中是否没有出错
+        """
+        writer, self.disk_writer = self.disk_writer, None
+        if writer is None:
+            return True
+        writer.close()
+        if writer.error is not None:
+            print(f"\n写入文件失败: {writer.error}")
+            return False
+        return True
+
+
+def write_at(f, data, offset: int, lock: threading.Lock):
+    """
+    把数据写入文件的指定偏移处（多线程安全）
+
+    Args:
+        f: 以无缓冲二进制模式打开的文件
+        data: 要写入的数据
+        offset: 文件偏移
+        lock: 不支持 os.pwrite 的平台（Windows）上保护 seek+write 的锁
+    """
+    if hasattr(os, 'pwrite'):
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(f.fileno(), view, offset)
+            view = view[written:]
+            offset += written
+    else:
+        with lock:
+            f.seek(offset)
+            f.write(data)
+
+
+class AsyncDownloader(MultiThreadDownloader):
+    """
+    基于 asyncio + httpx 的下载器
+
+    与 MultiThreadDownloader 共用范围调度、预分配和断点续传逻辑，但所有范围请求跑在同一个事件循环上，
+    可以用几百个并发范围而不必创建同样多的系统线程；服务器支持时通过 HTTP/2 在少量连接上多路复用。
+    磁盘写入交给少量写线程，每个范围任务在自己的写入完成前不会继续读取 socket，从而对网络形成背压。
+    """
+
+    def __init__(self, url, save_path: str, concurrency: int = 64,
+                 chunk_size: int = 1024 * 1024, http2: bool = True,
+                 write_size: int = 256 * 1024, write_threads: int = 4,
+                 sha256: Optional[str] = None, block_hashes: Optional[list] = None,
+                 show_bar: bool = True, rate_limiter: Optional[TokenBucket] = None,
+                 max_bytes_per_second: Optional[float] = None, priority: float = 1.0):
+        """
+        初始化下载器
+
+        Args:
+            url: 下载文件的URL，或多个镜像URL的列表
+            save_path: 保存文件的路径
+            concurrency: 同时进行的范围请求数，默认64
+            chunk_size: 每个分块的大小（字节），默认1MB
+            http2: 是否尝试 HTTP/2（需要安装 h2，未安装时自动退回 HTTP/1.1）
+            write_size: 每个范围任务攒够多少字节提交一次磁盘写入，默认256KB
+            write_threads: 磁盘写线程数，默认4
+            sha256: 整个文件的 sha256，见 MultiThreadDownloader
+            block_hashes: 每个块的 sha256 列表，见 MultiThreadDownloader
+            show_bar: 是否在终端显示进度条
+            rate_limiter: 多个下载共享的令牌桶，用于限制全局带宽
+            max_bytes_per_second: 未提供 rate_limiter 时，本下载单独使用的带宽上限（字节/秒）
+            priority: 在共享令牌桶中的优先级，见 MultiThreadDownloader
+        """
+        super().__init__(url, save_path, thread_count=concurrency, chunk_size=chunk_size, preallocate=True,
+                         sha256=sha256, block_hashes=block_hashes, show_bar=show_bar, rate_limiter=rate_limiter,
+                         max_bytes_per_second=max_bytes_per_second, priority=priority)
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.write_size = write_size
+        self.write_threads = write_threads
+
+    def create_client(self) -> 'httpx.AsyncClient':
+        """创建共享连接池的异步客户端"""
+        limits = httpx.Limits(max_connections=self.thread_count,
+                              max_keepalive_connections=self.thread_count)
+        return httpx.AsyncClient(http2=self.http2, verify=False, follow_redirects=True,
+                                 limits=limits, timeout=httpx.Timeout(30, connect=10))
 
-            # 合并文件
-            print("正在合并文件...")
-            if not self.merge_chunks(self.thread_count):
-                print("合并文件失败！")
+    async def probe_async(self, client: 'httpx.AsyncClient') -> dict:
+        """异步版本的 probe()，并发探测全部镜像"""
+        if self.remote_info is not None:
+            return self.remote_info
+        if self.link_checker is not None and len(self.mirrors) > 1:
+            await asyncio.to_thread(self.rank_mirrors)
+        results = await asyncio.gather(*(self.probe_mirror_async(client, mirror) for mirror in self.mirrors))
+        return self.select_mirrors(list(results))
+
+    async def probe_mirror_async(self, client: 'httpx.AsyncClient', mirror: Mirror):
+        """异步版本的 probe_mirror()"""
+        if not mirror.alive:
+            return Exception(f"镜像不可用: {mirror.url}")
+        try:
+            async with client.stream('GET', mirror.url, headers={'Range': 'bytes=0-0'}, timeout=10) as response:
+                info = self.parse_probe_response(response.status_code, response.headers)
+                mirror.url = str(response.url)
+                return info
+        except Exception as e:
+            return e
+
+    async def download_range_async(self, client: 'httpx.AsyncClient', work: WorkRange, f, writer,
+                                   counter: ProgressCounter) -> bool:
+        """
+        异步下载一个范围，逻辑与 download_range() 相同
+
+        Args:
+            client: 异步客户端
+            work: 调度器分配的下载范围
+            f: 以无缓冲模式打开的 .part 文件
+            writer: 执行磁盘写入的线程池
+            counter: 本协程的进度计数
+
+        Returns:
+            是否下载成功（范围被拆走后提前结束也视为成功）
+        """
+        scheduler = self.scheduler
+        if not scheduler.claim(work):
+            return True
+
+        mirror = self.pick_mirror()
+        if mirror is None:
+            print("\n所有镜像均已失效")
+            return False
+
+        loop = asyncio.get_running_loop()
+        headers = self.range_headers(mirror, work.pos, work.end)
+        first_pos = work.pos
+        started = time.monotonic()
+        block_hash = hashlib.sha256() if self.block_hashes else None
+        buffer = bytearray()
+        # buffer 中第一个字节对应的文件偏移
+        offset = work.pos
+
+        async def flush() -> bool:
+            nonlocal buffer, offset
+            if buffer:
+                data, buffer = buffer, bytearray()
+                await loop.run_in_executor(writer, write_at, f, data, offset, self.write_lock)
+                offset += len(data)
+            # 写入完成后才校验并把已写满的块标记为完成
+            if work.pos > work.claimed:
+                if not self.verify_block(work, block_hash, counter):
+                    offset = work.pos
+                    return False
+            return True
+
+        try:
+            async with client.stream('GET', mirror.url, headers=headers) as response:
+                if response.status_code == 200 and 'If-Range' in headers:
+                    self.source_changed(mirror)
+                    return False
+                if response.status_code not in [200, 206] or (response.status_code == 200 and work.pos > 0):
+                    self.fail_mirror(mirror)
+                    return False
+
+                async for data in response.aiter_raw():
+                    if not self.is_downloading:
+                        return False
+                    if self.rate_share is not None:
+                        wait = self.rate_share.reserve(len(data))
+                        while wait > 0:
+                            await asyncio.sleep(min(wait, TokenBucket.MAX_SLEEP))
+                            wait = self.rate_share.pending()
+
+                    view = memoryview(data)
+                    while view:
+                        if work.pos > work.claimed:
+                            if not scheduler.claim(work):
+                                mirror.record(work.pos - first_pos, time.monotonic() - started)
+                                return True
+                            block_hash = hashlib.sha256() if self.block_hashes else None
+                        n = min(len(view), work.claimed + 1 - work.pos)
+                        buffer += view[:n]
+                        if block_hash is not None:
+                            block_hash.update(view[:n])
+                        work.pos += n
+                        view = view[n:]
+                        counter.value += n
+                        if work.pos > work.claimed or len(buffer) >= self.write_size:
+                            if not await flush():
+                                self.fail_mirror(mirror)
+                                return False
+
+            if not await flush():
+                self.fail_mirror(mirror)
+                return False
+            mirror.record(work.pos - first_pos, time.monotonic() - started)
+            if work.pos <= work.end:
+                self.fail_mirror(mirror)
                 return False
+            return True
+
+        except Exception as e:
+            self.fail_mirror(mirror)
+            print(f"\n范围 {work.start}-{work.end} 下载失败（{mirror.url}）: {str(e)}")
+            return False
+
+    async def worker_async(self, client: 'httpx.AsyncClient', f, writer) -> bool:
+        """异步版本的 worker()"""
+        failures = 0
+        counter = self.new_counter()
+        while self.is_downloading:
+            work = self.scheduler.next_range()
+            if work is None:
+                return True
+
+            ok = await self.download_range_async(client, work, f, writer, counter)
+            counter.value -= self.scheduler.release(work)
 
-            # 清理临时文件
-            print("正在清理临时文件...")
-            self.cleanup()
+            if ok:
+                failures = 0
+            else:
+                failures += 1
+                if failures > self.max_retries or not self.is_downloading:
+                    return False
+                await asyncio.sleep(min(2 ** failures, 10))
+        return False
 
-            print(f"下载完成！文件保存至: {self.save_path}")
+    async def download_async(self, resume: bool = True) -> bool:
+        """异步下载主流程，参数与返回值同 download()"""
+        if os.path.exists(self.save_path) and not resume:
+            print(f"文件已存在: {self.save_path}")
             return True
+        if self.is_complete() or self.link_from_store(self.sha256):
+            return True
+
+        async with self.create_client() as client:
+            print("正在获取文件信息...")
+            info = await self.probe_async(client)
+            self.total_size = info['size']
+            print(f"文件大小: {self.total_size / (1024 * 1024):.2f} MB")
+            if resume and self.is_current():
+                print(f"本地文件已是最新，跳过下载: {self.save_path}")
+                return True
+            if resume and self.store is not None and self.link_from_store(self.store.find_source(self.url, info)):
+                return True
+            if self.check_gguf and not await asyncio.to_thread(self.validate_gguf):
+                return False
+
+            if not info['support_range']:
+                print("警告: 服务器不支持断点续传，将使用单连接下载")
+                self.thread_count = 1
+            else:
+                print(f"服务器支持断点续传，使用 {self.thread_count} 个并发范围下载"
+                      f"{'（HTTP/2）' if self.http2 else ''}")
+
+            self.prepare_file(info['support_range'], resume)
+            self.is_downloading = not self.stopped
+
+            progress_thread = threading.Thread(target=self.show_progress, daemon=True)
+            progress_thread.start()
+            journal_thread = threading.Thread(target=self.journal_loop, daemon=True)
+            journal_thread.start()
 
+            try:
+                with open(self.part_file, 'r+b', buffering=0) as f, \
+                        ThreadPoolExecutor(max_workers=self.write_threads) as writer:
+                    results = await asyncio.gather(
+                        *(self.worker_async(client, f, writer) for _ in range(self.thread_count)))
+            finally:
+                self.is_downloading = False
+                progress_thread.join(timeout=1)
+                journal_thread.join()
+
+        if not all(results):
+            if self.prepare_restart():
+                return await self.download_async(resume)
+            self.save_progress()
+            print("\n下载已暂停，进度已保存" if self.stopped else "\n下载失败！")
+            return False
+        if not self.verify_download():
+            return False
+
+        return self.finish_file()
+
+    def download(self, resume: bool = True) -> bool:
+        """
+        开始下载文件
+
+        Args:
+            resume: 是否启用断点续传，默认True
+
+        Returns:
+            是否下载成功
+        """
+        try:
+            return asyncio.run(self.download_async(resume))
         except KeyboardInterrupt:
             print("\n\n下载已暂停，临时文件已保存，下次可以继续下载")
             self.is_downloading = False
+            self.save_progress()
             return False
         except Exception as e:
             print(f"\n下载出错: {str(e)}")
             self.is_downloading = False
+            self.save_progress()
             return False
+        finally:
+            if self.hasher is not None:
+                self.hasher.stop()
+            self.stop_extractor()
 
 
-def download_file(url: str, save_path: str) -> bool:
+def download_file(url, save_path: str, engine: str = 'thread', sha256: Optional[str] = None,
+                  thread_count: Optional[int] = None, max_bytes_per_second: Optional[float] = None) -> bool:
     """
     便捷的下载函数接口
 
     Args:
-        url: 下载文件的URL
+        url: 下载文件的URL，或多个镜像URL的列表
         save_path: 保存文件的路径
+        engine: 下载引擎，'thread' 为多线程（默认），'async' 为 asyncio/httpx
+        sha256: 可选的整文件 sha256，下载过程中流式校验
+        thread_count: 多线程引擎的连接数，None 表示按吞吐自动调节并记住每个主机的最佳值
+        max_bytes_per_second: 带宽上限（字节/秒），None 表示不限速
 
     Returns:
         是否下载成功
 
     Example:
         >>> download_file("https://example.com/large_file.zip", "./file.zip")
+        >>> download_file("https://example.com/large_file.zip", "./file.zip", engine="async")
     """
-    downloader = MultiThreadDownloader(url, save_path, thread_count=8)
+    if engine == 'async':
+        downloader = AsyncDownloader(url, save_path, sha256=sha256, max_bytes_per_second=max_bytes_per_second)
+    else:
+        downloader = MultiThreadDownloader(url, save_path, thread_count=thread_count or 8, sha256=sha256,
+                                           auto_tune=thread_count is None,
+                                           max_bytes_per_second=max_bytes_per_second)
     return downloader.download(resume=True)
 
 
 if __name__ == "__main__":
     # 示例用法
     if len(sys.argv) < 3:
-        print("用法: python multi_thread_downloader.py <URL> <保存路径> [线程数]")
-        print("示例: python multi_thread_downloader.py https://example.com/file.zip ./file.zip 8")
+        print("用法: python -m org.orgdownload <URL[,镜像URL...]> <保存路径> [线程数]")
+        print("示例: python -m org.orgdownload https://example.com/file.zip ./file.zip 8")
         sys.exit(1)
 
-    url = sys.argv[1]
+    url = sys.argv[1].split(',')
     save_path = sys.argv[2]
-    thread_count = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    # 不指定线程数时自动调节
+    thread_count = int(sys.argv[3]) if len(sys.argv) > 3 else None
 
-    success = download_file(url, save_path)
+    success = download_file(url, save_path, thread_count=thread_count)
     sys.exit(0 if success else 1)
 """def main(url1,url2,data_folder,thread_num):
     urls = [url1, url2]
@@ -0,0 +1,420 @@
+# orgextract.py
+# 说明：
+# - 模型压缩包（.zip / .tar / .tar.gz / .tar.bz2 / .tar.xz / .tar.zst）的流式解压
+# - 解压线程跟随下载的“已连续完成”前沿（与 StreamHasher 相同），块一完成就从 .part 文件读回并解压，
+#   成员直接写到最终位置；下载结束时解压也基本同时完成，不需要下载完再单独解压一遍
+# - 每个成员写入 <成员>.part，校验通过后才重命名：zip 成员核对 CRC32，目录条目提供 members 时核对 sha256
+# - 解压完成后压缩包本身删除，成员清单保存在 <压缩包路径>.extracted 中，用于判断是否已下载
+# - .tar.zst 需要安装 zstandard
+
+import io
+import os
+import json
+import time
+import zlib
+import struct
+import hashlib
+import tarfile
+import threading
+from typing import Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 扩展名 -> tarfile 流式模式（zip 单独处理）
+ARCHIVE_TYPES = (
+    ('.tar.gz', 'r|gz'), ('.tgz', 'r|gz'), ('.tar.bz2', 'r|bz2'), ('.tbz2', 'r|bz2'),
+    ('.tar.xz', 'r|xz'), ('.txz', 'r|xz'), ('.tar.zst', 'zst'), ('.tzst', 'zst'),
+    ('.tar', 'r|'), ('.zip', 'zip'),
+)
+
+READ_SIZE = 1024 * 1024
+
+ZIP_LOCAL_SIG = b'PK\x03\x04'
+ZIP_DESCRIPTOR_SIG = b'PK\x07\x08'
+# 本地文件头之后出现这些标记说明成员已全部读完
+ZIP_END_SIGS = (b'PK\x01\x02', b'PK\x05\x06', b'PK\x06\x06')
+
+
+class ExtractError(ValueError):
+    """压缩包格式错误、成员校验失败或成员路径不安全"""
+
+
+class ExtractStopped(Exception):
+    """下载停止，解压随之中止"""
+
+
+def archive_mode(path: str) -> Optional[str]:
+    """
+    按扩展名判断压缩包类型
+
+    Returns:
+        tarfile 的流式模式（'r|gz' 等），zip 为 'zip'，.tar.zst 为 'zst'；不是压缩包时返回None
+    """
+    name = path.lower()
+    return next((mode for ext, mode in ARCHIVE_TYPES if name.endswith(ext)), None)
+
+
+class FrontierReader(io.RawIOBase):
+    """
+    按顺序读取正在下载的文件：只返回已连续完成的块中的数据，前沿未到时等待
+
+    scheduler 为 None 时文件已完整，直接读取。
+    """
+
+    def __init__(self, path: str, scheduler=None, total_size: Optional[int] = None):
+        super().__init__()
+        self.file = open(path, 'rb')
+        self.scheduler = scheduler
+        self.total_size = scheduler.total_size if scheduler is not None else (
+            total_size if total_size is not None else os.path.getsize(path))
+        self.position = 0
+        # 下一个尚未确认完成的块
+        self.frontier = 0
+        self.stopped = False
+
+    def readable(self) -> bool:
+        return True
+
+    def available(self) -> int:
+        """当前可以读取到的位置"""
+        scheduler = self.scheduler
+        if scheduler is None:
+            return self.total_size
+        while self.frontier < scheduler.block_count and scheduler.done[self.frontier]:
+            self.frontier += 1
+        return min(self.frontier * scheduler.block_size, self.total_size)
+
+    def readinto(self, buffer) -> int:
+        if self.position >= self.total_size:
+            return 0
+        end = self.available()
+        while end <= self.position:
+            if self.stopped:
+                raise ExtractStopped()
+            time.sleep(0.05)
+            end = self.available()
+        size = min(len(buffer), end - self.position)
+        self.file.seek(self.position)
+        n = self.file.readinto(memoryview(buffer)[:size])
+        self.position += n
+        return n
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+
+class ByteStream:
+    """带回退的顺序读取，zip 成员在不知道压缩后大小时需要把多读的数据放回"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.pending = b''
+
+    def read(self, size: int) -> bytes:
+        if self.pending:
+            data, self.pending = self.pending[:size], self.pending[size:]
+            return data
+        return self.raw.read(size)
+
+    def read_exact(self, size: int) -> bytes:
+        parts = []
+        while size > 0:
+            data = self.read(size)
+            if not data:
+                raise ExtractError("压缩包不完整")
+            parts.append(data)
+            size -= len(data)
+        return b''.join(parts)
+
+    def unread(self, data: bytes):
+        self.pending = data + self.pending
+
+
+def member_key(name: str) -> str:
+    """规范化的成员名（统一为 / 分隔，去掉开头的 ./ 和 /），用于与目录中的 members 比较"""
+    return '/'.join(p for p in name.replace('\\', '/').split('/') if p not in ('', '.'))
+
+
+def safe_member_path(dest_dir: str, name: str) -> str:
+    """成员的最终路径；绝对路径或包含 .. 的成员名可能写到目标目录之外，拒绝解压"""
+    parts = [p for p in name.replace('\\', '/').split('/') if p not in ('', '.')]
+    if not parts or '..' in parts or os.path.isabs(name) or ':' in parts[0]:
+        raise ExtractError(f"不安全的成员路径: {name}")
+    return os.path.join(dest_dir, *parts)
+
+
+class BundleExtractor:
+    """后台解压线程，成员写到 dest_dir 下对应的位置"""
+
+    def __init__(self, path: str, dest_dir: str, mode: str, scheduler=None,
+                 member_hashes: Optional[dict] = None):
+        """
+        Args:
+            path: 压缩包文件（下载中的 .part 文件或已完整的文件）
+            dest_dir: 解压目录
+            mode: archive_mode() 的结果
+            scheduler: 下载的范围调度器，None 表示文件已完整
+            member_hashes: {成员名: sha256}，解压时逐个核对
+
+        Raises:
+            ExtractError: .tar.zst 但未安装 zstandard
+        """
+        if mode == 'zst' and zstandard is None:
+            raise ExtractError("解压 .tar.zst 需要安装 zstandard（pip install zstandard）")
+        self.path = path
+        self.dest_dir = dest_dir
+        self.mode = mode
+        self.scheduler = scheduler
+        self.member_hashes = {member_key(k): v.lower() for k, v in (member_hashes or {}).items()}
+        self.members = []
+        self.error = None
+        self.reader = FrontierReader(path, scheduler)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        """中止解压（下载停止或失败时），已写完的成员保留，未写完的 .part 删除"""
+        self.reader.stopped = True
+        if self.thread.is_alive():
+            self.thread.join()
+        self.reader.close()
+
+    def wait(self) -> Optional[list]:
+        """
+        等待解压结束
+
+        Returns:
+            成员清单 [{'name', 'size', 'sha256'}]，出错或中止时返回None
+        """
+        self.thread.join()
+        return None if self.error is not None else self.members
+
+    def run(self):
+        try:
+            stream = io.BufferedReader(self.reader, READ_SIZE)
+            if self.mode == 'zip':
+                self.extract_zip(ByteStream(stream))
+            elif self.mode == 'zst':
+                with zstandard.ZstdDecompressor().stream_reader(stream) as reader:
+                    self.extract_tar(reader, 'r|')
+            else:
+                self.extract_tar(stream, self.mode)
+            missing = set(self.member_hashes) - {member['name'] for member in self.members}
+            if missing:
+                raise ExtractError(f"压缩包中缺少成员: {', '.join(sorted(missing))}")
+        except ExtractStopped as e:
+            self.error = e
+        except Exception as e:
+            # 包括 tarfile / zlib / zstandard 的各种格式错误
+            self.error = e
+            print(f"\n解压失败: {str(e)}")
+        finally:
+            self.reader.close()
+
+    def write_member(self, name: str, chunks, crc: Optional[int] = None, size: Optional[int] = None):
+        """
+        把一个成员写到最终位置：先写 .part，校验通过后重命名
+
+        Args:
+            name: 成员名
+            chunks: 产生成员数据的迭代器
+            crc: 期望的 CRC32（zip），None 表示不核对
+            size: 期望的大小，None 表示不核对
+        """
+        path = safe_member_path(self.dest_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_file = f"{path}.part"
+        digest = hashlib.sha256()
+        actual_crc = 0
+        written = 0
+        try:
+            with open(tmp_file, 'wb') as f:
+                for data in chunks:
+                    f.write(data)
+                    digest.update(data)
+                    if crc is not None:
+                        actual_crc = zlib.crc32(data, actual_crc)
+                    written += len(data)
+            if size is not None and written != size:
+                raise ExtractError(f"成员大小不符: {name}（期望 {size}，实际 {written}）")
+            if crc is not None and actual_crc != crc:
+                raise ExtractError(f"成员 CRC32 校验失败: {name}")
+            key = member_key(name)
+            expected = self.member_hashes.get(key)
+            if expected and digest.hexdigest() != expected:
+                raise ExtractError(f"成员 sha256 校验失败: {name}")
+            os.replace(tmp_file, path)
+        except BaseException:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
+        self.members.append({'name': key, 'size': written, 'sha256': digest.hexdigest()})
+        print(f"\n已解压: {name}")
+
+    def extract_tar(self, stream, mode: str):
+        with tarfile.open(fileobj=stream, mode=mode) as tar:
+            for member in tar:
+                if member.isdir():
+                    os.makedirs(safe_member_path(self.dest_dir, member.name), exist_ok=True)
+                elif member.isfile():
+                    source = tar.extractfile(member)
+                    self.write_member(member.name, iter(lambda: source.read(READ_SIZE), b''),
+                                      size=member.size)
+                else:
+                    # 符号链接、设备文件等可能指向目标目录之外，不解压
+                    print(f"\n跳过非普通文件: {member.name}")
+
+    def extract_zip(self, stream: ByteStream):
+        while True:
+            signature = stream.read(4)
+            if not signature or signature in ZIP_END_SIGS:
+                return
+            if len(signature) < 4:
+                signature += stream.read_exact(4 - len(signature))
+            if signature != ZIP_LOCAL_SIG:
+                raise ExtractError("不是有效的 zip 文件")
+            (_, flags, method, _, _, crc, compressed_size, size,
+             name_length, extra_length) = struct.unpack('<HHHHHIIIHH', stream.read_exact(26))
+            raw_name = stream.read_exact(name_length)
+            name = raw_name.decode('utf-8' if flags & 0x800 else 'cp437')
+            extra = stream.read_exact(extra_length)
+            if flags & 0x1:
+                raise ExtractError(f"不支持加密的 zip 成员: {name}")
+
+            zip64 = False
+            if size == 0xFFFFFFFF or compressed_size == 0xFFFFFFFF:
+                zip64 = True
+                size, compressed_size = self.zip64_sizes(extra, size, compressed_size)
+            # 第 3 位：大小和 CRC 在数据之后的数据描述符中（流式写出的 zip）
+            has_descriptor = bool(flags & 0x8)
+
+            if name.endswith('/'):
+                os.makedirs(safe_member_path(self.dest_dir, name), exist_ok=True)
+                stream.read_exact(compressed_size)
+                continue
+
+            if method == 0:
+                if has_descriptor and not compressed_size:
+                    raise ExtractError(f"无法流式解压未记录大小的存储成员: {name}")
+                chunks = self.zip_stored(stream, compressed_size)
+            elif method == 8:
+                chunks = self.zip_deflated(stream, None if has_descriptor else compressed_size)
+            else:
+                raise ExtractError(f"不支持的 zip 压缩方式 {method}: {name}")
+
+            if has_descriptor:
+                # 先解压（CRC 在写完后与描述符比较）
+                results = {}
+                self.write_member(name, self.collect_crc(chunks, results))
+                crc, size = self.zip_descriptor(stream, zip64)
+                member = self.members[-1]
+                if results['crc'] != crc or member['size'] != size:
+                    os.remove(safe_member_path(self.dest_dir, name))
+                    self.members.pop()
+                    raise ExtractError(f"成员 CRC32 校验失败: {name}")
+            else:
+                self.write_member(name, chunks, crc=crc, size=size)
+
+    @staticmethod
+    def zip64_sizes(extra: bytes, size: int, compressed_size: int) -> tuple:
+        """从 zip64 扩展字段读取大小"""
+        offset = 0
+        while offset + 4 <= len(extra):
+            header_id, length = struct.unpack_from('<HH', extra, offset)
+            if header_id == 0x0001:
+                values = extra[offset + 4:offset + 4 + length]
+                pos = 0
+                if size == 0xFFFFFFFF:
+                    size = struct.unpack_from('<Q', values, pos)[0]
+                    pos += 8
+                if compressed_size == 0xFFFFFFFF:
+                    compressed_size = struct.unpack_from('<Q', values, pos)[0]
+                return size, compressed_size
+            offset += 4 + length
+        raise ExtractError("zip64 成员缺少扩展字段")
+
+    @staticmethod
+    def zip_stored(stream: ByteStream, size: int):
+        while size > 0:
+            data = stream.read(min(READ_SIZE, size))
+            if not data:
+                raise ExtractError("压缩包不完整")
+            size -= len(data)
+            yield data
+
+    @staticmethod
+    def zip_deflated(stream: ByteStream, compressed_size: Optional[int]):
+        """解压 deflate 数据；不知道压缩后大小时读到 deflate 流结束，多读的数据放回"""
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        left = compressed_size
+        while not decompressor.eof:
+            if left == 0:
+                raise ExtractError("deflate 数据不完整")
+            data = stream.read(READ_SIZE if left is None else min(READ_SIZE, left))
+            if not data:
+                raise ExtractError("压缩包不完整")
+            if left is not None:
+                left -= len(data)
+            output = decompressor.decompress(data)
+            if output:
+                yield output
+        if decompressor.unused_data:
+            stream.unread(decompressor.unused_data)
+        tail = decompressor.flush()
+        if tail:
+            yield tail
+
+    @staticmethod
+    def collect_crc(chunks, results: dict):
+        crc = 0
+        for data in chunks:
+            crc = zlib.crc32(data, crc)
+            yield data
+        results['crc'] = crc
+
+    @staticmethod
+    def zip_descriptor(stream: ByteStream, zip64: bool) -> tuple:
+        """读取数据描述符，返回 (CRC32, 解压后大小)；签名是可选的"""
+        head = stream.read_exact(4)
+        if head == ZIP_DESCRIPTOR_SIG:
+            head = stream.read_exact(4)
+        crc = struct.unpack('<I', head)[0]
+        if zip64:
+            _, size = struct.unpack('<QQ', stream.read_exact(16))
+        else:
+            _, size = struct.unpack('<II', stream.read_exact(8))
+        return crc, size
+
+
+def save_bundle_manifest(path: str, dest_dir: str, members: list):
+    """解压完成后记录成员清单，path 为压缩包路径（压缩包本身已删除）"""
+    tmp_file = f"{path}.extracted.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump({'dest_dir': os.path.abspath(dest_dir), 'members': members}, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, f"{path}.extracted")
+
+
+def load_bundle_manifest(path: str) -> Optional[dict]:
+    try:
+        with open(f"{path}.extracted", 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def bundle_complete(path: str) -> bool:
+    """压缩包已解压过，且所有成员仍在、大小未变"""
+    manifest = load_bundle_manifest(path)
+    if not manifest or not manifest.get('members'):
+        return False
+    for member in manifest['members']:
+        member_path = safe_member_path(manifest['dest_dir'], member['name'])
+        if not os.path.isfile(member_path) or os.path.getsize(member_path) != member['size']:
+            return False
+    return True
@@ -0,0 +1,259 @@
+# orggguf.py
+# 说明：
+# - GGUF 文件头解析：magic、版本、张量数和元数据（架构、量化类型、上下文长度等）
+# - parse_gguf_header() 只处理字节数据，不需要网络，可以直接用文件开头的字节或样例文件头调用；
+#   数据不完整时返回已解析的部分并标记 complete=False，调用方多取一些数据后重新解析
+# - 下载器在下载前用范围请求取文件头校验：URL 指向的不是 GGUF 文件、或与目录中的期望不符时提前中止，
+#   下载完成后把解析结果保存在 <文件>.meta 中，供启动模型等后续步骤使用
+
+import os
+import json
+import struct
+from typing import Optional, Callable
+
+GGUF_MAGIC = b"GGUF"
+SUPPORTED_VERSIONS = (1, 2, 3)
+# 第一次读取的文件头大小，不够时每次扩大为 4 倍，最多 HEADER_MAX_SIZE
+HEADER_FETCH_SIZE = 1024 * 1024
+HEADER_MAX_SIZE = 64 * 1024 * 1024
+# 不超过该长度的数组元数据原样保存，更长的（例如词表）只记录长度
+MAX_ARRAY_ITEMS = 64
+# 超过这些值说明数据不是 GGUF（或已损坏），不再继续解析
+MAX_STRING_LENGTH = 16 * 1024 * 1024
+MAX_TENSOR_COUNT = 10 ** 7
+MAX_KV_COUNT = 10 ** 6
+
+# 元数据值类型 -> struct 格式（8 字符串、9 数组单独处理）
+VALUE_FORMATS = {0: 'B', 1: 'b', 2: 'H', 3: 'h', 4: 'I', 5: 'i', 6: 'f', 7: '?', 10: 'Q', 11: 'q', 12: 'd'}
+TYPE_STRING = 8
+TYPE_ARRAY = 9
+
+# general.file_type（llama.cpp 的 llama_ftype）-> 量化类型名称
+FILE_TYPES = {
+    0: "F32", 1: "F16", 2: "Q4_0", 3: "Q4_1", 4: "Q4_1_SOME_F16", 7: "Q8_0", 8: "Q5_0", 9: "Q5_1",
+    10: "Q2_K", 11: "Q3_K_S", 12: "Q3_K_M", 13: "Q3_K_L", 14: "Q4_K_S", 15: "Q4_K_M", 16: "Q5_K_S",
+    17: "Q5_K_M", 18: "Q6_K", 19: "IQ2_XXS", 20: "IQ2_XS", 21: "Q2_K_S", 22: "IQ3_XS", 23: "IQ3_XXS",
+    24: "IQ1_S", 25: "IQ4_NL", 26: "IQ3_S", 27: "IQ3_M", 28: "IQ2_S", 29: "IQ2_M", 30: "IQ4_XS",
+    31: "IQ1_M", 32: "BF16", 36: "TQ1_0", 37: "TQ2_0",
+}
+
+
+class GGUFError(ValueError):
+    """数据不是有效的 GGUF 文件头，或与期望不符"""
+
+
+class HeaderTruncated(Exception):
+    """数据在文件头结束前就用完了"""
+
+
+class ArrayInfo:
+    """被跳过内容的长数组"""
+
+    def __init__(self, item_type: int, count: int):
+        self.item_type = item_type
+        self.count = count
+
+
+class HeaderReader:
+    """在字节数据上顺序读取 GGUF 文件头的各个字段"""
+
+    def __init__(self, data: bytes, endian: str = '<', version: int = 3):
+        self.data = data
+        self.offset = 0
+        self.endian = endian
+        self.version = version
+
+    def read(self, fmt: str):
+        size = struct.calcsize(fmt)
+        if self.offset + size > len(self.data):
+            raise HeaderTruncated()
+        value = struct.unpack_from(self.endian + fmt, self.data, self.offset)[0]
+        self.offset += size
+        return value
+
+    def read_count(self) -> int:
+        """长度/个数字段：版本 1 为 uint32，之后为 uint64"""
+        return self.read('I' if self.version == 1 else 'Q')
+
+    def read_string(self) -> str:
+        length = self.read_count()
+        if length > MAX_STRING_LENGTH:
+            raise GGUFError(f"字符串长度异常: {length}")
+        if self.offset + length > len(self.data):
+            raise HeaderTruncated()
+        value = self.data[self.offset:self.offset + length].decode('utf-8', errors='replace')
+        self.offset += length
+        return value
+
+    def read_value(self, value_type: int):
+        """
+        读取一个元数据值
+
+        Returns:
+            值；超过 MAX_ARRAY_ITEMS 的数组跳过内容，返回 ArrayInfo
+        """
+        if value_type in VALUE_FORMATS:
+            return self.read(VALUE_FORMATS[value_type])
+        if value_type == TYPE_STRING:
+            return self.read_string()
+        if value_type == TYPE_ARRAY:
+            item_type = self.read('I')
+            count = self.read_count()
+            if count <= MAX_ARRAY_ITEMS:
+                return [self.read_value(item_type) for _ in range(count)]
+            self.skip_array(item_type, count)
+            return ArrayInfo(item_type, count)
+        raise GGUFError(f"未知的元数据类型: {value_type}")
+
+    def skip_array(self, item_type: int, count: int):
+        """跳过数组内容：定长类型直接移动位置，字符串/嵌套数组逐项跳过"""
+        if item_type in VALUE_FORMATS:
+            size = struct.calcsize(VALUE_FORMATS[item_type]) * count
+            if self.offset + size > len(self.data):
+                raise HeaderTruncated()
+            self.offset += size
+            return
+        for _ in range(count):
+            self.read_value(item_type)
+
+
+def parse_gguf_header(data: bytes) -> dict:
+    """
+    解析 GGUF 文件头（magic、版本、张量数、元数据）
+
+    Args:
+        data: 文件开头的字节，可以不完整
+
+    Returns:
+        {'version', 'tensor_count', 'kv_count', 'metadata': {键: 值}, 'arrays': {长数组的键: 长度},
+         'complete': 元数据是否已全部解析, 'header_size': 元数据结束位置（不完整时为None）,
+         'architecture', 'name', 'quant', 'context_length'}
+
+    Raises:
+        GGUFError: 不是 GGUF 文件、版本不支持或数据已损坏
+    """
+    if bytes(data[:4]) != GGUF_MAGIC:
+        raise GGUFError(f"不是 GGUF 文件（开头为 {bytes(data[:16])!r}）")
+    if len(data) < 8:
+        raise GGUFError("数据太短，缺少版本号")
+
+    # 大端序文件的版本号按小端读出来是一个很大的数
+    endian = '<'
+    version = struct.unpack_from('<I', data, 4)[0]
+    if version not in SUPPORTED_VERSIONS and struct.unpack_from('>I', data, 4)[0] in SUPPORTED_VERSIONS:
+        endian = '>'
+        version = struct.unpack_from('>I', data, 4)[0]
+    if version not in SUPPORTED_VERSIONS:
+        raise GGUFError(f"不支持的 GGUF 版本: {version}")
+
+    reader = HeaderReader(data, endian, version)
+    reader.offset = 8
+    header = {'version': version, 'tensor_count': None, 'kv_count': None, 'metadata': {}, 'arrays': {},
+              'complete': False, 'header_size': None}
+    try:
+        header['tensor_count'] = reader.read_count()
+        header['kv_count'] = reader.read_count()
+        if header['tensor_count'] > MAX_TENSOR_COUNT or header['kv_count'] > MAX_KV_COUNT:
+            raise GGUFError(f"张量数或元数据数异常: {header['tensor_count']} / {header['kv_count']}")
+        for _ in range(header['kv_count']):
+            key = reader.read_string()
+            value = reader.read_value(reader.read('I'))
+            if isinstance(value, ArrayInfo):
+                header['arrays'][key] = value.count
+            else:
+                header['metadata'][key] = value
+        header['complete'] = True
+        header['header_size'] = reader.offset
+    except HeaderTruncated:
+        pass
+
+    metadata = header['metadata']
+    architecture = metadata.get('general.architecture')
+    file_type = metadata.get('general.file_type')
+    header['architecture'] = architecture
+    header['name'] = metadata.get('general.name')
+    header['quant'] = FILE_TYPES.get(file_type, str(file_type)) if file_type is not None else None
+    header['context_length'] = metadata.get(f'{architecture}.context_length') if architecture else None
+    return header
+
+
+def read_gguf_header(fetch: Callable[[int], bytes], max_size: int = HEADER_MAX_SIZE) -> dict:
+    """
+    按需读取并解析文件头：先取 HEADER_FETCH_SIZE 字节，元数据不完整时取更多
+
+    Args:
+        fetch: fetch(n) 返回文件开头的 n 个字节（文件较短时可以更少）
+        max_size: 最多读取的字节数，超过后返回不完整的解析结果
+
+    Returns:
+        parse_gguf_header() 的结果
+    """
+    size = min(HEADER_FETCH_SIZE, max_size)
+    while True:
+        data = fetch(size)
+        header = parse_gguf_header(data)
+        if header['complete'] or len(data) < size or size >= max_size:
+            return header
+        size = min(size * 4, max_size)
+
+
+def read_gguf_file(path: str, max_size: int = HEADER_MAX_SIZE) -> dict:
+    """解析本地 GGUF 文件的文件头"""
+    with open(path, 'rb') as f:
+        def fetch(size):
+            f.seek(0)
+            return f.read(size)
+
+        return read_gguf_header(fetch, max_size)
+
+
+def check_gguf_expect(header: dict, expect: Optional[dict]) -> list:
+    """
+    与目录条目中的期望比较
+
+    Args:
+        header: parse_gguf_header() 的结果
+        expect: 期望值，可包含 architecture / quant / context_length / tensor_count / version，
+                字符串不区分大小写
+
+    Returns:
+        不一致项的说明列表，全部一致时为空
+    """
+    mismatches = []
+    for key, expected in (expect or {}).items():
+        if expected is None:
+            continue
+        actual = header.get(key, header['metadata'].get(key))
+        if isinstance(expected, str) and isinstance(actual, str):
+            same = expected.lower() == actual.lower()
+        else:
+            same = expected == actual
+        if not same:
+            mismatches.append(f"{key} 应为 {expected}，实际为 {actual}")
+    return mismatches
+
+
+def describe_gguf(header: dict) -> str:
+    """一行文字说明"""
+    parts = [f"GGUF v{header['version']}", f"{header['tensor_count']} 个张量"]
+    for key, label in (('architecture', '架构'), ('quant', '量化'), ('context_length', '上下文')):
+        if header.get(key) is not None:
+            parts.append(f"{label} {header[key]}")
+    return "，".join(parts)
+
+
+def save_gguf_meta(path: str, header: dict):
+    """把解析结果保存到 <文件>.meta"""
+    tmp_file = f"{path}.meta.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(header, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, f"{path}.meta")
+
+
+def load_gguf_meta(path: str) -> Optional[dict]:
+    """读取 <文件>.meta，没有时返回None"""
+    try:
+        with open(f"{path}.meta", 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
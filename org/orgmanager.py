@@ -0,0 +1,332 @@
+# orgmanager.py
+# 说明：
+# - 下载队列管理：排队多个下载任务，同时最多运行 max_jobs 个
+# - 所有任务共享全局连接数上限（信号量）和全局带宽上限（令牌桶），带宽上限可以在运行中修改，
+#   同时下载的任务按优先级分配带宽
+# - 支持暂停 / 继续 / 取消，暂停后依靠断点续传日志从已完成的块继续
+# - 每个任务可单独查询进度，供命令行或界面轮询显示
+
+import os
+import time
+import threading
+from typing import Optional, Callable
+
+from org.orgdownload import MultiThreadDownloader, TokenBucket
+from org.orgextract import archive_mode
+
+# 任务状态
+QUEUED = "queued"
+RUNNING = "running"
+PAUSED = "paused"
+DONE = "done"
+FAILED = "failed"
+CANCELED = "canceled"
+
+
+class DownloadJob:
+    """下载队列中的一个任务"""
+
+    def __init__(self, job_id: int, urls: list, save_path: str, sha256: Optional[str] = None,
+                 block_hashes: Optional[list] = None, name: str = "", gguf_expect: Optional[dict] = None,
+                 priority: float = 1.0, member_hashes: Optional[dict] = None, extract: Optional[bool] = None):
+        self.job_id = job_id
+        self.urls = urls
+        self.save_path = save_path
+        self.sha256 = sha256
+        self.block_hashes = block_hashes
+        self.gguf_expect = gguf_expect
+        self.priority = priority
+        self.member_hashes = member_hashes
+        self.extract = extract
+        self.name = name or os.path.basename(save_path)
+        self.status = QUEUED
+        self.error = ""
+        self.downloader = None
+        self.thread = None
+        self.started_at = None
+        self.finished_at = None
+
+    def progress(self) -> tuple:
+        """
+        当前进度
+
+        Returns:
+            (已下载字节数, 总字节数)，尚未开始时总字节数为0
+        """
+        downloader = self.downloader
+        if downloader is None:
+            return 0, 0
+        return downloader.downloaded_size, downloader.total_size
+
+    def info(self) -> dict:
+        """任务状态快照"""
+        downloaded, total = self.progress()
+        return {
+            "id": self.job_id,
+            "name": self.name,
+            "save_path": self.save_path,
+            "status": self.status,
+            "downloaded": downloaded,
+            "total": total,
+            "percent": downloaded * 100 / total if total else 0.0,
+            "priority": self.priority,
+            "error": self.error,
+        }
+
+
+class DownloadManager:
+    """下载队列管理器，所有方法都可以在任意线程调用"""
+
+    def __init__(self, max_jobs: int = 2, max_connections: int = 16,
+                 max_bytes_per_second: Optional[float] = None, thread_count: int = 8,
+                 on_change: Optional[Callable[[DownloadJob], None]] = None, store=None,
+                 link_checker=None, rate_limiter: Optional[TokenBucket] = None):
+        """
+        初始化下载管理器
+
+        Args:
+            max_jobs: 同时运行的下载任务数
+            max_connections: 所有任务合计的最大连接数
+            max_bytes_per_second: 所有任务合计的带宽上限（字节/秒），None 表示不限速
+            thread_count: 每个任务的下载线程数（实际连接数还受 max_connections 限制）
+            on_change: 任务状态变化时的回调（在工作线程中调用）
+            store: 所有任务共用的内容寻址存储（org.orgstore.ModelStore），None 表示不使用
+            link_checker: 所有任务共用的链接检测器（org.orgprobe.LinkChecker），用于挑选最快的镜像
+            rate_limiter: 与其他下载共用的令牌桶，给定时忽略 max_bytes_per_second
+        """
+        self.max_jobs = max_jobs
+        self.thread_count = thread_count
+        self.connections = threading.BoundedSemaphore(max_connections)
+        # 不限速时也创建令牌桶（速率为None时不等待），以便运行中用 set_bandwidth() 开启限速
+        self.bandwidth = rate_limiter if rate_limiter is not None else TokenBucket(max_bytes_per_second)
+        self.on_change = on_change
+        self.store = store
+        self.link_checker = link_checker
+        self.jobs = []
+        self.lock = threading.Lock()
+        self.next_id = 1
+
+    def add(self, url, save_path: str, sha256: Optional[str] = None,
+            block_hashes: Optional[list] = None, name: str = "",
+            gguf_expect: Optional[dict] = None, priority: float = 1.0,
+            member_hashes: Optional[dict] = None, extract: Optional[bool] = None) -> DownloadJob:
+        """
+        添加下载任务
+
+        Args:
+            url: 下载地址，或多个镜像地址的列表
+            save_path: 保存路径
+            sha256: 可选的整文件 sha256
+            block_hashes: 可选的分块 sha256 列表
+            name: 显示名称，默认为文件名
+            gguf_expect: 可选的 GGUF 文件头期望（architecture / quant / context_length 等）
+            priority: 优先级（权重），同时下载的任务按比例分配带宽
+            member_hashes: 压缩包成员的 {成员名: sha256}，边下载边解压时逐个核对
+            extract: 是否边下载边解压，None 表示按 save_path 的扩展名判断
+
+        Returns:
+            新建的任务
+
+        Raises:
+            ValueError: extract=True 但 save_path 不是可识别的压缩包
+        """
+        urls = [url] if isinstance(url, str) else list(url)
+        if extract and archive_mode(save_path) is None:
+            # 在排队前拒绝，而不是等到启动下载器时才失败
+            raise ValueError(f"无法按扩展名判断压缩包类型: {save_path}")
+        with self.lock:
+            # 同一个目标文件只保留一个未结束的任务，避免多个线程同时写一个文件
+            for job in self.jobs:
+                if job.save_path == save_path and job.status in (QUEUED, RUNNING, PAUSED):
+                    return job
+            job = DownloadJob(self.next_id, urls, save_path, sha256, block_hashes, name, gguf_expect, priority,
+                              member_hashes, extract)
+            self.next_id += 1
+            self.jobs.append(job)
+        self.dispatch()
+        return job
+
+    def add_entry(self, value: dict, save_dir: str = "download") -> DownloadJob:
+        """
+        按目录（YAML）条目添加任务
+
+        Args:
+            value: 目录中的一个条目（url / mirrors / d_name / sha256 / block_sha256 / name / gguf / priority /
+                   members / extract），d_name 为压缩包时边下载边解压到 save_dir
+            save_dir: 保存目录
+
+        Returns:
+            新建的任务
+
+        Raises:
+            ValueError: 条目缺少 url 或 d_name，或 extract 为真但 d_name 不是压缩包
+        """
+        urls = [value.get("url", "")] + list(value.get("mirrors") or [])
+        urls = [u for u in dict.fromkeys(urls) if u]
+        if not urls or not value.get("d_name"):
+            raise ValueError(f"条目缺少 url 或 d_name: {value.get('name', '')}")
+        os.makedirs(save_dir, exist_ok=True)
+        return self.add(urls, os.path.join(save_dir, value["d_name"]), sha256=value.get("sha256"),
+                        block_hashes=value.get("block_sha256"), name=value.get("name", ""),
+                        gguf_expect=value.get("gguf"), priority=float(value.get("priority", 1.0)),
+                        member_hashes=value.get("members"), extract=value.get("extract"))
+
+    def get(self, job_id: int) -> Optional[DownloadJob]:
+        with self.lock:
+            return next((job for job in self.jobs if job.job_id == job_id), None)
+
+    def status(self) -> list:
+        """全部任务的状态快照"""
+        with self.lock:
+            return [job.info() for job in self.jobs]
+
+    def dispatch(self):
+        """启动排队中的任务，直到运行数达到 max_jobs；无法创建下载器的任务标记为失败，继续启动后面的任务"""
+        failed = []
+        with self.lock:
+            running = sum(job.status == RUNNING for job in self.jobs)
+            for job in self.jobs:
+                if running >= self.max_jobs:
+                    break
+                if job.status != QUEUED:
+                    continue
+                job.status = RUNNING
+                job.error = ""
+                job.started_at = time.time()
+                try:
+                    job.downloader = MultiThreadDownloader(
+                        job.urls, job.save_path, thread_count=self.thread_count,
+                        sha256=job.sha256, block_hashes=job.block_hashes, show_bar=False,
+                        connection_limiter=self.connections, rate_limiter=self.bandwidth, store=self.store,
+                        link_checker=self.link_checker, gguf_expect=job.gguf_expect, priority=job.priority,
+                        member_hashes=job.member_hashes, extract=job.extract)
+                except Exception as e:
+                    job.status = FAILED
+                    job.error = str(e)
+                    job.finished_at = time.time()
+                    failed.append(job)
+                    continue
+                job.thread = threading.Thread(target=self.run_job, args=(job,), daemon=True)
+                job.thread.start()
+                running += 1
+        for job in failed:
+            self.notify(job)
+
+    def run_job(self, job: DownloadJob):
+        """任务线程：执行下载并根据结果更新状态"""
+        self.notify(job)
+        try:
+            ok = job.downloader.download(resume=True)
+        except Exception as e:
+            ok = False
+            job.error = str(e)
+
+        with self.lock:
+            if job.status == CANCELED:
+                self.remove_partial(job)
+            elif job.status == RUNNING:
+                job.status = DONE if ok else FAILED
+                if not ok and not job.error:
+                    job.error = "下载失败"
+            job.finished_at = time.time()
+        self.notify(job)
+        self.dispatch()
+
+    def set_bandwidth(self, max_bytes_per_second: Optional[float]):
+        """运行中修改全部任务合计的带宽上限，None 或 0 表示不限速"""
+        self.bandwidth.set_rate(max_bytes_per_second)
+
+    def set_priority(self, job_id: int, priority: float) -> bool:
+        """修改任务的优先级，运行中的任务立即生效"""
+        job = self.get(job_id)
+        if job is None:
+            return False
+        job.priority = priority
+        downloader = job.downloader
+        if downloader is not None:
+            downloader.set_priority(priority)
+        self.notify(job)
+        return True
+
+    def pause(self, job_id: int) -> bool:
+        """暂停任务，已完成的块保存在断点续传日志中"""
+        job = self.get(job_id)
+        if job is None or job.status not in (QUEUED, RUNNING):
+            return False
+        with self.lock:
+            was_running = job.status == RUNNING
+            job.status = PAUSED
+        if was_running:
+            job.downloader.stop()
+        self.notify(job)
+        return True
+
+    def resume(self, job_id: int) -> bool:
+        """继续已暂停或失败的任务（重新排队）"""
+        job = self.get(job_id)
+        if job is None or job.status not in (PAUSED, FAILED):
+            return False
+        if job.thread is not None and job.thread.is_alive():
+            # 等上一次运行完全退出，避免两个下载器同时写一个文件
+            job.thread.join()
+        with self.lock:
+            job.status = QUEUED
+        self.notify(job)
+        self.dispatch()
+        return True
+
+    def cancel(self, job_id: int) -> bool:
+        """取消任务并删除未完成的临时文件"""
+        job = self.get(job_id)
+        if job is None or job.status in (DONE, CANCELED):
+            return False
+        with self.lock:
+            was_running = job.status == RUNNING
+            job.status = CANCELED
+            if not was_running:
+                self.remove_partial(job)
+        if was_running:
+            # 运行中的任务由任务线程在下载器退出后删除临时文件
+            job.downloader.stop()
+        self.notify(job)
+        return True
+
+    def remove_partial(self, job: DownloadJob):
+        """删除任务未完成的临时文件（.part / .progress / 旧模式的分块目录）"""
+        MultiThreadDownloader(job.urls, job.save_path).cleanup()
+        part_file = f"{job.save_path}.part"
+        if os.path.exists(part_file):
+            os.remove(part_file)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待所有排队和运行中的任务结束（暂停的任务不等待）
+
+        Returns:
+            是否在超时前全部结束
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.lock:
+                busy = any(job.status in (QUEUED, RUNNING) for job in self.jobs)
+            if not busy:
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.2)
+
+    def shutdown(self):
+        """暂停全部未结束的任务（进度会保存，下次可以继续）"""
+        for job in list(self.jobs):
+            if job.status in (QUEUED, RUNNING):
+                self.pause(job.job_id)
+        for job in list(self.jobs):
+            if job.thread is not None:
+                job.thread.join()
+
+    def notify(self, job: DownloadJob):
+        if self.on_change is not None:
+            try:
+                self.on_change(job)
+            except Exception as e:
+                print(f"下载状态回调出错: {e}")
@@ -0,0 +1,263 @@
+# orgprobe.py
+# 说明：
+# - 并发链接检测：同时探测目录中所有条目的全部下载地址（主地址 + 镜像），判断是否可用并测量延迟和初始吞吐
+# - 每个地址只请求开头的一小段（Range: bytes=0-N），读够样本就断开连接；
+#   不支持 Range 的服务器返回整个文件时也只读取样本大小，不会把几 GB 的文件拉下来
+# - 检测结果按 TTL 缓存在内存和 org/probe_cache.json 中，界面和下载器可以立即挑出最快的可用地址
+# - 运行：python -m org.orgprobe <目录.yml> [--force] [--ttl 600]
+
+import os
+import sys
+import json
+import time
+import threading
+import argparse
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from org.orgdownload import get_session
+from org.orgread import entry_urls, get_catalog
+
+# 检测结果缓存文件
+PROBE_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "probe_cache.json")
+# 测量初始吞吐时读取的样本大小
+SAMPLE_SIZE = 256 * 1024
+
+
+class ProbeResult:
+    """一个地址的检测结果"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.ok = False
+        self.status = None
+        # 从发出请求到收到响应头的秒数
+        self.latency = None
+        # 读取样本的吞吐（字节/秒），0 表示未测得
+        self.speed = 0.0
+        self.size = None
+        self.support_range = False
+        self.error = ""
+        self.checked_at = 0.0
+
+    def to_dict(self) -> dict:
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ProbeResult':
+        result = cls(data["url"])
+        result.__dict__.update({k: v for k, v in data.items() if k in result.__dict__})
+        return result
+
+    def describe(self) -> str:
+        """一行文字说明，用于命令行和界面提示"""
+        if not self.ok:
+            return f"不可用 {self.error}"
+        speed = f"{self.speed / (1024 * 1024):.2f} MB/s" if self.speed else "-"
+        return f"延迟 {self.latency * 1000:.0f} ms  初始吞吐 {speed}"
+
+
+def probe_url(url: str, timeout: float = 5.0, sample_size: int = SAMPLE_SIZE) -> ProbeResult:
+    """
+    检测单个地址：请求开头 sample_size 字节，测量响应延迟和读取样本的吞吐
+
+    Args:
+        url: 下载地址
+        timeout: 连接/读取超时（秒），读取样本也不超过该时间
+        sample_size: 样本大小，0 表示只请求第一个字节（只测延迟）
+
+    Returns:
+        检测结果
+    """
+    result = ProbeResult(url)
+    end = max(sample_size, 1) - 1
+    started = time.perf_counter()
+    try:
+        with get_session(url).get(url, headers={'Range': f'bytes=0-{end}'}, stream=True,
+                                  allow_redirects=True, timeout=timeout) as response:
+            result.latency = time.perf_counter() - started
+            result.status = response.status_code
+            if response.status_code >= 400:
+                result.error = f"HTTP {response.status_code}"
+                return result
+            result.ok = True
+            content_range = response.headers.get('Content-Range', '')
+            if response.status_code == 206 and '/' in content_range:
+                result.support_range = True
+                size = content_range.rsplit('/', 1)[1]
+                result.size = int(size) if size.isdigit() else None
+            elif 'Content-Length' in response.headers:
+                result.size = int(response.headers['Content-Length'])
+
+            if sample_size:
+                received = 0
+                first = time.perf_counter()
+                # 服务器忽略 Range 时返回整个文件，读够样本就断开
+                for chunk in response.iter_content(64 * 1024):
+                    received += len(chunk)
+                    if received >= sample_size or time.perf_counter() - first > timeout:
+                        break
+                elapsed = time.perf_counter() - first
+                if received and elapsed > 0:
+                    result.speed = received / elapsed
+    except (requests.RequestException, ValueError) as e:
+        result.error = str(e)
+    finally:
+        result.checked_at = time.time()
+    return result
+
+
+def rank_key(result: ProbeResult) -> tuple:
+    """排序键：可用的在前，初始吞吐高的在前，吞吐相同（或未测）时延迟低的在前"""
+    return not result.ok, -result.speed, result.latency if result.latency is not None else float('inf')
+
+
+class LinkChecker:
+    """带 TTL 缓存的并发链接检测器，可在多个线程中共享"""
+
+    def __init__(self, ttl: float = 600, failure_ttl: float = 60, max_workers: int = 32,
+                 timeout: float = 5.0, sample_size: int = SAMPLE_SIZE,
+                 cache_file: Optional[str] = PROBE_CACHE_FILE):
+        """
+        Args:
+            ttl: 可用地址的检测结果有效期（秒）
+            failure_ttl: 不可用地址的检测结果有效期（秒），较短，以便临时故障恢复后尽快重新使用
+            max_workers: 同时检测的地址数
+            timeout: 单个地址的超时（秒）
+            sample_size: 测量初始吞吐的样本大小
+            cache_file: 缓存文件，None 表示只缓存在内存中
+        """
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.sample_size = sample_size
+        self.cache_file = cache_file
+        self.lock = threading.Lock()
+        self.results = self.load()
+
+    def load(self) -> dict:
+        if not self.cache_file:
+            return {}
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                return {url: ProbeResult.from_dict(data) for url, data in json.load(f).items()}
+        except (OSError, ValueError, KeyError, TypeError):
+            return {}
+
+    def save(self):
+        if not self.cache_file:
+            return
+        with self.lock:
+            data = {url: result.to_dict() for url, result in self.results.items()}
+        tmp_file = f"{self.cache_file}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_file, self.cache_file)
+        except OSError as e:
+            print(f"保存链接检测缓存失败: {e}")
+
+    def cached(self, url: str) -> Optional[ProbeResult]:
+        """未过期的检测结果，没有时返回None"""
+        with self.lock:
+            result = self.results.get(url)
+        if result is None:
+            return None
+        ttl = self.ttl if result.ok else self.failure_ttl
+        return result if time.time() - result.checked_at < ttl else None
+
+    def check_all(self, urls: list, force: bool = False) -> dict:
+        """
+        并发检测一组地址，未过期的结果直接使用缓存
+
+        Args:
+            urls: 地址列表（可以有重复）
+            force: 忽略缓存，全部重新检测
+
+        Returns:
+            {地址: ProbeResult}
+        """
+        urls = list(dict.fromkeys(urls))
+        results = {}
+        stale = []
+        for url in urls:
+            result = None if force else self.cached(url)
+            if result is None:
+                stale.append(url)
+            else:
+                results[url] = result
+
+        if stale:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(stale))) as executor:
+                fresh = list(executor.map(lambda u: probe_url(u, self.timeout, self.sample_size), stale))
+            with self.lock:
+                for result in fresh:
+                    self.results[result.url] = result
+                    results[result.url] = result
+            self.save()
+        return results
+
+    def check(self, url: str, force: bool = False) -> ProbeResult:
+        return self.check_all([url], force)[url]
+
+    def rank(self, urls: list, force: bool = False) -> list:
+        """
+        检测并排序一组地址（通常是同一个文件的主地址和镜像）
+
+        Returns:
+            按 rank_key 排序的 ProbeResult 列表，最快的可用地址在最前
+        """
+        results = self.check_all(urls, force)
+        return sorted((results[url] for url in dict.fromkeys(urls)), key=rank_key)
+
+    def best(self, urls: list, force: bool = False) -> Optional[str]:
+        """最快的可用地址，全部不可用时返回None"""
+        ranked = self.rank(urls, force)
+        return ranked[0].url if ranked and ranked[0].ok else None
+
+    def check_catalog(self, catalog: dict, force: bool = False) -> dict:
+        """
+        一次并发检测整个目录的全部地址
+
+        Args:
+            catalog: 目录 YAML 的内容 {键: 条目}
+            force: 忽略缓存，全部重新检测
+
+        Returns:
+            {键: 该条目排序后的 ProbeResult 列表}
+        """
+        entries = {key: entry_urls(value) for key, value in catalog.items() if isinstance(value, dict)}
+        results = self.check_all([url for urls in entries.values() for url in urls], force)
+        return {key: sorted((results[url] for url in urls), key=rank_key) for key, urls in entries.items()}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="并发检测目录中全部下载地址的可用性、延迟和初始吞吐")
+    parser.add_argument("catalog", help="目录 YAML 文件")
+    parser.add_argument("--force", action="store_true", help="忽略缓存，全部重新检测")
+    parser.add_argument("--ttl", type=float, default=600, help="检测结果的缓存有效期（秒）")
+    parser.add_argument("--timeout", type=float, default=5.0, help="单个地址的超时（秒）")
+    args = parser.parse_args(argv)
+
+    catalog = get_catalog(args.catalog).data
+
+    started = time.perf_counter()
+    ranked = LinkChecker(ttl=args.ttl, timeout=args.timeout).check_catalog(catalog, args.force)
+    failed = 0
+    for key, results in ranked.items():
+        print(f"{key}:")
+        for result in results:
+            print(f"  {'✓' if result.ok else '✗'} {result.url}  {result.describe()}")
+        if not any(result.ok for result in results):
+            failed += 1
+    total = sum(len(results) for results in ranked.values())
+    print(f"共 {len(ranked)} 个条目、{total} 个地址，{failed} 个条目没有可用地址，"
+          f"耗时 {time.perf_counter() - started:.2f} 秒")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
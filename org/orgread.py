@@ -1,12 +1,42 @@
+# orgread.py
+# 说明：
+# - 读取目录 YAML，按 name 查找条目
+# - Catalog：目录文件的内存副本，第一次使用时才读取；文件修改时间/大小变化后重新读取，只更新变化的条目，
+#   按键和按 d_name 查找都是字典查找；get_catalog() 按路径返回共享的实例，界面和下载器共用一份
+# - 解析结果的二进制快照（pickle）按 (路径, 大小, 修改时间) 缓存在 org/catalog_cache/ 中，
+#   文件未变化时直接读取快照，不再解析 YAML；需要解析时优先使用 libyaml 的 C 解析器
+# - CatalogIndex：目录文件夹（配置中的 data_yml）中全部目录的合并索引，各文件并发读取，
+#   相同模型（sha256 相同，没有 sha256 时主地址相同）合并为一个条目并记录来源；
+#   某个文件变化时只更新该文件中变化的条目，跨全部目录查找只需查一次合并后的索引
+# - 导入本模块没有副作用；交互式选择条目：python -m org.orgread
+
 import os
+import time
+import pickle
+import hashlib
+import threading
 import yaml
 import configparser
-import difflib
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    # 安装了 libyaml 时使用 C 实现的解析器，比纯 Python 的 safe_load 快一个数量级
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+from org.orgsearch import SearchIndex
 
 # 全局变量（供外部模块使用）
 read_url = ""
 read_d_name = ""
 
+# 默认配置文件（与本模块同目录），其中的 data_yml 相对于配置文件所在目录
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.ini")
+# 解析结果快照目录；快照格式变化时修改 CACHE_FORMAT，旧快照自动失效
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "catalog_cache")
+CACHE_FORMAT = 1
+
 
 def load_config(config_path="config.ini"):
     """
@@ -26,26 +56,440 @@ def read_yml(file_path):
     :return: 返回文件内容/报错
     """
     try:
-        with open(file_path, "r", encoding="utf-8") as yml:
-            data = yaml.safe_load(yml)
-            return data
+        return load_yml_cached(file_path)
     except Exception as e:
         print(f"读取 YAML 失败: {e}")
         return None
 
 
-def search_by_name(data, search_name):
-    """模糊查找 name"""
+def parse_yml(file_path):
+    """
+    解析 yml 文件（可用时使用 C 解析器）
+    :param file_path: 文件路径
+    :return: 文件内容
+    """
+    with open(file_path, "r", encoding="utf-8") as yml:
+        return yaml.load(yml, Loader=SafeLoader)
+
+
+def cache_file_for(file_path, cache_dir=CACHE_DIR):
+    """文件对应的快照路径（按绝对路径的哈希命名）"""
+    digest = hashlib.sha1(os.path.abspath(file_path).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{digest}.pickle")
+
+
+def load_yml_cached(file_path, stat=None, cache_dir=CACHE_DIR):
+    """
+    读取 yml 文件，文件未变化时使用解析结果的快照
+    :param file_path: 文件路径
+    :param stat: 调用方已取得的 os.stat() 结果，None 时重新获取
+    :param cache_dir: 快照目录，None 表示不使用快照
+    :return: 文件内容
+    :raises OSError: 文件无法读取
+    :raises yaml.YAMLError: YAML 格式错误
+    """
+    if cache_dir is None:
+        return parse_yml(file_path)
+    stat = stat or os.stat(file_path)
+    path = os.path.abspath(file_path)
+    cache_file = cache_file_for(path, cache_dir)
+    try:
+        with open(cache_file, "rb") as f:
+            snapshot = pickle.load(f)
+        if (snapshot.get("format") == CACHE_FORMAT and snapshot.get("path") == path
+                and snapshot.get("size") == stat.st_size and snapshot.get("mtime_ns") == stat.st_mtime_ns):
+            return snapshot["data"]
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError, KeyError, TypeError):
+        pass
+
+    data = parse_yml(path)
+    snapshot = {"format": CACHE_FORMAT, "path": path, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                "data": data}
+    tmp_file = f"{cache_file}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(tmp_file, "wb") as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        print(f"保存目录快照失败: {e}")
+    return data
+
+
+def search_by_name(data, search_name, limit=None):
+    """
+    模糊查找 name：子串匹配或相似度 > 0.5，使用预建的三元组索引（见 org/orgsearch.py）
+    :param data: 目录数据 {键: 条目}
+    :param search_name: 要查找的 name
+    :param limit: 最多返回的结果数，None 表示全部
+    :return: 按匹配程度排序的 [(键, 条目), ...]
+    """
     if not isinstance(data, dict):
         print("数据格式错误！")
         return []
 
-    matches = []
-    for key, value in data.items():
-        name = value.get("name", "")
-        if search_name.lower() in name.lower() or difflib.SequenceMatcher(None, name.lower(), search_name.lower()).ratio() > 0.5:
-            matches.append((key, value))
-    return matches
+    return [(key, value) for key, value, _ in get_index(data).search(search_name, limit)]
+
+
+# 最近一次建立的索引，对同一份数据重复查找时不再重建
+last_index = None
+
+
+def get_index(data):
+    """
+    获取 data 的搜索索引，data 换了或条目数变了时重建
+    :param data: 目录数据 {键: 条目}
+    :return: SearchIndex
+    """
+    global last_index
+    if last_index is None or last_index[0] is not data or len(last_index[1]) != len(data):
+        last_index = (data, SearchIndex(data))
+    return last_index[1]
+
+
+def entry_urls(value):
+    """
+    获取条目的全部下载地址：url 为主地址，可选的 mirrors 列出其他镜像
+    :param value: YAML 中的一个条目，例如
+                  {"name": ..., "url": "https://a/x.gguf", "mirrors": ["https://b/x.gguf"], "d_name": "x.gguf"}
+    :return: 去重后的地址列表（主地址在前）
+    """
+    urls = [value.get("url", "")] + list(value.get("mirrors") or [])
+    return [u for u in dict.fromkeys(urls) if u]
+
+
+class Catalog:
+    """目录 YAML 的内存副本，可在多个线程中共享"""
+
+    def __init__(self, path, check_interval=1.0, cache_dir=CACHE_DIR):
+        """
+        :param path: 目录文件路径（创建时不读取）
+        :param check_interval: 两次检查文件是否变化的最小间隔（秒），0 表示每次访问都检查
+        :param cache_dir: 解析结果快照目录，None 表示不使用快照
+        """
+        self.path = os.path.abspath(path)
+        self.check_interval = check_interval
+        self.cache_dir = cache_dir
+        self.lock = threading.RLock()
+        self.entries = {}
+        # d_name -> {键: None}（用字典当有序集合）
+        self.d_names = {}
+        self.signature = None
+        self.checked_at = 0.0
+        # 每次内容变化加一，调用方可以据此判断是否需要刷新显示
+        self.version = 0
+        self.index = None
+
+    def refresh(self, force=False):
+        """
+        文件变化时重新读取，只更新新增、删除和修改过的条目
+        :param force: 不管检查间隔和文件签名，立即重新读取
+        :return: 变化的键的集合（没有变化时为空集）
+        :raises OSError: 文件无法读取
+        :raises yaml.YAMLError: YAML 格式错误
+        :raises ValueError: 内容不是键值对结构
+        """
+        with self.lock:
+            now = time.monotonic()
+            if not force and self.signature is not None and now - self.checked_at < self.check_interval:
+                return set()
+            self.checked_at = now
+            stat = os.stat(self.path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if not force and signature == self.signature:
+                return set()
+
+            data = load_yml_cached(self.path, stat, self.cache_dir) or {}
+            if not isinstance(data, dict):
+                raise ValueError(f"目录格式错误，应为键值对结构: {self.path}")
+
+            changed = set(self.entries) - set(data)
+            for key in changed:
+                self.forget_d_name(key)
+            for key, value in data.items():
+                # 值为空（YAML 中 "b:" 后面没有内容）的新键也要算作变化，不能用 get() 比较
+                if key not in self.entries or self.entries[key] != value:
+                    changed.add(key)
+                    self.forget_d_name(key)
+                    if isinstance(value, dict) and value.get("d_name"):
+                        self.d_names.setdefault(value["d_name"], {})[key] = None
+            # 新字典保持文件中的顺序，未变化的条目沿用旧对象
+            self.entries = {key: value if key in changed else self.entries[key] for key, value in data.items()}
+            self.signature = signature
+            if changed:
+                self.version += 1
+                self.index = None
+            return changed
+
+    def forget_d_name(self, key):
+        """从 d_name -> 键 的映射中删除 key 原来的 d_name"""
+        old = self.entries.get(key)
+        keys = self.d_names.get(old.get("d_name")) if isinstance(old, dict) else None
+        if keys is not None:
+            keys.pop(key, None)
+            if not keys:
+                del self.d_names[old["d_name"]]
+
+    @property
+    def data(self):
+        """全部条目 {键: 条目}（按文件中的顺序），不要修改返回的字典"""
+        self.refresh()
+        return self.entries
+
+    def get(self, key, default=None):
+        """按键查找条目"""
+        return self.data.get(key, default)
+
+    def find_d_name(self, d_name):
+        """
+        按保存文件名查找条目（多个条目使用同一个 d_name 时返回最早读到的）
+        :return: (键, 条目)，找不到时为 (None, None)
+        """
+        entries = self.data
+        for key in self.d_names.get(d_name, ()):
+            return key, entries[key]
+        return None, None
+
+    def search(self, search_name, limit=None):
+        """按 name 模糊查找，索引在内容变化后的第一次查找时重建"""
+        self.refresh()
+        with self.lock:
+            if self.index is None:
+                self.index = SearchIndex(self.entries)
+            index = self.index
+        return [(key, value) for key, value, _ in index.search(search_name, limit)]
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, key):
+        return key in self.data
+
+
+# 按绝对路径共享的 Catalog 实例
+catalogs = {}
+catalogs_lock = threading.Lock()
+
+
+def get_catalog(path):
+    """
+    获取 path 对应的共享 Catalog（同一个文件只有一个实例）
+    :param path: 目录文件路径
+    :return: Catalog
+    """
+    path = os.path.abspath(path)
+    with catalogs_lock:
+        catalog = catalogs.get(path)
+        if catalog is None:
+            catalog = catalogs[path] = Catalog(path)
+        return catalog
+
+
+def default_catalog(config_path=CONFIG_FILE):
+    """
+    配置文件中 data_yml / target_file 指定的目录
+    :param config_path: 配置文件路径
+    :return: Catalog
+    """
+    config = load_config(config_path)
+    yml_dir = os.path.join(os.path.dirname(os.path.abspath(config_path)), config["DEFAULT"]["data_yml"])
+    return get_catalog(os.path.join(yml_dir, config["DEFAULT"]["target_file"]))
+
+
+def default_catalog_dir(config_path=CONFIG_FILE):
+    """
+    配置文件中 data_yml 指定的目录文件夹（相对于配置文件所在目录）
+    :param config_path: 配置文件路径
+    :return: 文件夹的绝对路径
+    """
+    config = load_config(config_path)
+    return os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(config_path)),
+                                        config["DEFAULT"].get("data_yml", "./yml")))
+
+
+def entry_identity(path, key, value):
+    """
+    合并索引中判断“同一个模型”的标识：有 sha256 时按 sha256，否则按主地址，都没有时不与其他条目合并
+    :return: 标识字符串
+    """
+    if isinstance(value, dict):
+        if value.get("sha256"):
+            return f"sha256:{str(value['sha256']).lower()}"
+        if value.get("url"):
+            return f"url:{value['url']}"
+    return f"entry:{path}:{key}"
+
+
+class CatalogIndex:
+    """目录文件夹中全部 YAML 目录的合并索引，可在多个线程中共享"""
+
+    def __init__(self, directory, check_interval=1.0, max_workers=8):
+        """
+        :param directory: 目录文件夹（创建时不读取）
+        :param check_interval: 两次检查文件夹和各文件是否变化的最小间隔（秒）
+        :param max_workers: 并发读取的文件数
+        """
+        self.directory = os.path.abspath(directory)
+        self.check_interval = check_interval
+        self.max_workers = max_workers
+        self.lock = threading.RLock()
+        # 文件路径 -> {"version": 已合并的 Catalog 版本, "values": {键: 条目}, "idents": {键: 标识}}
+        self.files = {}
+        # 标识 -> {(文件路径, 键): None}，按加入顺序
+        self.groups = {}
+        # 标识 -> 合并后的条目
+        self.entries = {}
+        # d_name -> {标识: None}
+        self.d_names = {}
+        # 读取失败的文件 -> 错误信息（保留该文件上次成功读取的内容）
+        self.errors = {}
+        self.checked_at = None
+        self.version = 0
+        self.index = None
+
+    def list_files(self):
+        """文件夹中的目录文件（按文件名排序）"""
+        os.makedirs(self.directory, exist_ok=True)
+        return [os.path.join(self.directory, f) for f in sorted(os.listdir(self.directory))
+                if f.endswith((".yml", ".yaml"))]
+
+    def refresh(self, force=False):
+        """
+        检查文件夹和各文件，并发读取变化的文件并更新合并索引
+        :param force: 不管检查间隔，立即检查
+        :return: 合并索引是否有变化
+        """
+        with self.lock:
+            now = time.monotonic()
+            if not force and self.checked_at is not None and now - self.checked_at < self.check_interval:
+                return False
+            self.checked_at = now
+
+            paths = self.list_files()
+            # 受影响的标识（用字典保持发现顺序，合并后的条目顺序稳定）
+            touched = {}
+            for path in set(self.files) - set(paths):
+                touched |= self.merge_file(path, {})
+                del self.files[path]
+                self.errors.pop(path, None)
+
+            def load(path):
+                catalog = get_catalog(path)
+                try:
+                    catalog.refresh(force)
+                    return path, catalog, None
+                except (OSError, yaml.YAMLError, ValueError) as e:
+                    return path, catalog, e
+
+            with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(paths)))) as executor:
+                results = list(executor.map(load, paths))
+
+            for path, catalog, error in results:
+                if error is not None:
+                    if self.errors.get(path) != str(error):
+                        print(f"读取目录失败 {path}: {error}")
+                    self.errors[path] = str(error)
+                    continue
+                self.errors.pop(path, None)
+                state = self.files.get(path)
+                if state is not None and state["version"] == catalog.version:
+                    continue
+                touched |= self.merge_file(path, catalog.entries)
+                self.files[path]["version"] = catalog.version
+
+            for ident in touched:
+                self.rebuild_entry(ident)
+            if touched:
+                self.version += 1
+                self.index = None
+            return bool(touched)
+
+    def merge_file(self, path, values):
+        """
+        用一个文件的新内容更新分组，只处理新增、删除和修改过的键
+        （Catalog 对未修改的条目沿用同一个对象，用 is 比较即可）
+        :return: 受影响的标识 {标识: None}
+        """
+        state = self.files.setdefault(path, {"version": None, "values": {}, "idents": {}})
+        old_values = state["values"]
+        touched = {}
+        for key in [k for k in old_values if k not in values or values[k] is not old_values[k]]:
+            ident = state["idents"].pop(key)
+            group = self.groups.get(ident, {})
+            group.pop((path, key), None)
+            touched[ident] = None
+        for key, value in values.items():
+            if old_values.get(key) is value and key in state["idents"]:
+                continue
+            ident = entry_identity(path, key, value)
+            state["idents"][key] = ident
+            self.groups.setdefault(ident, {})[(path, key)] = None
+            touched[ident] = None
+        state["values"] = dict(values)
+        return touched
+
+    def rebuild_entry(self, ident):
+        """重新合并一个标识下的全部来源：以第一个来源的条目为准，地址合并为镜像列表"""
+        old = self.entries.pop(ident, None)
+        if isinstance(old, dict) and old.get("d_name"):
+            idents = self.d_names.get(old["d_name"], {})
+            idents.pop(ident, None)
+            if not idents:
+                self.d_names.pop(old["d_name"], None)
+
+        members = list(self.groups.get(ident, ()))
+        if not members:
+            self.groups.pop(ident, None)
+            return
+        values = [self.files[path]["values"][key] for path, key in members]
+        first = values[0]
+        merged = dict(first) if isinstance(first, dict) else {"name": str(first)}
+        urls = [u for value in values if isinstance(value, dict) for u in entry_urls(value)]
+        urls = list(dict.fromkeys(urls))
+        if urls:
+            merged["url"] = merged.get("url") or urls[0]
+            merged["mirrors"] = [u for u in urls if u != merged["url"]]
+        merged["key"] = members[0][1]
+        merged["source"] = os.path.basename(members[0][0])
+        merged["sources"] = [f"{os.path.basename(path)}:{key}" for path, key in members]
+        self.entries[ident] = merged
+        if merged.get("d_name"):
+            self.d_names.setdefault(merged["d_name"], {})[ident] = None
+
+    @property
+    def data(self):
+        """全部合并后的条目 {标识: 条目}，不要修改返回的字典"""
+        self.refresh()
+        return self.entries
+
+    def get(self, ident, default=None):
+        """按标识查找合并后的条目"""
+        return self.data.get(ident, default)
+
+    def find_d_name(self, d_name):
+        """
+        按保存文件名查找合并后的条目
+        :return: (标识, 条目)，找不到时为 (None, None)
+        """
+        entries = self.data
+        for ident in self.d_names.get(d_name, ()):
+            return ident, entries[ident]
+        return None, None
+
+    def search(self, search_name, limit=None):
+        """在全部目录中按 name 模糊查找，索引在内容变化后的第一次查找时重建"""
+        self.refresh()
+        with self.lock:
+            if self.index is None:
+                self.index = SearchIndex(self.entries)
+            index = self.index
+        return [(ident, value) for ident, value, _ in index.search(search_name, limit)]
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, ident):
+        return ident in self.data
 
 
 def mode_name():
@@ -56,15 +500,15 @@ def mode_name():
     global read_url, read_d_name
 
     # 读取配置文件的值
-    config = load_config()
-    yml_dir = config["DEFAULT"]["data_yml"]
-    target_file = os.path.join(yml_dir, config["DEFAULT"]["target_file"])
+    config = load_config(CONFIG_FILE)
     default_name = config["DEFAULT"]["mode_name"]
 
     # 读取文件中的数据
-    data = read_yml(target_file)
-    if not data:
-        print("YAML 文件加载失败。")
+    catalog = default_catalog()
+    try:
+        catalog.refresh()
+    except (OSError, yaml.YAMLError, ValueError) as e:
+        print(f"YAML 文件加载失败: {e}")
         return None
 
     # 读取name
@@ -72,7 +516,7 @@ def mode_name():
     if not name:
         name = default_name
 
-    matches = search_by_name(data, name)
+    matches = catalog.search(name)
     if not matches:
         print(f"未找到与 name = '{name}' 匹配的源。")
         return None
@@ -102,12 +546,11 @@ def mode_name():
     # print(f"\n已选择：{value.get('name', '未知')} ({read_d_name})")
     # print(f"下载地址：{read_url}\n")
 
-    return {"url": read_url, "d_name": read_d_name}
+    return {"url": read_url, "d_name": read_d_name, "urls": entry_urls(value), "sha256": value.get("sha256")}
 
 
-# 如果被其他文件导入，则自动运行 mode_name() 并设置全局变量
-if __name__ != "__main__":
+if __name__ == "__main__":
     result = mode_name()
     if result:
-        read_url = result["url"]
-        read_d_name = result["d_name"]
+        print(f"\n已选择：{result['d_name']}")
+        print(f"下载地址：{result['url']}")
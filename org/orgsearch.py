@@ -0,0 +1,304 @@
+# orgsearch.py
+# 说明：
+# - 目录模糊搜索的预建索引：查询时先用索引筛出少量候选，再只对候选计算 difflib 相似度并排序，
+#   不再对全部条目逐个调用 SequenceMatcher
+# - 匹配规则与原来的 search_by_name 相同：查询词是 name 的子串（不区分大小写），
+#   或 SequenceMatcher(None, name, 查询词).ratio() > 0.5
+# - 子串匹配：以查询词开头的条目在排好序的名称表中二分查找；其余用 name 的三元组（trigram）倒排表求交集后核对，
+#   结果完整
+# - 模糊匹配：name 按字母数字切成词（qwen2.5-7b-instruct -> qwen2 / 5 / 7b / instruct），
+#   查询词的每个词先在词表中扩展为前缀相同或拼写相近的词（lama -> llama），再对各词的倒排表求交集得到候选；
+#   与查询词没有任何相近词的“巧合相似”（例如打乱顺序的字母）不会出现在结果中
+# - 排序：以查询词开头的在前，其次是包含查询词的（同类中名称较短的优先），最后是模糊匹配（相似度从高到低）；
+#   条目序号按名称长度分配，取前 k 个较短的名称就是取前 k 个最小的序号
+# - 倒排表较短时用 set 保存；很长的（超过总条目数的 1/DENSE_FACTOR）另存一份整数位图，
+#   求交集/并集是整数的位运算，不必逐个元素比较
+# - 索引建好后只读（词的查询结果有缓存），可在多个线程中共享；目录变化后重新建立
+# - 性能测试：python bench/bench_search.py [条目数]
+
+import re
+import heapq
+import bisect
+import difflib
+import itertools
+from typing import Optional, Union
+
+# 模糊匹配的相似度阈值（与原 search_by_name 相同）
+FUZZY_RATIO = 0.5
+# 查询词中的一个词与词表中的词相似度达到该值时视为拼写相近
+TOKEN_RATIO = 0.75
+# 少于该长度的词只按前缀扩展
+MIN_FUZZY_TOKEN = 4
+# 模糊匹配最多对多少个候选计算 SequenceMatcher：max(MIN_RERANK, 结果数 * RERANK_FACTOR)
+RERANK_FACTOR = 2
+MIN_RERANK = 16
+# 倒排表长度超过总条目数的 1/DENSE_FACTOR 时另存为位图
+DENSE_FACTOR = 64
+# 词 -> 条目位图的缓存上限（词表不变，满了直接清空）
+TOKEN_CACHE_SIZE = 4096
+
+SPACE_RE = re.compile(r"\s+")
+TOKEN_RE = re.compile(r"[^\W_]+")
+NONZERO_RE = re.compile(rb"[^\x00]")
+
+
+def normalize(text) -> str:
+    """小写并合并连续空白"""
+    return SPACE_RE.sub(" ", str(text or "").lower()).strip()
+
+
+def tokenize(text: str) -> list:
+    """按字母数字切词：qwen2.5-7b-instruct -> ['qwen2', '5', '7b', 'instruct']"""
+    return TOKEN_RE.findall(text)
+
+
+def trigrams(text: str) -> set:
+    """文本内部的三元组集合（不补空格），少于 3 个字符时为空集"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def bitmap_ids(bitmap: int):
+    """从小到大逐个产生位图中为 1 的位的序号（用正则在字节串中跳过全 0 的字节）"""
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+    for match in NONZERO_RE.finditer(data):
+        base = match.start() * 8
+        byte = data[match.start()]
+        while byte:
+            low = byte & -byte
+            yield base + low.bit_length() - 1
+            byte ^= low
+
+
+class SearchIndex:
+    """按 name 搜索目录条目的预建索引"""
+
+    def __init__(self, data: Optional[dict] = None):
+        """
+        Args:
+            data: 目录 YAML 的内容 {键: 条目}，也可以是 [(键, 条目), ...]
+        """
+        items = data.items() if isinstance(data, dict) else (data or [])
+        rows = [(normalize(value.get("name", "") if isinstance(value, dict) else ""), key, value)
+                for key, value in items]
+        # 条目序号按名称长度分配（相同长度保持原顺序），序号小的名称短
+        rows.sort(key=lambda row: len(row[0]))
+        self.names = [row[0] for row in rows]
+        self.keys = [row[1] for row in rows]
+        self.values = [row[2] for row in rows]
+
+        # 名称按字母排序，用于二分查找以查询词开头的条目
+        order = sorted(range(len(rows)), key=self.names.__getitem__)
+        self.sorted_names = [self.names[i] for i in order]
+        self.sorted_ids = order
+
+        # 三元组 -> 条目序号集合；词 -> 条目序号集合；词表的三元组 -> 词集合
+        self.postings = {}
+        self.token_postings = {}
+        for i, name in enumerate(self.names):
+            for gram in trigrams(name):
+                self.postings.setdefault(gram, set()).add(i)
+            for token in tokenize(name):
+                self.token_postings.setdefault(token, set()).add(i)
+        self.vocab_postings = {}
+        for token in self.token_postings:
+            for gram in trigrams(f" {token} "):
+                self.vocab_postings.setdefault(gram, set()).add(token)
+
+        # 长倒排表（三元组和词）的位图
+        self.dense_size = max(1, len(rows) // DENSE_FACTOR)
+        self.bitmaps = {gram: self.to_bitmap(ids) for gram, ids in self.postings.items()
+                        if len(ids) >= self.dense_size}
+        self.token_bitmaps = {token: self.to_bitmap(ids) for token, ids in self.token_postings.items()
+                              if len(ids) >= self.dense_size}
+        self.token_cache = {}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def to_bitmap(self, ids) -> int:
+        """条目序号集合 -> 位图"""
+        data = bytearray(len(self.keys) // 8 + 1)
+        for i in ids:
+            data[i >> 3] |= 1 << (i & 7)
+        return int.from_bytes(data, "little")
+
+    def ascending(self, ids: Union[set, int]):
+        """从小到大逐个产生集合（或位图）中的序号"""
+        if isinstance(ids, int):
+            return bitmap_ids(ids)
+        return iter(sorted(ids))
+
+    def prefix_matches(self, query: str) -> list:
+        """以查询词开头的条目序号（未排序）"""
+        lo = bisect.bisect_left(self.sorted_names, query)
+        hi = bisect.bisect_left(self.sorted_names, query[:-1] + chr(ord(query[-1]) + 1), lo)
+        return self.sorted_ids[lo:hi]
+
+    def substring_candidates(self, query: str) -> Union[set, int, None]:
+        """
+        可能包含查询词的条目：查询词的每个三元组都必须出现在 name 中
+
+        Returns:
+            候选集合或位图（超过 3 个字符时需要再用 in 核对）；查询词不足 3 个字符时返回None，由调用方逐个检查
+        """
+        if len(query) < 3:
+            return None
+        grams = sorted(trigrams(query), key=lambda gram: len(self.postings.get(gram, ())))
+        smallest = self.postings.get(grams[0], set())
+        if len(smallest) < self.dense_size:
+            return smallest.intersection(*(self.postings.get(gram, ()) for gram in grams[1:]))
+        # 全部是长倒排表：位图按位与
+        bitmap = -1
+        for gram in grams:
+            bitmap &= self.bitmaps[gram]
+        return bitmap
+
+    def substring_matches(self, query: str, exclude: set, limit: Optional[int]) -> list:
+        """
+        包含查询词的条目序号，按序号（名称长度）从小到大
+
+        Args:
+            query: normalize() 之后的查询词
+            exclude: 不需要返回的条目序号（已作为前缀匹配返回的）
+            limit: 最多返回的个数，None 表示全部
+        """
+        names = self.names
+        candidates = self.substring_candidates(query)
+        if candidates is None:
+            # 查询词太短，按名称长度顺序逐个检查，够数即停
+            ids = (i for i, name in enumerate(names) if query in name and i not in exclude)
+        else:
+            ids = (i for i in self.ascending(candidates)
+                   if i not in exclude and (len(query) == 3 or query in names[i]))
+        return list(itertools.islice(ids, limit))
+
+    def expand_token(self, token: str) -> list:
+        """
+        词表中与 token 前缀相同或拼写相近的词
+
+        不超过 3 个字符的词（7b、q4 等）只按前缀扩展，避免 3b 被当成 13b 的拼写错误
+        """
+        grams = trigrams(f" {token} ")
+        similar = set().union(*(self.vocab_postings.get(gram, ()) for gram in grams))
+        if len(token) < MIN_FUZZY_TOKEN:
+            return [word for word in similar if word.startswith(token)]
+        return [word for word in similar
+                if word.startswith(token) or difflib.SequenceMatcher(None, word, token).ratio() >= TOKEN_RATIO]
+
+    def token_matches(self, token: str) -> int:
+        """name 中含有 token 或其相近词的条目位图，结果按词缓存"""
+        bitmap = self.token_cache.get(token)
+        if bitmap is None:
+            bitmap = 0
+            for word in self.expand_token(token):
+                word_bitmap = self.token_bitmaps.get(word)
+                bitmap |= word_bitmap if word_bitmap is not None else self.to_bitmap(self.token_postings[word])
+            if len(self.token_cache) >= TOKEN_CACHE_SIZE:
+                self.token_cache.clear()
+            self.token_cache[token] = bitmap
+        return bitmap
+
+    def fuzzy_candidates(self, query: str, exclude: set, limit: Optional[int]) -> list:
+        """
+        用词的倒排表挑选可能满足模糊匹配的候选
+
+        先取包含查询词全部词（或其相近词）的条目，不够时逐次少要求一个词，直到只要求包含其中一个词
+
+        Args:
+            query: normalize() 之后的查询词
+            exclude: 已作为子串匹配返回的条目序号
+            limit: 最多返回的候选数，None 表示不限
+
+        Returns:
+            候选序号列表，越靠前越可能相似
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        # 单个字符的词（例如 q4_k_m 中的 k、m）几乎每个条目都有，只在没有更长的词时使用
+        tokens = [t for t in tokens if len(t) > 1] or tokens
+        if not tokens:
+            return []
+        bitmaps = [self.token_matches(token) for token in tokens]
+
+        # at_least[n]：至少包含 n 个词的条目位图，逐个词递推
+        at_least = [-1] + [0] * len(bitmaps)
+        for bitmap in bitmaps:
+            for n in range(len(bitmaps), 0, -1):
+                at_least[n] |= at_least[n - 1] & bitmap
+        at_least.append(0)
+
+        # 从包含全部词的条目开始，每次少要求一个词，直到候选够数；同一层内名称短的优先
+        candidates = []
+        for required in range(len(bitmaps), 0, -1):
+            level = at_least[required] & ~at_least[required + 1]
+            ids = (i for i in bitmap_ids(level) if i not in exclude)
+            candidates += itertools.islice(ids, None if limit is None else limit - len(candidates))
+            if limit is not None and len(candidates) >= limit:
+                break
+        return candidates
+
+    def rerank(self, query: str, candidates: list, limit: Optional[int]) -> list:
+        """
+        计算候选与查询词的相似度，保留超过 FUZZY_RATIO 的，按相似度从高到低
+
+        quick_ratio 是 ratio 的上界：候选按上界从高到低计算 ratio，已有 limit 个结果且都不低于
+        下一个候选的上界时停止，结果与对全部候选计算 ratio 后排序相同
+
+        Returns:
+            [(条目序号, 相似度), ...]
+        """
+        # 查询词作为第二个序列只预处理一次，每个候选只替换第一个序列
+        matcher = difflib.SequenceMatcher(None, "", query)
+        bounds = []
+        for i in candidates:
+            matcher.set_seq1(self.names[i])
+            if matcher.real_quick_ratio() > FUZZY_RATIO:
+                bound = matcher.quick_ratio()
+                if bound > FUZZY_RATIO:
+                    bounds.append((-bound, i))
+        bounds.sort()
+
+        found = []
+        for bound, i in bounds:
+            if limit is not None and len(found) >= limit and found[limit - 1][0] <= bound:
+                break
+            matcher.set_seq1(self.names[i])
+            ratio = matcher.ratio()
+            if ratio > FUZZY_RATIO:
+                bisect.insort(found, (-ratio, i))
+        return [(i, -ratio) for ratio, i in found[:limit]]
+
+    def search(self, search_name: str, limit: Optional[int] = 10) -> list:
+        """
+        按 name 搜索
+
+        Args:
+            search_name: 查询词（不区分大小写）
+            limit: 最多返回的结果数，None 表示返回全部匹配
+
+        Returns:
+            [(键, 条目, 相似度), ...]，子串匹配的相似度记为 1.0
+        """
+        query = normalize(search_name)
+        if not query:
+            # 空查询是所有条目的子串
+            ids = range(len(self.keys))[:limit]
+            return [(self.keys[i], self.values[i], 1.0) for i in ids]
+
+        prefix = self.prefix_matches(query)
+        ranked = sorted(prefix) if limit is None else heapq.nsmallest(limit, prefix)
+        results = [(i, 1.0) for i in ranked]
+
+        if limit is None or len(results) < limit:
+            matched = set(prefix)
+            contains = self.substring_matches(query, matched, None if limit is None else limit - len(results))
+            results += [(i, 1.0) for i in contains]
+            matched.update(contains)
+
+        if limit is None or len(results) < limit:
+            rerank_count = None if limit is None else max(MIN_RERANK, limit * RERANK_FACTOR)
+            results += self.rerank(query, self.fuzzy_candidates(query, matched, rerank_count),
+                                   None if limit is None else limit - len(results))
+
+        if limit is not None:
+            results = results[:limit]
+        return [(self.keys[i], self.values[i], ratio) for i, ratio in results]
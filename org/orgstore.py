@@ -0,0 +1,236 @@
+# orgstore.py
+# 说明：
+# - 按内容寻址的模型存储：文件按 sha256 保存在 <存储目录>/objects/<前两位>/<sha256> 中，只存一份
+# - download/ 下的各个文件名是指向存储对象的硬链接（同一文件系统）或符号链接（硬链接不可用时）
+# - 同一个模型在不同目录/不同名称下出现时只下载、只占用一次空间；删除其中一个名称不影响其他名称
+# - index.json 记录下载地址与内容哈希的对应关系（附带大小/ETag/Last-Modified），
+#   目录中没有 sha256 的条目在远程文件未变化时也能直接链接到已有内容
+# - copies.json 记录无法链接、只能复制出去的文件，gc() 时这些副本对应的对象不会被删除
+
+import os
+import json
+import shutil
+import threading
+from typing import Optional
+
+from org.orgdownload import cached_sha256, same_remote
+
+
+class ModelStore:
+    """内容寻址的模型存储，所有方法都可以在多个下载线程中同时调用"""
+
+    def __init__(self, root: str):
+        """
+        Args:
+            root: 存储目录，应与下载目录在同一个文件系统上（例如 download/.store），才能使用硬链接
+        """
+        self.root = os.path.abspath(root)
+        self.objects_dir = os.path.join(self.root, "objects")
+        self.index_file = os.path.join(self.root, "index.json")
+        self.copies_file = os.path.join(self.root, "copies.json")
+        self.lock = threading.Lock()
+        # copies.json 单独加锁：link() 会在持有 self.lock 的 add() 中被调用
+        self.copies_lock = threading.Lock()
+
+    def object_path(self, sha256: str) -> str:
+        sha256 = sha256.lower()
+        return os.path.join(self.objects_dir, sha256[:2], sha256)
+
+    def has(self, sha256: Optional[str]) -> bool:
+        """存储中是否已有该内容"""
+        return bool(sha256) and os.path.isfile(self.object_path(sha256))
+
+    def link(self, sha256: str, dest: str) -> bool:
+        """
+        让 dest 指向存储中的内容：优先硬链接，不支持时用符号链接，都不行时复制
+
+        Args:
+            sha256: 内容哈希
+            dest: 目标文件路径，已存在时被原子替换
+
+        Returns:
+            存储中没有该内容时返回False
+        """
+        source = self.object_path(sha256)
+        if not os.path.isfile(source):
+            return False
+        if os.path.exists(dest) and os.path.samefile(source, dest):
+            return True
+
+        os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+        tmp_file = f"{dest}.link"
+        if os.path.lexists(tmp_file):
+            os.remove(tmp_file)
+        try:
+            os.link(source, tmp_file)
+        except OSError:
+            try:
+                os.symlink(source, tmp_file)
+            except OSError:
+                # Windows 未开启开发者模式时不能创建符号链接，退回复制；
+                # 副本与对象没有链接关系，记录下来，避免 gc() 删除仍在使用的对象
+                shutil.copyfile(source, tmp_file)
+                self.remember_copy(sha256, dest)
+        os.replace(tmp_file, dest)
+        return True
+
+    def add(self, path: str, sha256: Optional[str] = None) -> str:
+        """
+        把下载完成的文件放入存储，原位置换成指向存储对象的链接；存储中已有相同内容时直接链接过去，释放重复的空间
+
+        Args:
+            path: 下载完成的文件
+            sha256: 已知的 sha256（下载时已校验过），None 时计算（结果按大小/修改时间缓存）
+
+        Returns:
+            文件的 sha256
+        """
+        digest = (sha256 or cached_sha256(path)).lower()
+        target = self.object_path(digest)
+        with self.lock:
+            if os.path.isfile(target):
+                if not os.path.samefile(target, path):
+                    self.link(digest, path)
+                return digest
+
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            try:
+                # 同一文件系统：硬链接后两个名称共享同一份数据
+                os.link(path, target)
+            except OSError:
+                # 跨文件系统或不支持硬链接：把文件移入存储，再链接回原位置
+                shutil.move(path, target)
+                self.link(digest, path)
+        return digest
+
+    def load_index(self) -> dict:
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def load_copies(self) -> dict:
+        try:
+            with open(self.copies_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_copies(self, copies: dict):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_file = f"{self.copies_file}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(copies, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.copies_file)
+
+    def remember_copy(self, sha256: str, dest: str):
+        """记录从存储对象复制出去的文件"""
+        with self.copies_lock:
+            copies = self.load_copies()
+            paths = copies.setdefault(sha256.lower(), [])
+            dest = os.path.abspath(dest)
+            if dest not in paths:
+                paths.append(dest)
+            self.save_copies(copies)
+
+    def copy_referenced(self) -> set:
+        """
+        仍被副本引用的对象，同时从 copies.json 中清除已删除或已被替换的副本
+
+        Returns:
+            对象的 sha256 集合
+        """
+        referenced = set()
+        with self.copies_lock:
+            copies = self.load_copies()
+            for sha256, paths in list(copies.items()):
+                source = self.object_path(sha256)
+                size = os.path.getsize(source) if os.path.isfile(source) else None
+                # 副本仍存在、不是链接且大小一致时视为仍在使用（不逐个计算哈希）
+                paths = [path for path in paths if os.path.isfile(path) and not os.path.islink(path)
+                         and os.path.getsize(path) == size]
+                if paths:
+                    copies[sha256] = paths
+                    referenced.add(sha256)
+                else:
+                    del copies[sha256]
+            if os.path.exists(self.copies_file):
+                self.save_copies(copies)
+        return referenced
+
+    def remember_source(self, url: str, info: dict, sha256: str):
+        """
+        记录下载地址对应的内容哈希
+
+        Args:
+            url: 下载地址
+            info: probe 得到的远程文件信息（size / etag / last_modified）
+            sha256: 下载得到的内容哈希
+        """
+        if not (info.get("etag") or info.get("last_modified")):
+            # 没有 ETag/Last-Modified 时无法判断远程文件以后是否变化，不记录
+            return
+        with self.lock:
+            index = self.load_index()
+            index[url] = {"size": info.get("size"), "etag": info.get("etag"),
+                          "last_modified": info.get("last_modified"), "sha256": sha256}
+            os.makedirs(self.root, exist_ok=True)
+            tmp_file = f"{self.index_file}.tmp"
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(index, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_file, self.index_file)
+
+    def find_source(self, url: str, info: dict) -> Optional[str]:
+        """
+        查找该下载地址以前下载得到的内容
+
+        Args:
+            url: 下载地址
+            info: 本次 probe 得到的远程文件信息
+
+        Returns:
+            远程文件未变化且存储中仍有该内容时返回其 sha256，否则返回None
+        """
+        record = self.load_index().get(url)
+        if not record or record.get("size") != info.get("size"):
+            return None
+        if not same_remote(record, info.get("etag"), info.get("last_modified")):
+            return None
+        return record["sha256"] if self.has(record.get("sha256")) else None
+
+    def gc(self, scan_dirs: Optional[list] = None) -> int:
+        """
+        删除不再被任何文件引用的存储对象
+
+        硬链接对象的链接数为 1 即表示没有其他名称；符号链接的引用通过扫描 scan_dirs 中的链接得到；
+        复制出去的文件记录在 copies.json 中。
+
+        Args:
+            scan_dirs: 可能存在符号链接的目录，默认为存储目录的上一级
+
+        Returns:
+            删除的对象数
+        """
+        referenced = set()
+        for folder in scan_dirs or [os.path.dirname(self.root)]:
+            for dirpath, _, filenames in os.walk(folder):
+                for name in filenames:
+                    path = os.path.join(dirpath, name)
+                    if os.path.islink(path):
+                        referenced.add(os.path.realpath(path))
+        copied = self.copy_referenced()
+
+        removed = 0
+        with self.lock:
+            if not os.path.isdir(self.objects_dir):
+                return 0
+            for dirpath, _, filenames in os.walk(self.objects_dir):
+                for name in filenames:
+                    path = os.path.join(dirpath, name)
+                    if name in copied:
+                        continue
+                    if os.stat(path).st_nlink <= 1 and os.path.realpath(path) not in referenced:
+                        os.remove(path)
+                        removed += 1
+        return removed
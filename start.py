@@ -7,17 +7,25 @@
 
 import sys
 import os
-import yaml
 import shutil
-import requests
 import res_rc
 import subprocess
 from PySide6.QtWidgets import (
     QApplication, QWidget, QFileDialog, QTableWidgetItem,
-    QPushButton, QMessageBox, QHBoxLayout, QWidget as QW, QHeaderView
+    QPushButton, QMessageBox, QHBoxLayout, QWidget as QW, QHeaderView, QSpinBox, QLineEdit,
+    QTableWidget, QProgressBar, QVBoxLayout
 )
 from PySide6.QtUiTools import QUiLoader
 from PySide6.QtCore import Qt, QStringListModel, QThread, Signal, QTimer
+from PySide6.QtGui import QBrush
+
+from org.orgdownload import TokenBucket
+from org.orgmanager import DownloadManager, QUEUED, RUNNING, PAUSED, DONE, FAILED, CANCELED
+from org.orgstore import ModelStore
+from org.orgprobe import LinkChecker
+from org.orggguf import load_gguf_meta
+from org.orgextract import load_bundle_manifest
+from org.orgread import get_catalog, CatalogIndex, default_catalog_dir
 
 # ========== 请在此处设置你本地的 Python 3.11 解释器路径 ==========
 # Windows 示例: r"C:\Python311\python.exe"
@@ -27,6 +35,23 @@ PYTHON311_PATH = r"module/LM_load/DeepSeek/.venv/Scripts/python.exe"  # <-- <--
 
 # GGUF 查找目录（comboBox 列出此目录下的 .gguf 文件）
 GGUF_DIR = os.path.abspath("download")
+# 内容寻址存储：download/ 下的模型文件是指向存储对象的链接，相同内容只下载、只保存一次
+STORE = ModelStore(os.path.join(GGUF_DIR, ".store"))
+# 链接检测结果（带 TTL 缓存），表格显示各条目最快的可用地址，下载时以最快的镜像为主镜像
+LINK_CHECKER = LinkChecker()
+# 所有下载共享的带宽上限（0 表示不限速），与推理服务在同一台机器上时避免下载占满带宽和磁盘
+BANDWIDTH = TokenBucket(None)
+SPEED_LIMIT_FILE = "speed_limit.txt"
+# 下载队列：同时最多下载 2 个文件，全部下载合计最多 16 个连接，共用上面的带宽上限；
+# 数据先写入 <保存路径>.part，完成后才重命名，暂停或退出后再次下载会从中断处继续
+DOWNLOADS = DownloadManager(max_jobs=2, max_connections=16, thread_count=8, store=STORE,
+                            link_checker=LINK_CHECKER, rate_limiter=BANDWIDTH)
+JOB_STATES = {QUEUED: "排队中", RUNNING: "下载中", PAUSED: "已暂停", DONE: "已完成", FAILED: "失败",
+              CANCELED: "已取消"}
+# 目录文件夹（org/config.ini 中的 data_yml），其中全部 YAML 合并为一个索引，可以跨目录搜索
+CATALOG_DIR = default_catalog_dir()
+CATALOG_INDEX = CatalogIndex(CATALOG_DIR)
+ALL_CATALOGS = "（全部目录）"
 
 # ========== 子进程输出读取线程 ==========
 class ProcessReaderThread(QThread):
@@ -67,44 +92,28 @@ class ProcessReaderThread(QThread):
         self._running = False
         self.wait(200)
 
-# ========== 异步下载线程（你原来的） ==========
-class DownloadThread(QThread):
-    progress = Signal(int)
-    message = Signal(str)
-    finished = Signal(bool)
+# ========== 链接检测线程（并发探测目录中的全部地址） ==========
+class LinkCheckThread(QThread):
+    # (显示名称, 检测开始时的目录版本, {键: 排序后的检测结果})
+    checked = Signal(str, int, dict)
 
-    def __init__(self, url, save_path):
+    def __init__(self, file_path, version, catalog):
         super().__init__()
-        self.url = url
-        self.save_path = save_path
+        self.file_path = file_path
+        self.version = version
+        self.catalog = catalog
 
     def run(self):
         try:
-            self.message.emit(f"开始下载：{self.save_path}")
-            with requests.get(self.url, stream=True, timeout=30) as r:
-                r.raise_for_status()
-                total_size = int(r.headers.get("content-length", 0))
-                chunk_size = 1024 * 50  # 每次读取50KB
-                downloaded = 0
-
-                with open(self.save_path, "wb") as f:
-                    for chunk in r.iter_content(chunk_size=chunk_size):
-                        if chunk:
-                            f.write(chunk)
-                            downloaded += len(chunk)
-                            if total_size:
-                                percent = int(downloaded * 100 / total_size)
-                                self.progress.emit(percent)
-
-            self.progress.emit(100)
-            self.finished.emit(True)
-            self.message.emit("下载完成！")
+            self.checked.emit(self.file_path, self.version, LINK_CHECKER.check_catalog(self.catalog))
         except Exception as e:
-            self.message.emit(f"下载出错：{e}")
-            self.finished.emit(False)
+            print(f"链接检测出错：{e}")
 
 # ==================== 主窗口 ====================
 class OrgCeshi(QWidget):
+    # 下载任务状态变化（下载管理器在工作线程中回调，经信号转到界面线程处理）
+    job_changed = Signal(object)
+
     def __init__(self):
         super().__init__()
 
@@ -125,6 +134,12 @@ class OrgCeshi(QWidget):
         if hasattr(self.ui, "pushButton_12"):
             self.ui.pushButton_12.clicked.connect(self.refresh_download_list)
 
+        # ========= 下载队列 =========
+        self.link_check_threads = []
+        self.init_download_queue()
+        self.init_speed_limit()
+        self.init_catalog_search()
+
         # ========= model process related =========
         self.model_process = None
         self.reader_thread = None
@@ -232,6 +247,11 @@ class OrgCeshi(QWidget):
             n_ctx = int(self.ui.textEdit_4.toPlainText().strip() or "40960")
         except Exception:
             n_ctx = 40960
+        # 下载时保存的 GGUF 元数据中有模型的训练上下文长度，超过它没有意义
+        meta = load_gguf_meta(model_path)
+        if meta and meta.get("context_length") and n_ctx > meta["context_length"]:
+            self.append_text(f"[系统] 模型上下文长度为 {meta['context_length']}，n_ctx 已从 {n_ctx} 调整为该值\n")
+            n_ctx = meta["context_length"]
         try:
             gpu_layers = int(self.ui.spinBox.value()) if hasattr(self.ui, "spinBox") else -1
         except Exception:
@@ -384,16 +404,45 @@ class OrgCeshi(QWidget):
 
     # ============ 其余原来 YML/下载管理代码 ============
     def load_yml_list(self):
-        yml_dir = r"D:\aibuild\org\yml"
-        os.makedirs(yml_dir, exist_ok=True)
-        files = [f for f in os.listdir(yml_dir) if f.endswith((".yml", ".yaml"))]
+        # 第一项是全部目录的合并视图，其余为文件夹中的各个目录
+        files = [os.path.basename(path) for path in CATALOG_INDEX.list_files()]
 
-        model = QStringListModel(files)
+        model = QStringListModel([ALL_CATALOGS] + files)
         self.ui.listView.setModel(model)
         self.ui.listView.clicked.connect(
-            lambda index: self.load_yml_file(os.path.join(yml_dir, files[index.row()]))
+            lambda index: self.load_all_catalogs() if index.row() == 0
+            else self.load_yml_file(os.path.join(CATALOG_DIR, files[index.row() - 1]))
         )
 
+    def init_catalog_search(self):
+        # 在 YAML 浏览栏加一个搜索框，输入停顿 0.3 秒后在全部目录的合并索引中查找
+        self.search_box = QLineEdit()
+        self.search_box.setPlaceholderText("搜索全部目录中的模型")
+        self.search_box.setClearButtonEnabled(True)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(300)
+        self.search_timer.timeout.connect(self.search_catalogs)
+        self.search_box.textChanged.connect(self.search_timer.start)
+        if hasattr(self.ui, "widget") and self.ui.widget.layout() is not None:
+            self.ui.widget.layout().addWidget(self.search_box)
+
+    def load_all_catalogs(self):
+        self.ui.textEdit_7.setPlainText(CATALOG_DIR)
+        data = CATALOG_INDEX.data
+        for path, error in CATALOG_INDEX.errors.items():
+            self.append_text(f"[系统] 目录读取失败，已跳过：{path}\n{error}\n")
+        self.show_catalog(CATALOG_INDEX, ALL_CATALOGS, data)
+
+    def search_catalogs(self):
+        text = self.search_box.text().strip()
+        if not text:
+            self.load_all_catalogs()
+            return
+        # 搜索结果不做链接检测，显示名称与当前目录不同，已在进行的检测结果会被忽略
+        results = dict(CATALOG_INDEX.search(text, limit=200))
+        self.show_catalog(CATALOG_INDEX, f"搜索：{text}", results, check_links=False)
+
     def load_yml(self):
         file_path, _ = QFileDialog.getOpenFileName(self, "选择YAML文件", "", "YAML Files (*.yml *.yaml)")
         if file_path:
@@ -401,17 +450,23 @@ class OrgCeshi(QWidget):
 
     def load_yml_file(self, file_path):
         self.ui.textEdit_7.setPlainText(file_path)
+        # 同一个文件共用一份解析结果，文件没有修改时不再重新解析
+        catalog = get_catalog(file_path)
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                data = yaml.safe_load(f)
+            data = catalog.data
+        except ValueError:
+            QMessageBox.warning(self, "提示", "YAML 文件格式不正确，应为键值对结构。")
+            return
         except Exception as e:
             QMessageBox.critical(self, "错误", f"无法读取 YAML 文件：{e}")
             return
 
-        if not isinstance(data, dict):
-            QMessageBox.warning(self, "提示", "YAML 文件格式不正确，应为键值对结构。")
-            return
+        self.show_catalog(catalog, file_path, data)
+        with open("last_yml.txt", "w", encoding="utf-8") as f:
+            f.write(file_path)
 
+    def show_catalog(self, catalog, label, data, check_links=True):
+        # 在表格中列出条目；catalog 为单个目录（Catalog）或全部目录的合并索引（CatalogIndex）
         table = self.ui.tableWidget
         table.setRowCount(0)
 
@@ -422,22 +477,66 @@ class OrgCeshi(QWidget):
             name = value.get("name", "")
             intro = value.get("introduction", "")
             url = value.get("url", "")
-            d_name = value.get("d_name", "")
 
-            table.setItem(row, 0, QTableWidgetItem(name))
+            name_item = QTableWidgetItem(name)
+            # 记录条目的键，检测结果按键对应到行
+            name_item.setData(Qt.UserRole, key)
+            if value.get("sources"):
+                # 合并索引中的条目：提示来自哪些目录
+                name_item.setToolTip("来源：" + "，".join(value["sources"]))
+            table.setItem(row, 0, name_item)
             table.setItem(row, 1, QTableWidgetItem(intro))
             table.setItem(row, 2, QTableWidgetItem(url))
 
+            # 点击时按键重新取条目，文件在显示后被修改时使用新内容
             btn = QPushButton("下载")
-            btn.clicked.connect(lambda _, u=url, n=d_name: self.start_download(u, n))
+            btn.clicked.connect(lambda _, k=key: self.start_download_key(k))
             table.setCellWidget(row, 3, btn)
 
         # 记录当前YML路径
-        self.current_yml = file_path
-        with open("last_yml.txt", "w", encoding="utf-8") as f:
-            f.write(file_path)
+        self.current_yml = label
+        self.catalog = catalog
+        if not check_links:
+            return
+        # 后台并发检测全部地址，旧文件的检测线程结束前保留引用，避免线程对象被提前回收
+        self.link_check_threads = [t for t in self.link_check_threads if t.isRunning()]
+        check_thread = LinkCheckThread(label, catalog.version, data)
+        check_thread.checked.connect(self.show_link_status)
+        self.link_check_threads.append(check_thread)
+        check_thread.start()
+
+    def show_link_status(self, file_path, version, ranked):
+        # 检测期间切换了 YAML 文件，或目录文件已被修改（条目可能增删、地址可能变化）时忽略旧结果
+        if file_path != self.current_yml:
+            return
+        try:
+            self.catalog.refresh()
+        except Exception:
+            return
+        if self.catalog.version != version:
+            return
+        table = self.ui.tableWidget
+        for row in range(table.rowCount()):
+            name_item = table.item(row, 0)
+            item = table.item(row, 2)
+            results = ranked.get(name_item.data(Qt.UserRole)) if name_item is not None else None
+            if item is None or not results:
+                continue
+            best = results[0]
+            item.setText(best.url if best.ok else f"不可用：{best.url}")
+            item.setForeground(QBrush(Qt.black if best.ok else Qt.red))
+            item.setToolTip("\n".join(f"{r.url}  {r.describe()}" for r in results))
+
+    def start_download_key(self, key):
+        value = self.catalog.get(key)
+        if not isinstance(value, dict):
+            QMessageBox.warning(self, "提示", f"目录中已没有条目：{key}")
+            return
+        self.start_download(value.get("url", ""), value.get("d_name", ""), value.get("mirrors") or [],
+                            value.get("sha256"), value.get("gguf"), float(value.get("priority", 1.0)),
+                            value.get("members"))
 
-    def start_download(self, url, d_name):
+    def start_download(self, url, d_name, mirrors=None, sha256=None, gguf=None, priority=1.0, members=None):
         if not url:
             QMessageBox.warning(self, "提示", "无效的下载地址！")
             return
@@ -446,25 +545,140 @@ class OrgCeshi(QWidget):
         os.makedirs(save_dir, exist_ok=True)
         save_path = os.path.join(save_dir, d_name)
 
-        QMessageBox.information(self, "提示", f"开始下载：{d_name}\n\nURL: {url}")
-
-        self.download_thread = DownloadThread(url, save_path)
-        self.download_thread.progress.connect(self.update_progress)
-        # self.download_thread.message.connect(self.show_message)
-        self.download_thread.finished.connect(self.download_finished)
-        self.download_thread.start()
+        # 同一个文件已在队列中（排队/下载中/已暂停）时管理器返回原任务，不会重复下载
+        queued = set(self.job_rows)
+        urls = [url] + [m for m in (mirrors or []) if m != url]
+        try:
+            job = DOWNLOADS.add(urls, save_path, sha256=sha256, name=d_name, gguf_expect=gguf,
+                                priority=priority, member_hashes=members)
+        except ValueError as e:
+            QMessageBox.warning(self, "提示", str(e))
+            return
+        if job.job_id in queued:
+            QMessageBox.information(self, "提示", f"{d_name} 已在下载队列中（{JOB_STATES[job.status]}）。")
+            return
+        self.add_job_row(job)
+        self.ui.tabWidget.setCurrentWidget(self.queue_tab)
 
-    def update_progress(self, percent):
-        self.ui.progressBar_2.setValue(percent)
+    def init_speed_limit(self):
+        # 在 YAML 浏览栏加一个限速输入框（MB/s，0 为不限速），修改后对正在进行的下载立即生效
+        limit = 0
+        if os.path.exists(SPEED_LIMIT_FILE):
+            try:
+                with open(SPEED_LIMIT_FILE, "r", encoding="utf-8") as f:
+                    limit = int(f.read().strip() or 0)
+            except (OSError, ValueError):
+                limit = 0
+        self.speed_limit = QSpinBox()
+        self.speed_limit.setRange(0, 10000)
+        self.speed_limit.setSuffix(" MB/s")
+        self.speed_limit.setSpecialValueText("不限速")
+        self.speed_limit.setToolTip("所有下载合计的带宽上限")
+        self.speed_limit.setValue(limit)
+        self.set_speed_limit(limit)
+        self.speed_limit.valueChanged.connect(self.set_speed_limit)
+        if hasattr(self.ui, "widget") and self.ui.widget.layout() is not None:
+            self.ui.widget.layout().addWidget(self.speed_limit)
+
+    def set_speed_limit(self, limit):
+        BANDWIDTH.set_rate(limit * 1024 * 1024 if limit else None)
+        with open(SPEED_LIMIT_FILE, "w", encoding="utf-8") as f:
+            f.write(str(limit))
+
+    def init_download_queue(self):
+        # 在下载页加一个“下载队列”标签页，每个任务一行：状态、进度、暂停/继续/取消
+        # 任务编号 -> 行号 / 进度条 / (暂停, 继续, 取消) 按钮
+        self.job_rows = {}
+        self.job_bars = {}
+        self.job_buttons = {}
+        self.job_table = QTableWidget(0, 4)
+        self.job_table.setHorizontalHeaderLabels(["名称", "状态", "进度", "操作"])
+        self.job_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.queue_tab = QW()
+        layout = QVBoxLayout(self.queue_tab)
+        layout.addWidget(self.job_table)
+        self.ui.tabWidget.addTab(self.queue_tab, "下载队列")
+
+        self.job_changed.connect(self.on_job_changed)
+        DOWNLOADS.on_change = self.job_changed.emit
+        # 进度由界面定时轮询，不在下载线程中逐块发信号
+        self.progress_timer = QTimer(self)
+        self.progress_timer.setInterval(500)
+        self.progress_timer.timeout.connect(self.update_progress)
+        self.progress_timer.start()
+
+    def add_job_row(self, job):
+        table = self.job_table
+        row = table.rowCount()
+        table.insertRow(row)
+        self.job_rows[job.job_id] = row
+
+        name_item = QTableWidgetItem(job.name)
+        name_item.setToolTip(job.save_path)
+        table.setItem(row, 0, name_item)
+        table.setItem(row, 1, QTableWidgetItem(JOB_STATES[job.status]))
+        bar = QProgressBar()
+        bar.setRange(0, 100)
+        table.setCellWidget(row, 2, bar)
+        self.job_bars[job.job_id] = bar
+
+        pause_btn = QPushButton("暂停")
+        resume_btn = QPushButton("继续")
+        cancel_btn = QPushButton("取消")
+        pause_btn.clicked.connect(lambda: DOWNLOADS.pause(job.job_id))
+        resume_btn.clicked.connect(lambda: DOWNLOADS.resume(job.job_id))
+        cancel_btn.clicked.connect(lambda: DOWNLOADS.cancel(job.job_id))
+        layout = QHBoxLayout()
+        for btn in (pause_btn, resume_btn, cancel_btn):
+            layout.addWidget(btn)
+        layout.setSpacing(8)
+        layout.setContentsMargins(0, 0, 0, 0)
+        cell_widget = QW()
+        cell_widget.setLayout(layout)
+        self.job_buttons[job.job_id] = (pause_btn, resume_btn, cancel_btn)
+        table.setCellWidget(row, 3, cell_widget)
+        self.show_job_state(job)
 
-    def download_finished(self, success):
-        self.ui.progressBar_2.setValue(0)
-        if success:
-            QMessageBox.information(self, "下载完成", "文件已成功下载！")
+    def show_job_state(self, job):
+        row = self.job_rows.get(job.job_id)
+        if row is None:
+            return
+        state = self.job_table.item(row, 1)
+        state.setText(JOB_STATES[job.status] + (f"：{job.error}" if job.error else ""))
+        state.setToolTip(job.error)
+        state.setForeground(QBrush(Qt.red if job.status == FAILED else Qt.black))
+        pause_btn, resume_btn, cancel_btn = self.job_buttons[job.job_id]
+        pause_btn.setEnabled(job.status in (QUEUED, RUNNING))
+        resume_btn.setEnabled(job.status in (PAUSED, FAILED))
+        cancel_btn.setEnabled(job.status not in (DONE, CANCELED))
+
+    def on_job_changed(self, job):
+        self.show_job_state(job)
+        self.update_progress()
+        if job.status == DONE:
             self.refresh_download_list()
             self.refresh_gguf_list()
-        else:
-            QMessageBox.warning(self, "下载失败", "下载过程中出现错误。")
+
+    def update_progress(self):
+        # 每个任务显示自己的进度；下方总进度条按字节数汇总正在下载的任务
+        downloaded = total = 0
+        for info in DOWNLOADS.status():
+            bar = self.job_bars.get(info["id"])
+            if bar is None:
+                continue
+            bar.setValue(100 if info["status"] == DONE else int(info["percent"]))
+            if info["total"]:
+                bar.setFormat(f"%p%  ({info['downloaded'] / (1024 * 1024):.1f} / "
+                              f"{info['total'] / (1024 * 1024):.1f} MB)")
+            if info["status"] == RUNNING and info["total"]:
+                downloaded += info["downloaded"]
+                total += info["total"]
+        self.ui.progressBar_2.setValue(int(downloaded * 100 / total) if total else 0)
+
+    def stop_downloads(self):
+        # 程序退出前暂停所有下载，已下载的块保存在 .part/.progress 中，下次点击下载会继续
+        DOWNLOADS.on_change = None
+        DOWNLOADS.shutdown()
 
     def refresh_download_list(self):
         table = self.ui.tableWidget_2
@@ -472,12 +686,15 @@ class OrgCeshi(QWidget):
         os.makedirs(download_dir, exist_ok=True)
         table.setRowCount(0)
 
-        yml_file = getattr(self, "current_yml", None)
-        if not yml_file or not os.path.exists(yml_file):
+        catalog = getattr(self, "catalog", None)
+        if catalog is None:
+            return
+        try:
+            # 文件没有修改时直接使用已解析的内容
+            yml_data = catalog.data
+        except Exception as e:
+            print(f"读取目录失败：{e}")
             return
-
-        with open(yml_file, "r", encoding="utf-8") as f:
-            yml_data = yaml.safe_load(f) or {}
 
         for key, info in yml_data.items():
             d_name = info.get("d_name")
@@ -487,6 +704,13 @@ class OrgCeshi(QWidget):
 
             if os.path.exists(file_path):
                 self.add_table2_row(name, intro, d_name, file_path)
+                continue
+            # d_name 为压缩包时，下载后已解压并删除压缩包，列出解压出的各个文件
+            bundle = load_bundle_manifest(file_path)
+            for member in (bundle or {}).get("members", []):
+                member_path = os.path.join(bundle["dest_dir"], *member["name"].split("/"))
+                if os.path.exists(member_path):
+                    self.add_table2_row(name, intro, member["name"], member_path)
 
     def add_table2_row(self, name, intro, d_name, path):
         table = self.ui.tableWidget_2
@@ -540,6 +764,8 @@ class OrgCeshi(QWidget):
         if reply == QMessageBox.Yes:
             try:
                 os.remove(path)
+                # 其他名称不再引用的存储对象才会被删除
+                STORE.gc([GGUF_DIR])
                 self.ui.tableWidget_2.removeRow(row)
                 QMessageBox.information(self, "成功", "文件已删除。")
                 self.refresh_gguf_list()
@@ -550,4 +776,5 @@ class OrgCeshi(QWidget):
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = OrgCeshi()
+    app.aboutToQuit.connect(window.stop_downloads)
     sys.exit(app.exec())
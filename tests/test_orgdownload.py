@@ -0,0 +1,120 @@
+# test_orgdownload.py
+# 说明：
+# - org/orgdownload.py 的回归测试，在本地文件服务器（bench/rangeserver.py）上运行下载器
+# - 运行：python -m pytest tests 或 python -m unittest discover tests
+
+import os
+import sys
+import time
+import struct
+import shutil
+import hashlib
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.rangeserver import start_server
+from bench.bench_engines import make_file
+from org.orgdownload import MultiThreadDownloader, file_sha256
+from org.orgstore import ModelStore
+
+
+def make_gguf(architecture: str) -> bytes:
+    """最小的 GGUF v3 文件：一个 general.architecture 元数据，后面是填充数据"""
+    key = b"general.architecture"
+    value = architecture.encode()
+    header = b"GGUF" + struct.pack("<IQQ", 3, 0, 1)
+    header += struct.pack("<Q", len(key)) + key + struct.pack("<I", 8) + struct.pack("<Q", len(value)) + value
+    return header + bytes(256 * 1024)
+
+
+class ShrunkRemoteTest(unittest.TestCase):
+    """下载中断后远程文件变小，再次下载时 .part 必须截断到新的大小"""
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.work_dir, "www")
+        os.makedirs(self.root)
+        # 限速，保证第一次下载能在中途停下
+        self.server, self.base_url = start_server(self.root, throttle=2 * 1024 * 1024)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def test_shrunk_remote_file(self):
+        remote = os.path.join(self.root, "model.bin")
+        save_path = os.path.join(self.work_dir, "model.bin")
+        url = f"{self.base_url}/model.bin"
+        make_file(remote, 8_000_000)
+
+        first = MultiThreadDownloader(url, save_path, thread_count=4, show_bar=False)
+
+        def stop_halfway():
+            while not first.stopped:
+                if first.total_size and first.downloaded_size >= 1024 * 1024:
+                    first.stop()
+                    return
+                time.sleep(0.005)
+
+        threading.Thread(target=stop_halfway, daemon=True).start()
+        self.assertFalse(first.download(resume=False))
+        self.assertEqual(os.path.getsize(first.part_file), 8_000_000)
+
+        # 替换为更小的文件（修改时间变化，ETag 随之变化）
+        time.sleep(1.1)
+        expected = make_file(remote, 5_000_000)
+
+        second = MultiThreadDownloader(url, save_path, thread_count=4, show_bar=False)
+        self.assertTrue(second.download(resume=True))
+        self.assertEqual(os.path.getsize(save_path), 5_000_000)
+        self.assertEqual(file_sha256(save_path), expected)
+
+
+
+class StoreGGUFExpectTest(unittest.TestCase):
+    """存储中已有内容时直接链接，链接前也要按 gguf_expect 校验文件头"""
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.work_dir, "www")
+        os.makedirs(self.root)
+        self.server, self.base_url = start_server(self.root)
+        self.store = ModelStore(os.path.join(self.work_dir, ".store"))
+
+        data = make_gguf("llama")
+        self.sha256 = hashlib.sha256(data).hexdigest()
+        with open(os.path.join(self.root, "model.gguf"), "wb") as f:
+            f.write(data)
+        stored = os.path.join(self.work_dir, "stored.gguf")
+        shutil.copyfile(os.path.join(self.root, "model.gguf"), stored)
+        self.store.add(stored, self.sha256)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def download(self, architecture: str) -> tuple:
+        save_path = os.path.join(self.work_dir, "out", "model.gguf")
+        downloader = MultiThreadDownloader(f"{self.base_url}/model.gguf", save_path, thread_count=2,
+                                           show_bar=False, sha256=self.sha256, store=self.store,
+                                           gguf_expect={"architecture": architecture})
+        return downloader.download(resume=True), save_path
+
+    def test_matching_store_object_is_linked(self):
+        ok, save_path = self.download("llama")
+        self.assertTrue(ok)
+        self.assertTrue(os.path.samefile(save_path, self.store.object_path(self.sha256)))
+
+    def test_mismatching_store_object_is_rejected(self):
+        ok, save_path = self.download("qwen2")
+        self.assertFalse(ok)
+        self.assertFalse(os.path.exists(save_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
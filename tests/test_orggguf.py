@@ -0,0 +1,175 @@
+# test_orggguf.py
+# 说明：
+# - org/orggguf.py 的文件头解析测试，全部使用构造的字节数据，不需要网络和模型文件
+# - 运行：python -m pytest tests 或 python -m unittest discover tests
+
+import os
+import sys
+import struct
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from org.orggguf import (GGUFError, MAX_ARRAY_ITEMS, parse_gguf_header, read_gguf_header,
+                         check_gguf_expect, describe_gguf)
+
+# 元数据值类型
+UINT32 = 4
+STRING = 8
+ARRAY = 9
+
+
+def make_header(metadata: list, version: int = 3, endian: str = "<", tensor_count: int = 2) -> bytes:
+    """
+    构造 GGUF 文件头
+
+    Args:
+        metadata: [(键, 类型, 值), ...]，数组的值为 (元素类型, 元素列表)
+        version: 版本号，1 的长度/个数字段为 uint32，之后为 uint64
+        endian: "<" 小端，">" 大端
+        tensor_count: 张量数
+    """
+    count = "I" if version == 1 else "Q"
+
+    def pack(fmt, value):
+        return struct.pack(endian + fmt, value)
+
+    def string(text):
+        data = text.encode("utf-8")
+        return pack(count, len(data)) + data
+
+    def value_bytes(value_type, value):
+        if value_type == STRING:
+            return string(value)
+        if value_type == ARRAY:
+            item_type, items = value
+            return (pack("I", item_type) + pack(count, len(items))
+                    + b"".join(value_bytes(item_type, item) for item in items))
+        return pack({UINT32: "I"}[value_type], value)
+
+    data = b"GGUF" + pack("I", version) + pack(count, tensor_count) + pack(count, len(metadata))
+    for key, value_type, value in metadata:
+        data += string(key) + pack("I", value_type) + value_bytes(value_type, value)
+    return data
+
+
+LLAMA_METADATA = [
+    ("general.architecture", STRING, "llama"),
+    ("general.name", STRING, "tiny-llama"),
+    ("general.file_type", UINT32, 15),
+    ("llama.context_length", UINT32, 4096),
+]
+
+
+class ParseHeaderTest(unittest.TestCase):
+
+    def test_v3(self):
+        header = parse_gguf_header(make_header(LLAMA_METADATA))
+        self.assertTrue(header["complete"])
+        self.assertEqual(header["version"], 3)
+        self.assertEqual(header["tensor_count"], 2)
+        self.assertEqual(header["kv_count"], 4)
+        self.assertEqual(header["architecture"], "llama")
+        self.assertEqual(header["name"], "tiny-llama")
+        self.assertEqual(header["quant"], "Q4_K_M")
+        self.assertEqual(header["context_length"], 4096)
+        self.assertEqual(header["header_size"], len(make_header(LLAMA_METADATA)))
+        self.assertIn("llama", describe_gguf(header))
+
+    def test_v1_uses_32bit_counts(self):
+        data = make_header(LLAMA_METADATA, version=1)
+        self.assertLess(len(data), len(make_header(LLAMA_METADATA)))
+        header = parse_gguf_header(data)
+        self.assertTrue(header["complete"])
+        self.assertEqual(header["version"], 1)
+        self.assertEqual(header["architecture"], "llama")
+        self.assertEqual(header["context_length"], 4096)
+
+    def test_big_endian(self):
+        header = parse_gguf_header(make_header(LLAMA_METADATA, endian=">"))
+        self.assertTrue(header["complete"])
+        self.assertEqual(header["version"], 3)
+        self.assertEqual(header["tensor_count"], 2)
+        self.assertEqual(header["quant"], "Q4_K_M")
+        self.assertEqual(header["context_length"], 4096)
+
+    def test_truncated_header(self):
+        data = make_header(LLAMA_METADATA)
+        header = parse_gguf_header(data[:len(data) - 3])
+        self.assertFalse(header["complete"])
+        self.assertIsNone(header["header_size"])
+        # 已解析的部分照常返回
+        self.assertEqual(header["architecture"], "llama")
+        self.assertNotIn("llama.context_length", header["metadata"])
+
+    def test_bad_magic(self):
+        with self.assertRaises(GGUFError):
+            parse_gguf_header(b"GGML" + make_header(LLAMA_METADATA)[4:])
+        with self.assertRaises(GGUFError):
+            parse_gguf_header(b"<html>not a model</html>")
+
+    def test_unsupported_version(self):
+        data = make_header(LLAMA_METADATA)
+        with self.assertRaises(GGUFError):
+            parse_gguf_header(data[:4] + struct.pack("<I", 99) + data[8:])
+
+    def test_long_arrays_are_skipped(self):
+        tokens = [f"tok{i}" for i in range(MAX_ARRAY_ITEMS * 4)]
+        scores = list(range(MAX_ARRAY_ITEMS + 1))
+        metadata = LLAMA_METADATA + [
+            ("tokenizer.ggml.tokens", ARRAY, (STRING, tokens)),
+            ("tokenizer.ggml.token_type", ARRAY, (UINT32, scores)),
+            ("tokenizer.ggml.small", ARRAY, (UINT32, [1, 2, 3])),
+            ("general.after_arrays", STRING, "ok"),
+        ]
+        for version in (1, 3):
+            header = parse_gguf_header(make_header(metadata, version=version))
+            self.assertTrue(header["complete"])
+            self.assertEqual(header["arrays"], {"tokenizer.ggml.tokens": len(tokens),
+                                                "tokenizer.ggml.token_type": len(scores)})
+            self.assertNotIn("tokenizer.ggml.tokens", header["metadata"])
+            self.assertEqual(header["metadata"]["tokenizer.ggml.small"], [1, 2, 3])
+            # 跳过数组后，后面的元数据仍能正确解析
+            self.assertEqual(header["metadata"]["general.after_arrays"], "ok")
+
+    def test_read_header_fetches_more_when_incomplete(self):
+        tokens = [f"token-{i:06d}" for i in range(200000)]
+        data = make_header(LLAMA_METADATA + [("tokenizer.ggml.tokens", ARRAY, (STRING, tokens))])
+        sizes = []
+
+        def fetch(size):
+            sizes.append(size)
+            return data[:size]
+
+        header = read_gguf_header(fetch)
+        self.assertTrue(header["complete"])
+        self.assertGreater(len(sizes), 1)
+
+
+class CheckExpectTest(unittest.TestCase):
+
+    def setUp(self):
+        self.header = parse_gguf_header(make_header(LLAMA_METADATA))
+
+    def test_matching_expectations(self):
+        expect = {"architecture": "LLaMA", "quant": "q4_k_m", "context_length": 4096, "version": 3,
+                  "tensor_count": None}
+        self.assertEqual(check_gguf_expect(self.header, expect), [])
+        self.assertEqual(check_gguf_expect(self.header, None), [])
+
+    def test_mismatches(self):
+        expect = {"architecture": "qwen2", "quant": "Q8_0", "context_length": 32768,
+                  "general.name": "tiny-llama"}
+        mismatches = check_gguf_expect(self.header, expect)
+        self.assertEqual(len(mismatches), 3)
+        self.assertTrue(any("architecture" in m and "qwen2" in m and "llama" in m for m in mismatches))
+        self.assertTrue(any("quant" in m for m in mismatches))
+        self.assertTrue(any("context_length" in m for m in mismatches))
+
+    def test_missing_metadata_is_a_mismatch(self):
+        mismatches = check_gguf_expect(self.header, {"llama.rope.freq_base": 10000.0})
+        self.assertEqual(len(mismatches), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+# test_orgstore.py
+# 说明：
+# - org/orgstore.py 的回归测试
+# - 运行：python -m pytest tests 或 python -m unittest discover tests
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from org.orgstore import ModelStore
+
+
+class CopiedEntryTest(unittest.TestCase):
+    """硬链接和符号链接都不可用时退回复制，gc() 不能删除仍被副本使用的对象"""
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.store = ModelStore(os.path.join(self.work_dir, ".store"))
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def test_gc_keeps_copied_object(self):
+        first = os.path.join(self.work_dir, "a.bin")
+        with open(first, "wb") as f:
+            f.write(os.urandom(4096))
+        digest = self.store.add(first)
+
+        second = os.path.join(self.work_dir, "b.bin")
+        with mock.patch("os.link", side_effect=OSError), mock.patch("os.symlink", side_effect=OSError):
+            self.assertTrue(self.store.link(digest, second))
+        self.assertFalse(os.path.islink(second))
+
+        # 删除硬链接的名称后，对象只剩副本在使用
+        os.remove(first)
+        self.assertEqual(self.store.gc(), 0)
+        self.assertTrue(self.store.has(digest))
+
+        # 副本也删除后，对象可以回收
+        os.remove(second)
+        self.assertEqual(self.store.gc(), 1)
+        self.assertFalse(self.store.has(digest))
+
+
+if __name__ == "__main__":
+    unittest.main()